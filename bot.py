@@ -10,8 +10,10 @@ from telegram import Update, BotCommandScopeAllPrivateChats, BotCommandScopeAllG
 from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters, CallbackQueryHandler, ApplicationBuilder
 from loguru import logger
 
-from features.config.config_manager import BOT_TOKEN, log_config, VERIFICATION_CONFIG
+from features.config.config_manager import BOT_TOKEN, log_config, VERIFICATION_CONFIG, HTTP_CONFIG, CACHE_CONFIG, SNAPSHOT_CONFIG
+from features.utils.http_request import build_request, init_broadcast_bot, shutdown_broadcast_bot
 from features.data.db_manager import db_manager
+from features.data.chat_registry import chat_registry
 from features.utils.message_handler import handle_message
 from features.ui.commands import (
     start, help_command, status_command, handle_help_callback,
@@ -19,12 +21,16 @@ from features.ui.commands import (
 )
 from features.utils.error_handler import error_handler
 from features.services.lottery_update import check_lottery_update, initialize_lottery_data
-from features.data.cache_manager import cleanup_cache, CACHE_CONFIG
+from features.data.cache_manager import cleanup_cache
+from features.data.state_snapshot import state_snapshot, save_state_snapshot
+from features.utils.delivery_tracker import flush_dead_chats
+from features.services.sharded_broadcast import sharded_broadcaster, collect_shard_stats
 from features.services.prediction import verify_prediction
 from features.services.verification.verification_service import (
     handle_verification_callback, clear_verification_cache, process_group_message,
     process_chat_member_updated, periodic_verification_check
 )
+from features.services.verification.activity_tracker import group_activity_tracker, flush_group_activity
 
 async def post_init_setup(application: Application):
     """在机器人启动后设置命令菜单"""
@@ -47,6 +53,25 @@ async def post_init_setup(application: Application):
         logger.info("命令菜单设置成功")
     except Exception as e:
         logger.error(f"设置命令菜单失败: {e}")
+    
+    # 初始化群发专用Bot
+    try:
+        await init_broadcast_bot()
+    except Exception as e:
+        logger.error(f"初始化群发专用Bot失败，群发将使用默认Bot: {e}")
+
+async def post_shutdown_cleanup(application: Application):
+    """在机器人关闭时释放群发专用连接池，并写入最后一次状态快照"""
+    try:
+        await shutdown_broadcast_bot()
+    except Exception as e:
+        logger.error(f"关闭群发专用Bot失败: {e}")
+    
+    # 写入尚未落库的群组活跃信息
+    group_activity_tracker.flush()
+    
+    if SNAPSHOT_CONFIG["ENABLED"]:
+        state_snapshot.save()
 
 def main():
     """启动机器人"""
@@ -75,9 +100,16 @@ def main():
             # 如果数据库连接失败，可能需要退出或采取其他措施
             # sys.exit(1)
         
+        # 加载活跃聊天注册表，之后的读取均在内存中完成
+        chat_registry.load()
+        
         # 初始化预测器
         from features.prediction import predictor
         logger.info("初始化预测器...")
+        
+        # 从快照恢复热状态（渲染缓存、验证缓存、算法切换器等）
+        if SNAPSHOT_CONFIG["ENABLED"]:
+            state_snapshot.restore()
         logger.info(f"当前算法配置: {predictor.current_algorithms}")
         
         # 初始化机器人数据
@@ -88,19 +120,20 @@ def main():
             logger.warning("机器人数据初始化失败，请检查网络连接和API设置")
         
         # 创建应用 - 使用ApplicationBuilder并注册post_init
+        # 交互请求与长轮询使用各自配置的连接池，超时统一由HTTP_CONFIG设置
         builder = Application.builder().token(BOT_TOKEN)\
-            .connect_timeout(30)\
-            .pool_timeout(30)\
-            .read_timeout(30)\
-            .write_timeout(30)\
-            .get_updates_connect_timeout(30)\
-            .get_updates_pool_timeout(30)\
-            .get_updates_read_timeout(30)\
-            .post_init(post_init_setup) # 注册post_init函数
+            .request(build_request(HTTP_CONFIG["CONNECTION_POOL_SIZE"]))\
+            .get_updates_request(build_request(HTTP_CONFIG["GET_UPDATES_POOL_SIZE"]))\
+            .post_init(post_init_setup)\
+            .post_shutdown(post_shutdown_cleanup) # 注册post_init/post_shutdown函数
         
         application = builder.build()
         
-        logger.info("机器人已配置，超时设置为30秒")
+        logger.info(
+            f"机器人已配置，超时设置为{HTTP_CONFIG['TIMEOUT']:.0f}秒，"
+            f"连接池: 交互={HTTP_CONFIG['CONNECTION_POOL_SIZE']}, 长轮询={HTTP_CONFIG['GET_UPDATES_POOL_SIZE']}, "
+            f"HTTP版本={HTTP_CONFIG['HTTP_VERSION']}"
+        )
         
         # 添加处理程序
         application.add_handler(CommandHandler("start", start, ~filters.Chat(chat_id=VERIFICATION_CONFIG["TARGET_GROUP_ID"])))
@@ -172,6 +205,14 @@ def main():
         cleanup_interval = CACHE_CONFIG["CLEANUP_INTERVAL"]
         job_queue.run_repeating(cleanup_cache, interval=cleanup_interval, first=cleanup_interval)
         
+        # 添加定时任务 - 定期写入热状态快照
+        if SNAPSHOT_CONFIG["ENABLED"]:
+            snapshot_interval = SNAPSHOT_CONFIG["INTERVAL"]
+            job_queue.run_repeating(save_state_snapshot, interval=snapshot_interval, first=snapshot_interval)
+        
+        # 添加定时任务 - 批量移除交互发送中发现的无效聊天（群发路径会在每轮结束后自行清理）
+        job_queue.run_repeating(flush_dead_chats, interval=60, first=60)
+        
         # 添加定时任务 - 周期性验证检查（每小时检查一次）
         verification_check_interval = VERIFICATION_CONFIG["CHECK_INTERVAL"]  # 默认60秒 * 60 = 1小时
         job_queue.run_repeating(
@@ -181,6 +222,14 @@ def main():
         )
         logger.info(f"周期性验证检查任务已设置，间隔为 {verification_check_interval} 秒")
         
+        # 添加定时任务 - 批量写入目标群组的成员活跃信息
+        activity_flush_interval = VERIFICATION_CONFIG["ACTIVITY_FLUSH_INTERVAL"]
+        job_queue.run_repeating(flush_group_activity, interval=activity_flush_interval, first=activity_flush_interval)
+        
+        # 分片播报：启动发送进程并定期汇总发送统计
+        if sharded_broadcaster.start():
+            job_queue.run_repeating(collect_shard_stats, interval=5, first=5)
+        
         # 添加错误处理器
         application.add_error_handler(error_handler)
         
@@ -204,4 +253,20 @@ def main():
         logger.error(f"错误详情: {traceback.format_exc()}")
 
 if __name__ == "__main__":
+    # 子命令：python bot.py backtest [选项] 运行历史回测
+    if len(sys.argv) > 1 and sys.argv[1] == "backtest":
+        from features.prediction.backtest import main as backtest_main
+        sys.exit(backtest_main(sys.argv[2:]))
+    # 子命令：python bot.py switch-sim [选项] 离线模拟并排序算法切换策略
+    if len(sys.argv) > 1 and sys.argv[1] == "switch-sim":
+        from features.prediction.switch_simulator import main as switch_sim_main
+        sys.exit(switch_sim_main(sys.argv[2:]))
+    # 子命令：python bot.py weight-search [选项] 搜索杀组、双组的打分权重
+    if len(sys.argv) > 1 and sys.argv[1] == "weight-search":
+        from features.prediction.weight_search import main as weight_search_main
+        sys.exit(weight_search_main(sys.argv[2:]))
+    # 子命令：python bot.py formula-search [选项] 回测并挑选算法库公式
+    if len(sys.argv) > 1 and sys.argv[1] == "formula-search":
+        from features.prediction.formula_search import main as formula_search_main
+        sys.exit(formula_search_main(sys.argv[2:]))
     main() 
\ No newline at end of file
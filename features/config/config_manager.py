@@ -46,34 +46,79 @@ ALGORITHM_CONFIG = {
         "DOUBLE_GROUP": int(os.getenv("DOUBLE_GROUP_SWITCH", "4"))     # 双组算法切换周期
     },
     "PERFORMANCE_THRESHOLD": float(os.getenv("PERFORMANCE_THRESHOLD", "0.6")),  # 算法性能阈值
-    "MIN_SAMPLES": int(os.getenv("MIN_SAMPLES", "10"))                 # 最小样本数
+    "MIN_SAMPLES": int(os.getenv("MIN_SAMPLES", "10")),                # 最小样本数
+    "MARKOV_MAX_ORDER": int(os.getenv("MARKOV_MAX_ORDER", "4")),       # 马尔可夫组合模型的最高阶数（1-4）
+    "MARKOV_SMOOTHING": float(os.getenv("MARKOV_SMOOTHING", "2.0")),   # 高阶向低阶回退的平滑强度
+    "SCORING_WEIGHTS_PATH": os.getenv("SCORING_WEIGHTS_PATH", "data/config/scoring_weights.json"),  # 杀组、双组打分权重文件
+    "SHADOW_EVALUATION": os.getenv("SHADOW_EVALUATION", "1") == "1"     # 是否每期影子评估未使用的算法
 }
 
 # 播报配置
 BROADCAST_CONFIG = {
     "HISTORY_COUNT": int(os.getenv("BROADCAST_HISTORY_COUNT", "10")),  # 显示最近几期数据
-    "INTERVAL": int(os.getenv("BROADCAST_INTERVAL", "1"))              # 检查间隔（秒）
+    "INTERVAL": int(os.getenv("BROADCAST_INTERVAL", "1")),             # 检查间隔（秒）
+    "LIVE_BOARD_PIN": os.getenv("BROADCAST_LIVE_BOARD_PIN", "1") == "1"  # 看板模式是否置顶看板消息
+}
+
+# HTTP连接配置
+HTTP_CONFIG = {
+    "CONNECTION_POOL_SIZE": int(os.getenv("HTTP_POOL_SIZE", "32")),                  # 交互请求连接池大小
+    "GET_UPDATES_POOL_SIZE": int(os.getenv("HTTP_GET_UPDATES_POOL_SIZE", "2")),      # 长轮询连接池大小
+    "BROADCAST_POOL_SIZE": int(os.getenv("HTTP_BROADCAST_POOL_SIZE", "64")),         # 群发专用连接池大小
+    "HTTP_VERSION": os.getenv("HTTP_VERSION", "1.1"),                                # HTTP版本，"2"需要安装 httpx[http2]
+    "KEEPALIVE_EXPIRY": float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),             # 空闲连接保活时间（秒）
+    "TIMEOUT": float(os.getenv("HTTP_TIMEOUT", "30")),                               # 连接/读取/写入/连接池等待超时（秒）
+    "SEPARATE_BROADCAST_BOT": os.getenv("HTTP_SEPARATE_BROADCAST_BOT", "1") == "1"   # 群发是否使用独立的Bot实例
+}
+
+# 分片播报配置（多进程群发）
+SHARD_CONFIG = {
+    "WORKERS": int(os.getenv("BROADCAST_SHARD_WORKERS", "0")),                      # 发送进程数，0表示不启用分片
+    "QUEUE_PATH": os.getenv("BROADCAST_QUEUE_PATH", "data/broadcast_queue.db"),      # 进程间队列（SQLite）路径
+    "RATE_LIMIT": float(os.getenv("BROADCAST_RATE_LIMIT", "25")),                    # 所有进程共享的每秒发送上限
+    "CONCURRENCY": int(os.getenv("BROADCAST_SHARD_CONCURRENCY", "8")),               # 每个进程的并发发送数
+    "POLL_INTERVAL": float(os.getenv("BROADCAST_SHARD_POLL_INTERVAL", "0.2"))        # 队列轮询间隔（秒）
 }
 
 # 预测配置
 PREDICTION_CONFIG = {
     "CHECK_INTERVAL": int(os.getenv("PREDICTION_CHECK_INTERVAL", "300")),  # 验证间隔（秒）
     "DELAY_MIN": int(os.getenv("PREDICTION_DELAY_MIN", "10")),            # 最小延迟（秒）
-    "DELAY_MAX": int(os.getenv("PREDICTION_DELAY_MAX", "30"))             # 最大延迟（秒）
+    "DELAY_MAX": int(os.getenv("PREDICTION_DELAY_MAX", "30")),            # 最大延迟（秒）
+    "WORKERS": int(os.getenv("PREDICTION_WORKERS", "4")),                 # 并发计算预测类型的线程数
+    "TYPE_TIMEOUT": float(os.getenv("PREDICTION_TYPE_TIMEOUT", "10")),    # 单个预测类型的计算超时（秒）
+    "WAIT_TIMEOUT": float(os.getenv("PREDICTION_WAIT_TIMEOUT", "15"))     # 交互请求等待预测计算完成的最长时间（秒）
 }
 
 # 缓存配置
 CACHE_CONFIG = {
-    "BROADCAST_TTL": int(os.getenv("CACHE_BROADCAST_TTL", "10")),      # 广播消息缓存时间（秒）
-    "PREDICTION_TTL": int(os.getenv("CACHE_PREDICTION_TTL", "20")),    # 预测消息缓存时间（秒）
+    "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "256")),         # 每个命名空间的默认条目上限
+    "API_LOG_TTL": int(os.getenv("CACHE_API_LOG_TTL", "60")),          # API请求日志节流时间（秒）
     "CLEANUP_INTERVAL": int(os.getenv("CACHE_CLEANUP_INTERVAL", "300")) # 缓存清理间隔（秒）
 }
 
+# 热状态快照配置
+SNAPSHOT_CONFIG = {
+    "ENABLED": os.getenv("STATE_SNAPSHOT_ENABLED", "1") == "1",              # 是否启用快照
+    "PATH": os.getenv("STATE_SNAPSHOT_PATH", "cache/state.snapshot"),       # 快照文件路径
+    "INTERVAL": int(os.getenv("STATE_SNAPSHOT_INTERVAL", "60")),            # 快照写入间隔（秒）
+    "MAX_AGE": int(os.getenv("STATE_SNAPSHOT_MAX_AGE", "1800"))             # 快照最大有效时间（秒）
+}
+
 # 验证配置
 VERIFICATION_CONFIG = {
     "REQUIRED": os.getenv("VERIFICATION_REQUIRED", "1") == "1",         # 是否需要验证
     "TARGET_GROUP_ID": int(os.getenv("TARGET_GROUP_ID", "-1002023834812")),  # 目标群组ID (@id520)
-    "CHECK_INTERVAL": int(os.getenv("VERIFICATION_CHECK_INTERVAL", "60"))  # 验证检查间隔（秒）
+    "CHECK_INTERVAL": int(os.getenv("VERIFICATION_CHECK_INTERVAL", "60")),  # 验证检查间隔（秒）
+    "CACHE_SIZE": int(os.getenv("VERIFICATION_CACHE_SIZE", "10000")),     # 验证缓存最大用户数
+    "POSITIVE_TTL": int(os.getenv("VERIFICATION_POSITIVE_TTL", "600")),   # 验证通过结果缓存时间（秒）
+    "NEGATIVE_TTL": int(os.getenv("VERIFICATION_NEGATIVE_TTL", "30")),    # 验证失败结果缓存时间（秒）
+    "MEMBER_STALE_AFTER": int(os.getenv("MEMBERSHIP_MEMBER_STALE_AFTER", "86400")),     # 成员状态多久未确认后需重新查询（秒）
+    "NON_MEMBER_STALE_AFTER": int(os.getenv("MEMBERSHIP_NON_MEMBER_STALE_AFTER", "300")),  # 非成员状态多久后需重新查询（秒）
+    "SWEEP_PERIOD": int(os.getenv("MEMBERSHIP_SWEEP_PERIOD", "86400")),             # 完整遍历一次用户表的周期（秒）
+    "RECONCILE_CONCURRENCY": int(os.getenv("MEMBERSHIP_RECONCILE_CONCURRENCY", "8")),  # 校准查询的并发数
+    "RECONCILE_MIN_BATCH": int(os.getenv("MEMBERSHIP_RECONCILE_MIN_BATCH", "50")),  # 每次校准的最少用户数
+    "ACTIVITY_FLUSH_INTERVAL": int(os.getenv("GROUP_ACTIVITY_FLUSH_INTERVAL", "5"))  # 群组活跃信息批量写入间隔（秒）
 }
 
 # 特殊群组配置
@@ -88,8 +133,11 @@ def get_config():
         "game": GAME_CONFIG,
         "algorithm": ALGORITHM_CONFIG,
         "broadcast": BROADCAST_CONFIG,
+        "shard": SHARD_CONFIG,
+        "http": HTTP_CONFIG,
         "prediction": PREDICTION_CONFIG,
         "cache": CACHE_CONFIG,
+        "snapshot": SNAPSHOT_CONFIG,
         "verification": VERIFICATION_CONFIG
     }
 
@@ -102,8 +150,11 @@ def log_config():
     logger.debug(f"游戏规则配置: {GAME_CONFIG}")
     logger.debug(f"算法配置: {ALGORITHM_CONFIG}")
     logger.debug(f"播报配置: {BROADCAST_CONFIG}")
+    logger.debug(f"分片播报配置: {SHARD_CONFIG}")
+    logger.debug(f"HTTP连接配置: {HTTP_CONFIG}")
     logger.debug(f"预测配置: {PREDICTION_CONFIG}")
     logger.debug(f"缓存配置: {CACHE_CONFIG}")
+    logger.debug(f"快照配置: {SNAPSHOT_CONFIG}")
     logger.debug(f"验证配置: {VERIFICATION_CONFIG}")
 
 # 导出常用配置变量，方便直接导入
@@ -1,44 +1,183 @@
+import sys
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from loguru import logger
 
 from ..config.config_manager import CACHE_CONFIG
 
-# 缓存机制
-cache = {
-    'last_broadcast_qihao': None,
-    'last_prediction_qihao': None,
-    'last_broadcast_message': None,
-    'last_prediction_message': None,
-    'last_lottery_data': None,
-    'last_broadcast_time': None,
-    'last_prediction_time': None,
-    'cache_expiry': {}  # 缓存过期时间记录
-}
-
-def is_cache_valid(cache_key):
-    """检查缓存是否有效"""
-    if cache_key not in cache['cache_expiry']:
-        return False
-    return datetime.now().timestamp() < cache['cache_expiry'][cache_key]
-
-def update_cache(cache_key, value, ttl):
-    """更新缓存并设置过期时间"""
-    cache[cache_key] = value
-    cache['cache_expiry'][cache_key] = datetime.now().timestamp() + ttl
+_MISSING = object()
+
+class CacheNamespace:
+    """单个命名空间的缓存
+
+    按插入/访问顺序维护LRU，支持命名空间级别的默认TTL和条目上限，
+    并统计命中、未命中、淘汰、过期次数以及近似占用字节数。
+    """
+
+    def __init__(self, name, ttl=None, max_entries=None, invalidate_on_draw=False):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries or CACHE_CONFIG["MAX_ENTRIES"]
+        self.invalidate_on_draw = invalidate_on_draw
+        self._entries = OrderedDict()  # key -> (value, 过期时间戳或None, 字节数)
+        self._lock = threading.RLock()
+        self._size_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._size_bytes -= size
+
+    def get(self, key, default=None):
+        """获取缓存值，过期或不存在时返回default"""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self._misses += 1
+                return default
+            value, expires_at, _ = entry
+            if expires_at is not None and datetime.now().timestamp() >= expires_at:
+                self._remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """写入缓存值
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 过期时间（秒），默认使用命名空间的TTL，None表示不过期
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = datetime.now().timestamp() + ttl if ttl else None
+        size = sys.getsizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._size_bytes += size
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+        return value
+
+    def delete(self, key):
+        """删除缓存值"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                return True
+            return False
+
+    def clear(self):
+        """清空命名空间"""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._size_bytes = 0
+        return count
+
+    def cleanup(self):
+        """清理过期条目，返回清理数量"""
+        now = datetime.now().timestamp()
+        with self._lock:
+            expired = [
+                key for key, (_, expires_at, _) in self._entries.items()
+                if expires_at is not None and now >= expires_at
+            ]
+            for key in expired:
+                self._remove(key)
+            self._expirations += len(expired)
+        return len(expired)
+
+    def items(self):
+        """返回未过期的 (键, 值) 列表，按LRU顺序从旧到新"""
+        now = datetime.now().timestamp()
+        with self._lock:
+            return [
+                (key, value) for key, (value, expires_at, _) in self._entries.items()
+                if expires_at is None or now < expires_at
+            ]
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self):
+        """获取命名空间统计"""
+        lookups = self._hits + self._misses
+        return {
+            'entries': len(self._entries),
+            'size_bytes': self._size_bytes,
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': self._hits / lookups if lookups else 0.0,
+            'evictions': self._evictions,
+            'expirations': self._expirations
+        }
+
+class CacheManager:
+    """统一的缓存管理器
+
+    各模块通过 namespace() 获取自己的命名空间，不再直接读写共享字典。
+    新一期开奖入库时调用 on_new_draw，注册了 invalidate_on_draw 的命名空间会被清空。
+    """
+
+    def __init__(self):
+        self._namespaces = {}
+        self._lock = threading.Lock()
+        self.latest_qihao = None
+
+    def namespace(self, name, ttl=None, max_entries=None, invalidate_on_draw=False):
+        """获取或创建命名空间（首次创建时的参数生效）"""
+        with self._lock:
+            ns = self._namespaces.get(name)
+            if ns is None:
+                ns = CacheNamespace(name, ttl, max_entries, invalidate_on_draw)
+                self._namespaces[name] = ns
+            return ns
+
+    def invalidate(self, name):
+        """清空指定命名空间"""
+        ns = self._namespaces.get(name)
+        return ns.clear() if ns else 0
+
+    def on_new_draw(self, qihao):
+        """新一期开奖事件：清空与开奖绑定的命名空间"""
+        if qihao == self.latest_qihao:
+            return
+        self.latest_qihao = qihao
+        cleared = {
+            name: ns.clear()
+            for name, ns in self._namespaces.items()
+            if ns.invalidate_on_draw
+        }
+        logger.debug(f"期号 {qihao} 开奖，已失效缓存: {cleared}")
+
+    def cleanup(self):
+        """清理所有命名空间的过期条目"""
+        return sum(ns.cleanup() for ns in self._namespaces.values())
+
+    def get_stats(self):
+        """获取所有命名空间的统计"""
+        return {name: ns.get_stats() for name, ns in self._namespaces.items()}
+
+# 创建全局缓存管理器实例
+cache_manager = CacheManager()
 
 def cleanup_cache(context=None):
     """清理过期缓存"""
-    if 'cache_expiry' not in cache:
-        cache['cache_expiry'] = {}
-        return
-        
-    current_time = datetime.now().timestamp()
-    expired_keys = [
-        key for key, expiry_time in cache['cache_expiry'].items()
-        if current_time > expiry_time
-    ]
-    for key in expired_keys:
-        if key in cache:
-            del cache[key]
-        del cache['cache_expiry'][key]
-    logger.debug(f"已清理 {len(expired_keys)} 个过期缓存项") 
\ No newline at end of file
+    removed = cache_manager.cleanup()
+    logger.debug(f"已清理 {removed} 个过期缓存项，缓存统计: {cache_manager.get_stats()}")
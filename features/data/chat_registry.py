@@ -0,0 +1,152 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+
+from .db_manager import db_manager
+
+class ActiveChatRegistry:
+    """活跃聊天注册表
+
+    启动时从数据库加载一次活跃聊天，之后所有读取都在内存中完成（O(1)）。
+    添加/移除操作同步更新内存状态，再由单线程后台写入SQLite（保证写入顺序），
+    并向订阅者发布变更事件，使播报、/status 和广播状态标志读取同一份状态。
+    """
+
+    def __init__(self):
+        self._chats = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._listeners = []
+        # 单个工作线程，保证写入按提交顺序执行
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-registry")
+
+    def load(self):
+        """从数据库加载活跃聊天"""
+        chats = db_manager.get_active_chats()
+        with self._lock:
+            self._chats = set(chats)
+            self._loaded = True
+        logger.info(f"已加载活跃聊天注册表，共 {len(chats)} 个聊天")
+        self._publish('loaded', None)
+        return len(chats)
+
+    def _ensure_loaded(self):
+        """首次访问时自动加载"""
+        if not self._loaded:
+            self.load()
+
+    def subscribe(self, listener):
+        """订阅变更事件
+
+        Args:
+            listener: 回调函数 listener(event, chat_id, count)，
+                event 为 'loaded'、'added' 或 'removed'
+        """
+        self._listeners.append(listener)
+
+    def _publish(self, event, chat_id):
+        count = len(self._chats)
+        for listener in list(self._listeners):
+            try:
+                listener(event, chat_id, count)
+            except Exception as e:
+                logger.error(f"活跃聊天事件处理失败: {e}")
+
+    def _persist(self, func, chat_id):
+        """异步写入数据库"""
+        try:
+            self._writer.submit(func, chat_id)
+        except RuntimeError as e:
+            # 线程池已关闭（进程退出阶段），直接同步写入
+            logger.warning(f"后台写入不可用，改为同步写入: {e}")
+            func(chat_id)
+
+    def add(self, chat_id):
+        """添加活跃聊天，返回是否为新增"""
+        self._ensure_loaded()
+        with self._lock:
+            if chat_id in self._chats:
+                return False
+            self._chats.add(chat_id)
+        self._persist(db_manager.add_active_chat, chat_id)
+        self._publish('added', chat_id)
+        return True
+
+    def remove(self, chat_id):
+        """移除活跃聊天，返回是否确实移除"""
+        self._ensure_loaded()
+        with self._lock:
+            if chat_id not in self._chats:
+                return False
+            self._chats.discard(chat_id)
+        self._persist(db_manager.remove_active_chat, chat_id)
+        self._publish('removed', chat_id)
+        return True
+
+    def remove_many(self, chat_ids):
+        """批量移除活跃聊天，数据库中以单个事务删除
+
+        Returns:
+            list: 实际移除的聊天ID
+        """
+        self._ensure_loaded()
+        with self._lock:
+            removed = [chat_id for chat_id in set(chat_ids) if chat_id in self._chats]
+            self._chats.difference_update(removed)
+        if not removed:
+            return []
+        self._persist(db_manager.remove_active_chats, removed)
+        for chat_id in removed:
+            self._publish('removed', chat_id)
+        return removed
+
+    def migrate_many(self, migrations):
+        """把升级为超级群组的聊天迁移到新ID（活跃聊天及其看板），数据库中以单个事务更新
+
+        Args:
+            migrations: 旧聊天ID -> 新聊天ID
+
+        Returns:
+            dict: 实际迁移的聊天
+        """
+        self._ensure_loaded()
+        with self._lock:
+            migrated = {chat_id: new_chat_id for chat_id, new_chat_id in migrations.items() if chat_id in self._chats}
+            self._chats.difference_update(migrated)
+            self._chats.update(migrated.values())
+        if not migrated:
+            return {}
+        self._persist(db_manager.migrate_chats, migrated)
+        for chat_id, new_chat_id in migrated.items():
+            self._publish('removed', chat_id)
+            self._publish('added', new_chat_id)
+        return migrated
+
+    def contains(self, chat_id):
+        """检查聊天是否活跃"""
+        self._ensure_loaded()
+        return chat_id in self._chats
+
+    def get_chats(self):
+        """获取活跃聊天列表的快照"""
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._chats)
+
+    def count(self):
+        """活跃聊天数量"""
+        self._ensure_loaded()
+        return len(self._chats)
+
+    @property
+    def is_broadcasting(self):
+        """是否存在活跃的播报聊天"""
+        return self.count() > 0
+
+    def flush(self, timeout=None):
+        """等待已提交的写入完成"""
+        future = self._writer.submit(lambda: None)
+        future.result(timeout=timeout)
+
+# 创建全局活跃聊天注册表实例
+chat_registry = ActiveChatRegistry()
@@ -1,4 +1,5 @@
 import sqlite3
+import threading
 from datetime import datetime
 from loguru import logger
 import os
@@ -25,6 +26,8 @@ class DBManager:
             # 设置数据库路径
             self.db_path = db_path or DB_CONFIG.get("db_path", "lottery.db")
             self.conn = None
+            # 所有线程共用同一个连接：查询和事务块都在锁内执行，避免一个线程的提交或回滚落入另一个线程的事务
+            self._lock = threading.RLock()
             
             # 尝试连接数据库
             self.connect()
@@ -158,6 +161,17 @@ class DBManager:
                 )
             """)
             
+            # 创建实时看板表（看板模式下每个聊天保留一条被编辑的置顶消息）
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS live_boards (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL UNIQUE,
+                    message_id INTEGER,
+                    last_text TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
             # 创建用户验证表
             self.conn.execute("""
                 CREATE TABLE IF NOT EXISTS user_verification (
@@ -190,6 +204,16 @@ class DBManager:
                 )
             """)
             
+            # 创建定时任务游标表（记录分批遍历任务的进度，重启后继续）
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_cursors (
+                    name TEXT PRIMARY KEY,
+                    cursor INTEGER,
+                    started_at REAL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
             # 创建算法性能表
             self.conn.execute("""
                 CREATE TABLE IF NOT EXISTS algorithm_performance (
@@ -222,6 +246,11 @@ class DBManager:
             return False
     
     def execute_query(self, query, params=(), max_retries=3, fetch=True):
+        """在连接锁内执行查询（参数同 _execute_query）"""
+        with self._lock:
+            return self._execute_query(query, params, max_retries, fetch)
+    
+    def _execute_query(self, query, params=(), max_retries=3, fetch=True):
         """执行查询并返回结果
         
         Args:
@@ -434,6 +463,34 @@ class DBManager:
             logger.error(f"获取最新开奖记录失败: {e}")
             return None
     
+    def get_combo_history(self, after_qihao=None, until_qihao=None):
+        """按期号升序获取开奖的大小、单双标记（用于全历史统计）
+        
+        Args:
+            after_qihao: 只返回该期之后的记录，None表示从头开始
+            until_qihao: 只返回该期及之前的记录，None表示到最新一期
+            
+        Returns:
+            list: (qihao, is_big, is_odd) 元组列表，按期号升序
+        """
+        try:
+            conditions, params = [], []
+            if after_qihao is not None:
+                conditions.append("qihao > ?")
+                params.append(str(after_qihao))
+            if until_qihao is not None:
+                conditions.append("qihao <= ?")
+                params.append(str(until_qihao))
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            result = self.execute_query(
+                f"SELECT qihao, is_big, is_odd FROM lottery_records {where} ORDER BY qihao",
+                tuple(params)
+            )
+            return [(row['qihao'], bool(row['is_big']), bool(row['is_odd'])) for row in result]
+        except Exception as e:
+            logger.error(f"获取组合历史失败: {e}")
+            return []
+    
     def get_prediction_history(self, prediction_type, limit=100):
         """获取预测历史记录"""
         try:
@@ -477,10 +534,10 @@ class DBManager:
             """
             
             history = []
-            cursor = self.conn.cursor()
-            cursor.execute(query, (prediction_type, limit))
+            with self._lock:
+                rows = self.conn.execute(query, (prediction_type, limit)).fetchall()
             
-            for row in cursor.fetchall():
+            for row in rows:
                 # 构建预测历史记录
                 opennum = row[5]  # result
                 total_sum = row[6]  # sum
@@ -524,6 +581,97 @@ class DBManager:
             logger.error(f"获取预测记录失败: {e}")
             return None
     
+    def get_predictions_by_qihao(self, qihao):
+        """获取某一期全部预测类型的预测记录
+        
+        Returns:
+            dict: 预测类型 -> 预测记录
+        """
+        try:
+            records = self.execute_query("SELECT * FROM predictions WHERE qihao = ?", (qihao,))
+            return {record[3]: record for record in records}
+        except Exception as e:
+            logger.error(f"获取预测记录失败: {e}")
+            return {}
+    
+    def get_cached_predictions(self, qihao):
+        """获取某一期全部预测类型的缓存预测
+        
+        Returns:
+            dict: 预测类型 -> 缓存记录
+        """
+        try:
+            records = self.execute_query("SELECT * FROM prediction_cache WHERE qihao = ?", (qihao,))
+            return {record[3]: record for record in records}
+        except Exception as e:
+            logger.error(f"获取缓存预测失败: {e}")
+            return {}
+    
+    def save_predictions(self, predictions):
+        """在单个事务中保存多个预测记录及其预测缓存
+        
+        Args:
+            predictions: 预测数据列表（与 save_prediction 的参数相同）
+            
+        Returns:
+            int: 保存的预测数量
+        """
+        rows = []
+        for data in predictions:
+            algorithm_used = data.get('algorithm_used', {})
+            if isinstance(algorithm_used, dict):
+                algorithm_used = json.dumps(algorithm_used)
+            rows.append((data['qihao'], data['prediction'], data['prediction_type'], algorithm_used))
+        if not rows:
+            return 0
+        try:
+            if not self.conn:
+                self.connect()
+                if not self.conn:
+                    logger.error("数据库未连接，无法批量保存预测记录")
+                    return 0
+            
+            with self._lock, self.conn:
+                self.conn.executemany(
+                    """
+                    INSERT INTO predictions
+                    (qihao, prediction, prediction_type, algorithm_used, created_at)
+                    VALUES (?, ?, ?, ?, datetime('now'))
+                    ON CONFLICT(qihao, prediction_type) DO UPDATE SET
+                    prediction = excluded.prediction,
+                    algorithm_used = excluded.algorithm_used,
+                    updated_at = datetime('now')
+                    """,
+                    rows
+                )
+                self.conn.executemany(
+                    """
+                    INSERT INTO prediction_cache
+                    (qihao, prediction, prediction_type, algorithm_used)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(qihao, prediction_type) DO UPDATE SET
+                    prediction = excluded.prediction,
+                    algorithm_used = excluded.algorithm_used,
+                    created_at = CURRENT_TIMESTAMP
+                    """,
+                    rows
+                )
+                # 检查是否已有对应的开奖记录
+                qihaos = sorted({row[0] for row in rows})
+                drawn = self.conn.execute(
+                    f"SELECT qihao, opennum, sum, is_big, is_odd FROM lottery_records WHERE qihao IN ({','.join('?' * len(qihaos))})",
+                    qihaos
+                ).fetchall()
+            logger.info(f"批量保存预测记录: {', '.join(f'{row[0]} - {row[2]}' for row in rows)}")
+            
+            # 已开奖的期号立即更新预测正确性
+            for qihao, opennum, total_sum, is_big, is_odd in drawn:
+                self.update_prediction_correctness(qihao, opennum, total_sum, is_big, is_odd)
+            return len(rows)
+        except Exception as e:
+            logger.error(f"批量保存预测记录失败: {e}")
+            return 0
+    
     def update_prediction_result(self, qihao, prediction_type, opennum, total_sum, is_correct):
         """更新预测结果"""
         try:
@@ -665,6 +813,138 @@ class DBManager:
             logger.error(f"移除活跃聊天失败: {e}")
             return False
     
+    def remove_active_chats(self, chat_ids):
+        """在单个事务中批量移除活跃聊天及其看板
+        
+        Args:
+            chat_ids: 聊天ID列表
+            
+        Returns:
+            int: 移除的活跃聊天数量
+        """
+        chat_ids = [(chat_id,) for chat_id in chat_ids]
+        if not chat_ids:
+            return 0
+        try:
+            if not self.conn:
+                self.connect()
+                if not self.conn:
+                    logger.error("数据库未连接，无法批量移除活跃聊天")
+                    return 0
+            
+            with self._lock, self.conn:
+                cursor = self.conn.executemany(
+                    "DELETE FROM active_chats WHERE chat_id = ?",
+                    chat_ids
+                )
+                removed = cursor.rowcount
+                self.conn.executemany(
+                    "DELETE FROM live_boards WHERE chat_id = ?",
+                    chat_ids
+                )
+            logger.info(f"批量移除活跃聊天: {removed} 个")
+            return removed
+        except Exception as e:
+            logger.error(f"批量移除活跃聊天失败: {e}")
+            return 0
+    
+    def migrate_chats(self, migrations):
+        """在单个事务中把升级为超级群组的聊天迁移到新ID
+        
+        活跃聊天直接改为新ID；看板改为新ID并清空消息ID，下一期在新群组中重新发送并置顶。
+        
+        Args:
+            migrations: 旧聊天ID -> 新聊天ID
+            
+        Returns:
+            int: 迁移的活跃聊天数量
+        """
+        rows = [(new_chat_id, chat_id) for chat_id, new_chat_id in migrations.items()]
+        if not rows:
+            return 0
+        old_ids = [(chat_id,) for _, chat_id in rows]
+        try:
+            if not self.conn:
+                self.connect()
+                if not self.conn:
+                    logger.error("数据库未连接，无法迁移活跃聊天")
+                    return 0
+            
+            with self._lock, self.conn:
+                # 新ID已存在时保留已有记录，只删除旧ID
+                cursor = self.conn.executemany(
+                    "UPDATE OR IGNORE active_chats SET chat_id = ? WHERE chat_id = ?",
+                    rows
+                )
+                migrated = cursor.rowcount
+                self.conn.executemany(
+                    """
+                    UPDATE OR IGNORE live_boards
+                    SET chat_id = ?, message_id = NULL, last_text = NULL, updated_at = datetime('now')
+                    WHERE chat_id = ?
+                    """,
+                    rows
+                )
+                self.conn.executemany("DELETE FROM active_chats WHERE chat_id = ?", old_ids)
+                self.conn.executemany("DELETE FROM live_boards WHERE chat_id = ?", old_ids)
+            logger.info(f"迁移活跃聊天: {', '.join(f'{old} -> {new}' for new, old in rows)}")
+            return migrated
+        except Exception as e:
+            logger.error(f"迁移活跃聊天失败: {e}")
+            return 0
+    
+    def get_live_boards(self):
+        """获取所有开启看板模式的聊天
+        
+        Returns:
+            dict: chat_id -> {'message_id': 看板消息ID, 'last_text': 上次写入的内容}
+        """
+        try:
+            records = self.execute_query("SELECT chat_id, message_id, last_text FROM live_boards")
+            return {
+                record['chat_id']: {
+                    'message_id': record['message_id'],
+                    'last_text': record['last_text']
+                }
+                for record in records
+            }
+        except Exception as e:
+            logger.error(f"获取看板聊天失败: {e}")
+            return {}
+    
+    def save_live_board(self, chat_id, message_id=None, last_text=None):
+        """保存聊天的看板消息ID和最近一次内容"""
+        try:
+            self.execute_query(
+                """
+                INSERT INTO live_boards (chat_id, message_id, last_text, updated_at)
+                VALUES (?, ?, ?, datetime('now'))
+                ON CONFLICT(chat_id) DO UPDATE SET
+                message_id = excluded.message_id,
+                last_text = excluded.last_text,
+                updated_at = excluded.updated_at
+                """,
+                (chat_id, message_id, last_text),
+                fetch=False
+            )
+            return True
+        except Exception as e:
+            logger.error(f"保存看板消息失败: {e}")
+            return False
+    
+    def remove_live_board(self, chat_id):
+        """关闭聊天的看板模式"""
+        try:
+            self.execute_query(
+                "DELETE FROM live_boards WHERE chat_id = ?",
+                (chat_id,),
+                fetch=False
+            )
+            return True
+        except Exception as e:
+            logger.error(f"移除看板聊天失败: {e}")
+            return False
+    
     def update_algorithm_performance(self, pred_type, algo_num, is_correct):
         """更新算法性能"""
         try:
@@ -834,16 +1114,17 @@ class DBManager:
                     return False
             
             # 确保数据库中存在算法性能详情表
-            self.conn.execute("""
-                CREATE TABLE IF NOT EXISTS algorithm_performance_details (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    prediction_type TEXT NOT NULL,
-                    performance_data TEXT,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(prediction_type) ON CONFLICT REPLACE
-                )
-            """)
-            self.conn.commit()
+            with self._lock:
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS algorithm_performance_details (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        prediction_type TEXT NOT NULL,
+                        performance_data TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(prediction_type) ON CONFLICT REPLACE
+                    )
+                """)
+                self.conn.commit()
             
             # 保存完整性能数据
             query = """
@@ -1238,6 +1519,106 @@ class DBManager:
         except Exception as e:
             logger.error(f"获取已验证用户列表失败: {e}")
             return []
+    
+    def count_users(self):
+        """获取用户验证表中的用户总数"""
+        try:
+            result = self.execute_query("SELECT COUNT(*) AS total FROM user_verification")
+            return result[0]['total'] if result else 0
+        except Exception as e:
+            logger.error(f"获取用户总数失败: {e}")
+            return 0
+    
+    def get_users_after(self, after_user_id, limit):
+        """按user_id键集分页获取用户
+        
+        Args:
+            after_user_id: 上一页最后一个user_id，从头开始时传None
+            limit: 每页数量
+            
+        Returns:
+            list: (user_id, is_verified) 元组列表，按user_id升序
+        """
+        try:
+            if after_user_id is None:
+                query = "SELECT user_id, is_verified FROM user_verification ORDER BY user_id LIMIT ?"
+                params = (limit,)
+            else:
+                query = "SELECT user_id, is_verified FROM user_verification WHERE user_id > ? ORDER BY user_id LIMIT ?"
+                params = (after_user_id, limit)
+            result = self.execute_query(query, params)
+            return [(row['user_id'], bool(row['is_verified'])) for row in result]
+        except Exception as e:
+            logger.error(f"分页获取用户失败: {e}")
+            return []
+    
+    def apply_membership_changes(self, changes, group_id):
+        """在单个事务中批量更新用户验证状态和群组成员状态
+        
+        Args:
+            changes: (user_id, is_member) 元组列表
+            group_id: 群组ID
+            
+        Returns:
+            int: 更新的用户数量
+        """
+        if not changes:
+            return 0
+        try:
+            if not self.conn:
+                self.connect()
+                if not self.conn:
+                    logger.error("数据库未连接，无法批量更新成员状态")
+                    return 0
+            
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with self._lock, self.conn:
+                cursor = self.conn.executemany(
+                    "UPDATE user_verification SET is_verified = ?, verification_time = ? WHERE user_id = ?",
+                    [(1 if is_member else 0, current_time if is_member else None, user_id) for user_id, is_member in changes]
+                )
+                updated = cursor.rowcount
+                self.conn.executemany(
+                    "UPDATE group_members SET is_active = 0, left_at = ? WHERE user_id = ? AND group_id = ? AND is_active = 1",
+                    [(current_time, user_id, group_id) for user_id, is_member in changes if not is_member]
+                )
+            logger.info(f"批量更新成员状态: {updated} 个用户")
+            return updated
+        except Exception as e:
+            logger.error(f"批量更新成员状态失败: {e}")
+            return 0
+    
+    def get_job_cursor(self, name):
+        """获取定时任务游标
+        
+        Returns:
+            tuple: (游标, 本轮开始时间)，不存在时返回 (None, None)
+        """
+        try:
+            result = self.execute_query("SELECT cursor, started_at FROM job_cursors WHERE name = ?", (name,))
+            if result:
+                return result[0]['cursor'], result[0]['started_at']
+            return None, None
+        except Exception as e:
+            logger.error(f"获取任务游标失败: {e}")
+            return None, None
+    
+    def set_job_cursor(self, name, cursor, started_at):
+        """保存定时任务游标"""
+        try:
+            query = """
+                INSERT INTO job_cursors (name, cursor, started_at, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(name) DO UPDATE SET
+                cursor = excluded.cursor,
+                started_at = excluded.started_at,
+                updated_at = excluded.updated_at
+            """
+            self.execute_query(query, (name, cursor, started_at), fetch=False)
+            return True
+        except Exception as e:
+            logger.error(f"保存任务游标失败: {e}")
+            return False
             
     # 群组成员管理相关方法
     def add_group_member(self, user_id, group_id, username=None, first_name=None, last_name=None, status=None):
@@ -1313,6 +1694,51 @@ class DBManager:
             logger.error(f"标记用户离开群组失败: {e}")
             return False
     
+    def upsert_group_activity(self, rows, group_id):
+        """在单个事务中批量写入群组成员活跃信息
+        
+        Args:
+            rows: (user_id, username, first_name, last_name, last_seen_at) 元组列表
+            group_id: 群组ID
+            
+        Returns:
+            int: 写入的成员数量
+        """
+        if not rows:
+            return 0
+        try:
+            if not self.conn:
+                self.connect()
+                if not self.conn:
+                    logger.error("数据库未连接，无法批量写入群组活跃信息")
+                    return 0
+            
+            with self._lock, self.conn:
+                self.conn.executemany(
+                    """
+                    INSERT INTO group_members
+                    (user_id, group_id, username, first_name, last_name, status, joined_at, last_seen_at)
+                    VALUES (?, ?, ?, ?, ?, 'active', ?, ?)
+                    ON CONFLICT(user_id, group_id) DO UPDATE SET
+                    username = excluded.username,
+                    first_name = excluded.first_name,
+                    last_name = excluded.last_name,
+                    status = excluded.status,
+                    last_seen_at = excluded.last_seen_at,
+                    is_active = 1,
+                    left_at = NULL
+                    """,
+                    [
+                        (user_id, group_id, username, first_name, last_name, last_seen_at, last_seen_at)
+                        for user_id, username, first_name, last_name, last_seen_at in rows
+                    ]
+                )
+            logger.debug(f"批量写入群组活跃信息: {len(rows)} 个成员")
+            return len(rows)
+        except Exception as e:
+            logger.error(f"批量写入群组活跃信息失败: {e}")
+            return 0
+    
     def is_user_in_group(self, user_id, group_id):
         """检查用户是否在群组中（根据数据库记录）"""
         try:
@@ -0,0 +1,140 @@
+"""
+热状态快照模块
+
+各模块通过 register() 注册自己的状态段（导出函数、恢复函数、段版本号），
+定时任务把所有状态段写入一个紧凑的二进制快照文件，启动时按版本校验后恢复，
+使重启后无需重新查询数据库和网络即可恢复到全速状态。
+
+文件格式：魔数(4字节) + 格式版本(2字节) + CRC32(4字节) + zlib压缩的pickle数据。
+写入时先写临时文件再原子替换，避免进程中断留下半个文件。
+"""
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from loguru import logger
+
+from ..config.config_manager import SNAPSHOT_CONFIG
+
+SNAPSHOT_MAGIC = b'F28S'
+SNAPSHOT_FORMAT_VERSION = 1
+_HEADER = struct.Struct('>4sHI')
+
+class StateSnapshot:
+    """热状态快照管理器"""
+
+    def __init__(self, path=None):
+        self.path = path or SNAPSHOT_CONFIG["PATH"]
+        self._sections = {}  # name -> (导出函数, 恢复函数, 段版本)
+        self._lock = threading.Lock()
+
+    def register(self, name, export, restore, version=1):
+        """注册状态段
+
+        Args:
+            name: 状态段名称
+            export: 无参函数，返回可pickle的状态
+            restore: 接收状态的函数
+            version: 段版本号，状态结构变化时递增，旧快照中的该段会被忽略
+        """
+        self._sections[name] = (export, restore, version)
+
+    def save(self):
+        """写入快照
+
+        Returns:
+            bool: 是否写入成功
+        """
+        sections = {}
+        for name, (export, _, version) in self._sections.items():
+            try:
+                sections[name] = (version, export())
+            except Exception as e:
+                logger.error(f"导出状态段 {name} 失败: {e}")
+
+        with self._lock:
+            try:
+                body = zlib.compress(pickle.dumps(
+                    {'created_at': time.time(), 'sections': sections},
+                    protocol=pickle.HIGHEST_PROTOCOL
+                ))
+                data = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, zlib.crc32(body)) + body
+
+                snapshot_dir = os.path.dirname(self.path) or '.'
+                os.makedirs(snapshot_dir, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=snapshot_dir, prefix='.snapshot-')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, self.path)
+                except Exception:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                logger.debug(f"已写入状态快照: {len(sections)} 个状态段, {len(data)} 字节")
+                return True
+            except Exception as e:
+                logger.error(f"写入状态快照失败: {e}")
+                return False
+
+    def restore(self):
+        """从快照恢复已注册的状态段
+
+        Returns:
+            list: 成功恢复的状态段名称
+        """
+        if not os.path.exists(self.path):
+            logger.info("未找到状态快照，冷启动")
+            return []
+
+        started = time.time()
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            magic, format_version, checksum = _HEADER.unpack_from(data)
+            body = data[_HEADER.size:]
+            if magic != SNAPSHOT_MAGIC or format_version != SNAPSHOT_FORMAT_VERSION:
+                logger.warning(f"状态快照格式不匹配（版本 {format_version}），忽略")
+                return []
+            if zlib.crc32(body) != checksum:
+                logger.warning("状态快照校验失败，忽略")
+                return []
+            snapshot = pickle.loads(zlib.decompress(body))
+        except Exception as e:
+            logger.error(f"读取状态快照失败: {e}")
+            return []
+
+        age = time.time() - snapshot.get('created_at', 0)
+        if age > SNAPSHOT_CONFIG["MAX_AGE"]:
+            logger.info(f"状态快照已过期（{int(age)}秒前），冷启动")
+            return []
+
+        restored = []
+        for name, (version, state) in snapshot.get('sections', {}).items():
+            registered = self._sections.get(name)
+            if not registered:
+                continue
+            _, restore, expected_version = registered
+            if version != expected_version:
+                logger.warning(f"状态段 {name} 版本不匹配: 快照={version}, 当前={expected_version}，忽略")
+                continue
+            try:
+                restore(state)
+                restored.append(name)
+            except Exception as e:
+                logger.error(f"恢复状态段 {name} 失败: {e}")
+
+        logger.info(f"已从快照恢复 {len(restored)} 个状态段（{int(age)}秒前），耗时 {time.time() - started:.3f}秒: {', '.join(restored)}")
+        return restored
+
+# 创建全局状态快照实例
+state_snapshot = StateSnapshot()
+
+async def save_state_snapshot(context=None):
+    """定时任务：写入状态快照"""
+    state_snapshot.save()
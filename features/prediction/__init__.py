@@ -2,10 +2,18 @@
 预测模块包，提供各种预测功能
 """
 from features.prediction.models.predictor_model import PredictorModel
+from features.prediction.models.shadow_evaluator import ShadowEvaluator
 from features.prediction.algorithms.algorithm_library import AlgorithmLibrary
+from features.data.state_snapshot import state_snapshot
 
 # 创建预测器实例
 predictor = PredictorModel()
 algorithm_library = AlgorithmLibrary()
 
-__all__ = ['predictor', 'algorithm_library']
\ No newline at end of file
+# 创建影子评估实例（每期评估未使用的算法，更新 predictor 的性能统计）
+shadow_evaluator = ShadowEvaluator(predictor)
+
+# 注册预测器热状态（当前算法、切换器趋势和权重）到状态快照
+state_snapshot.register('predictor', predictor.export_state, predictor.restore_state)
+
+__all__ = ['predictor', 'algorithm_library', 'shadow_evaluator']
\ No newline at end of file
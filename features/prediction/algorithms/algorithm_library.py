@@ -2,6 +2,7 @@ import json
 import random
 from datetime import datetime
 from loguru import logger
+from features.prediction.algorithms.formula_engine import backtest_formulas
 
 class AlgorithmLibrary:
     def __init__(self):
@@ -169,6 +170,75 @@ class AlgorithmLibrary:
                 algo['last_updated'] = datetime.now()
                 break
 
+    def evaluate_algorithms(self, pred_type, records):
+        """用历史回测结果更新库中算法的成功率
+        
+        Args:
+            pred_type: 预测类型
+            records: 按期号倒序的开奖记录
+            
+        Returns:
+            int: 更新的算法数量
+        """
+        algorithms = self.libraries[pred_type]
+        if not algorithms:
+            return 0
+        rates = backtest_formulas([algo['formula'] for algo in algorithms], records, pred_type)
+        updated = 0
+        for algo, rate in zip(algorithms, rates):
+            if rate != rate:  # nan：公式无法编译或历史不足
+                continue
+            algo['last_success_rate'] = algo['success_rate']
+            algo['success_rate'] = float(rate)
+            algo['last_updated'] = datetime.now()
+            updated += 1
+        logger.info(f"{pred_type} 算法库回测完成: 更新 {updated}/{len(algorithms)} 个算法")
+        return updated
+    
+    def search_algorithms(self, pred_type, records, candidates=1000):
+        """生成一批候选公式，一次向量化回测后将最优的加入算法库
+        
+        Args:
+            pred_type: 预测类型
+            records: 按期号倒序的开奖记录
+            candidates: 候选公式数量
+            
+        Returns:
+            list: 加入算法库的算法
+        """
+        formulas = list(dict.fromkeys(self.generate_algorithm(pred_type)['formula'] for _ in range(candidates)))
+        rates = backtest_formulas(formulas, records, pred_type)
+        ranked = sorted(
+            ((rate, formula) for rate, formula in zip(rates, formulas) if rate == rate),
+            reverse=True
+        )
+        
+        existing = {algo['formula'] for algo in self.libraries[pred_type]}
+        added = []
+        for rate, formula in ranked:
+            if len(added) >= self.MAX_ALGORITHMS:
+                break
+            if formula in existing:
+                continue
+            # 只有优于库中最差算法时才替换
+            library = self.libraries[pred_type]
+            if len(library) >= self.MAX_ALGORITHMS and rate <= min(algo['success_rate'] for algo in library):
+                break
+            algorithm = {
+                'id': max((algo['id'] for algo in library), default=0) + 1,
+                'formula': formula,
+                'created_at': datetime.now(),
+                'success_rate': float(rate),
+                'usage_count': 0,
+                'last_success_rate': float(rate)
+            }
+            self.add_algorithm(pred_type, algorithm)
+            added.append(algorithm)
+        
+        if ranked:
+            logger.info(f"{pred_type} 候选公式回测完成: {len(formulas)} 个公式, 最高命中率 {ranked[0][0]:.2%}, 加入 {len(added)} 个")
+        return added
+    
     def get_best_algorithms(self, pred_type, top_n=3):
         """获取最佳算法"""
         sorted_algos = sorted(self.libraries[pred_type],
@@ -1,6 +1,7 @@
 """
 算法切换管理模块，处理算法切换的相关逻辑
 """
+import json
 import random
 # IDE可能错误标记此导入，但不影响程序运行
 import numpy as np  # type: ignore
@@ -8,11 +9,52 @@ from datetime import datetime, timedelta
 # IDE可能错误标记此导入，但不影响程序运行
 from loguru import logger  # type: ignore
 from features.prediction.utils.prediction_utils import calculate_confidence_score
+from features.prediction.algorithms.markov_combo_model import MARKOV_ALGORITHM
+
+# 各预测类型可用的算法号（杀组、双组另有4号高阶马尔可夫算法）
+ALGORITHM_NUMBERS = {
+    'single_double': [1, 2, 3],
+    'big_small': [1, 2, 3],
+    'kill_group': [1, 2, 3, MARKOV_ALGORITHM],
+    'double_group': [1, 2, 3, MARKOV_ALGORITHM]
+}
+
+# 实时运行时固定使用1号算法、不参与切换的预测类型
+FIXED_TYPES = ('big_small',)
+
+def credited_algorithm(pred_type, algorithm_used):
+    """开奖验证时预测结果记入的算法号
+
+    Args:
+        pred_type: 预测类型
+        algorithm_used: 预测记录的 algorithm_used（JSON字符串或字典）
+
+    Returns:
+        int: 算法号；固定算法的预测类型（大小）为1，无法解析或超出范围时也为1
+    """
+    if pred_type in FIXED_TYPES:
+        return 1
+    if not algorithm_used or (isinstance(algorithm_used, str) and not algorithm_used.strip()):
+        logger.warning(f"算法信息为空，使用默认值")
+        return 1
+    try:
+        algo_info = json.loads(algorithm_used) if isinstance(algorithm_used, str) else algorithm_used
+        algo_num = int(algo_info.get(pred_type, 1))
+    except (ValueError, TypeError, AttributeError):
+        logger.error(f"解析算法信息失败: {algorithm_used}")
+        return 1
+    if algo_num not in ALGORITHM_NUMBERS[pred_type]:
+        logger.warning(f"算法号超出有效范围: {algo_num}，使用默认值1")
+        return 1
+    return algo_num
 
 class AlgorithmSwitcher:
     """算法切换管理类，处理算法切换的相关逻辑"""
     
-    def __init__(self):
+    def __init__(self, persistence_check=True):
+        # 是否定期检查性能数据持久化（离线模拟时关闭，避免访问数据库）
+        self.persistence_check = persistence_check
+        
         # 算法切换配置
         self.switch_config = {
             'min_predictions': 3,         # 最小预测次数
@@ -60,10 +102,8 @@ class AlgorithmSwitcher:
         
         # 初始化算法性能趋势
         self.algorithm_trends = {
-            'single_double': {1: [], 2: [], 3: []},
-            'big_small': {1: [], 2: [], 3: []},
-            'kill_group': {1: [], 2: [], 3: []},
-            'double_group': {1: [], 2: [], 3: []}
+            pred_type: {algo_num: [] for algo_num in algos}
+            for pred_type, algos in ALGORITHM_NUMBERS.items()
         }
         
         # 初始化动态权重
@@ -76,16 +116,19 @@ class AlgorithmSwitcher:
         
         # 初始化时间衰减记忆
         self.performance_memory = {
-            'single_double': {1: [], 2: [], 3: []},
-            'big_small': {1: [], 2: [], 3: []},
-            'kill_group': {1: [], 2: [], 3: []},
-            'double_group': {1: [], 2: [], 3: []}
+            pred_type: {algo_num: [] for algo_num in algos}
+            for pred_type, algos in ALGORITHM_NUMBERS.items()
         }
         
         # 初始化轮换计数器
         for pred_type in ['single_double', 'big_small', 'kill_group', 'double_group']:
             self.switch_config['rotation_counter'][pred_type] = 0
     
+    @staticmethod
+    def available_algorithms(pred_type):
+        """获取预测类型可用的算法号列表"""
+        return ALGORITHM_NUMBERS.get(pred_type, [1, 2, 3])
+    
     def should_switch_algorithm(self, pred_type, current_algo, perf_data):
         """检查是否需要切换算法
         
@@ -201,7 +244,7 @@ class AlgorithmSwitcher:
         # 获取当前预测类型的动态权重
         weights = self.dynamic_weights[pred_type]
         
-        for algo_num in [1, 2, 3]:
+        for algo_num in self.available_algorithms(pred_type):
             perf = algorithm_performance[pred_type][algo_num]
             
             # 计算综合评分
@@ -258,6 +301,8 @@ class AlgorithmSwitcher:
             self.performance_memory[pred_type][algo_num].pop(0)
             
         # 每隔一段时间检查数据持久化
+        if not self.persistence_check:
+            return
         time_since_persistence = (datetime.now() - self.last_persistence_time).total_seconds()
         if time_since_persistence > 300:  # 5分钟
             self._check_persistence()
@@ -301,6 +346,29 @@ class AlgorithmSwitcher:
             self.forced_exploration_done[pred_type] = False
         logger.info("已重置所有预测类型的强制探索状态")
     
+    def export_state(self):
+        """导出切换器的趋势、权重和记忆（用于快照）"""
+        return {
+            'algorithm_trends': self.algorithm_trends,
+            'dynamic_weights': self.dynamic_weights,
+            'performance_memory': self.performance_memory,
+            'algorithm_switch_history': self.algorithm_switch_history,
+            'forced_exploration_done': self.forced_exploration_done,
+            'rotation_counter': self.switch_config['rotation_counter']
+        }
+    
+    def restore_state(self, state):
+        """从快照恢复切换器状态"""
+        # 按算法合并，快照中没有的算法（如新增算法）保留初始值
+        for pred_type, trends in state.get('algorithm_trends', {}).items():
+            self.algorithm_trends.setdefault(pred_type, {}).update(trends)
+        self.dynamic_weights.update(state.get('dynamic_weights', {}))
+        for pred_type, memory in state.get('performance_memory', {}).items():
+            self.performance_memory.setdefault(pred_type, {}).update(memory)
+        self.algorithm_switch_history.update(state.get('algorithm_switch_history', {}))
+        self.forced_exploration_done.update(state.get('forced_exploration_done', {}))
+        self.switch_config['rotation_counter'].update(state.get('rotation_counter', {}))
+    
     def force_algorithm_rotation(self, pred_type=None):
         """强制触发算法轮换"""
         if pred_type:
@@ -330,7 +398,7 @@ class AlgorithmSwitcher:
                 switch_reason = f"性能下降趋势({trend_result['trend_value']:.3f})"
             else:
                 # 否则在其他算法中随机选择，但偏好置信度较高的算法
-                other_algos = [i for i in [1, 2, 3] if i != current_algo]
+                other_algos = [i for i in self.available_algorithms(pred_type) if i != current_algo]
                 weights = []
                 for algo in other_algos:
                     perf = algorithm_performance[pred_type][algo]
@@ -395,7 +463,7 @@ class AlgorithmSwitcher:
         
         # 在select_next_algorithm方法中添加强制性探索
         if current_algo == 1 and algorithm_performance[pred_type][current_algo]['total_predictions'] > 10 and not self.forced_exploration_done.get(pred_type, False):
-            next_algo = random.choice([2, 3])
+            next_algo = random.choice([algo for algo in self.available_algorithms(pred_type) if algo != current_algo])
             self.forced_exploration_done[pred_type] = True
             switch_reason = "强制算法探索"
             logger.info(f"{pred_type}触发强制探索，从算法1切换到算法{next_algo}")
@@ -418,7 +486,7 @@ class AlgorithmSwitcher:
         """
         try:
             # 获取所有可用算法
-            all_algos = [1, 2, 3]  # 假设有3个可用算法
+            all_algos = self.available_algorithms(pred_type)
             other_algos = [algo for algo in all_algos if algo != current_algo]
             
             if not other_algos:
@@ -440,4 +508,5 @@ class AlgorithmSwitcher:
         except Exception as e:
             logger.error(f"选择下一个算法失败: {e}")
             # 简单地选择另一个算法
-            return current_algo % 3 + 1
\ No newline at end of file
+            all_algos = self.available_algorithms(pred_type)
+            return all_algos[(all_algos.index(current_algo) + 1) % len(all_algos)] if current_algo in all_algos else all_algos[0]
\ No newline at end of file
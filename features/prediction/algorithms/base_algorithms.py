@@ -2,6 +2,10 @@
 基础算法模块，包含各种预测类型的基础算法实现
 """
 from features.prediction.utils.prediction_utils import get_last_digit
+from features.prediction.utils.draw_features import COMBOS
+from features.prediction.algorithms.kill_group_stats import kill_group_stats
+from features.prediction.algorithms.scoring_weights import scoring_weights
+from features.prediction.algorithms.markov_combo_model import markov_combo_model, MARKOV_ALGORITHM
 import numpy as np
 from loguru import logger
 import random
@@ -150,6 +154,11 @@ class BaseAlgorithms:
         # 使用指定算法计算结果
         result = algorithms[algo_num](values)
         result = abs(int(round(result)))  # 取绝对值并四舍五入
+        return BaseAlgorithms.format_single_double(result)
+    
+    @staticmethod
+    def format_single_double(result):
+        """格式化单双预测结果"""
         return f"{'单' if result % 2 == 1 else '双'}{result:02d}"
     
     @staticmethod
@@ -162,6 +171,11 @@ class BaseAlgorithms:
         # 使用指定算法计算结果
         result = algorithms[algo_num](values)
         result = abs(int(round(result)))  # 取绝对值并四舍五入
+        return BaseAlgorithms.format_big_small(result, big_boundary)
+    
+    @staticmethod
+    def format_big_small(result, big_boundary=14):
+        """格式化大小预测结果"""
         return f"{'大' if result >= big_boundary else '小'}{result:02d}"
     
     @staticmethod
@@ -187,166 +201,23 @@ class BaseAlgorithms:
             result = abs(int(round(result)))
             return f"杀{'大' if result >= big_boundary else '小'}{'单' if result % 2 == 1 else '双'}"
         
+        if algo_num == MARKOV_ALGORITHM:
+            return BaseAlgorithms.predict_kill_group_markov(raw_records)
+        
         try:
-            # 分析更多历史数据，提取组合模式
-            # 增加分析的期数，从30期增加到50期
-            patterns = []  # 存储历史开奖组合模式
-            for record in raw_records[:50]:  # 分析最近50期
-                try:
-                    total_sum = int(record[4])
-                    is_big = bool(record[5])
-                    is_odd = bool(record[6])
-                    
-                    # 获取当前组合
-                    current_combo = f"{'大' if is_big else '小'}{'单' if is_odd else '双'}"
-                    patterns.append(current_combo)
-                except (IndexError, ValueError, TypeError) as e:
-                    logger.error(f"处理开奖记录失败: {e}, record: {record}")
-                    continue
-            
-            if not patterns:
-                logger.error("没有有效的开奖记录模式")
-                return f"杀{'大' if random.random() < 0.5 else '小'}{'单' if random.random() < 0.5 else '双'}"
+            # 最近50期的组合统计随每期开奖增量维护（分段计数、连续、间隔、周期、转换）
+            stats, features = kill_group_stats.features(raw_records)
             
             # 定义所有可能的组合
-            all_combos = ['大单', '大双', '小单', '小双']
-            
-            # 分析最近一期的组合
-            latest_combo = patterns[0]
-            
-            # 统计每个组合的出现次数
-            combo_counts = {combo: patterns.count(combo) for combo in all_combos}
-            
-            # 分析不同时间段的组合趋势
-            recent_patterns = patterns[:10]  # 最近10期
-            mid_patterns = patterns[10:30]   # 中期20期
-            long_patterns = patterns[30:]    # 长期数据
+            all_combos = COMBOS
             
-            recent_combo_counts = {combo: recent_patterns.count(combo) for combo in all_combos}
-            mid_combo_counts = {combo: mid_patterns.count(combo) if mid_patterns else 0 for combo in all_combos}
-            long_combo_counts = {combo: long_patterns.count(combo) if long_patterns else 0 for combo in all_combos}
+            # 每个组合的出现次数，以及最近10期的组合出现次数
+            combo_counts = dict(zip(all_combos, stats.counts))
+            recent_counts = stats.segment_counts[0]
             
-            # 分析组合的连续性和周期性
-            combo_streaks = {}  # 记录每个组合的最长连续出现次数
-            combo_gaps = {}     # 记录每个组合的最长间隔次数
-            combo_last_pos = {} # 记录每个组合最后一次出现的位置
-            combo_cycles = {}   # 记录每个组合的周期性
-            
-            # 初始化
-            for combo in all_combos:
-                combo_streaks[combo] = 0
-                combo_gaps[combo] = 0
-                combo_last_pos[combo] = -1
-                combo_cycles[combo] = []
-            
-            # 分析连续性、间隔和周期性
-            current_streaks = {combo: 0 for combo in all_combos}
-            current_gaps = {combo: 0 for combo in all_combos}
-            last_seen_pos = {combo: -1 for combo in all_combos}
-            
-            for i, combo in enumerate(patterns):
-                # 更新当前组合的连续次数
-                current_streaks[combo] += 1
-                
-                # 计算周期性
-                if last_seen_pos[combo] >= 0:
-                    cycle = i - last_seen_pos[combo]
-                    combo_cycles[combo].append(cycle)
-                last_seen_pos[combo] = i
-                
-                # 重置其他组合的连续次数
-                for other_combo in all_combos:
-                    if other_combo != combo:
-                        current_streaks[other_combo] = 0
-                        current_gaps[other_combo] += 1
-                    else:
-                        current_gaps[other_combo] = 0
-                
-                # 更新最长连续次数和间隔
-                for c in all_combos:
-                    combo_streaks[c] = max(combo_streaks[c], current_streaks[c])
-                    combo_gaps[c] = max(combo_gaps[c], current_gaps[c])
-                    if c == combo:
-                        combo_last_pos[c] = i
-            
-            # 计算平均周期
-            avg_cycles = {}
-            for combo in all_combos:
-                if combo_cycles[combo]:
-                    avg_cycles[combo] = sum(combo_cycles[combo]) / len(combo_cycles[combo])
-                else:
-                    avg_cycles[combo] = 0
-            
-            # 分析组合之间的转换模式
-            transition_matrix = {c1: {c2: 0 for c2 in all_combos} for c1 in all_combos}
-            for i in range(len(patterns) - 1):
-                current = patterns[i]
-                next_combo = patterns[i + 1]
-                transition_matrix[current][next_combo] += 1
-            
-            # 计算每个组合的权重 (考虑多种因素)
-            combo_weights = {}
-            for combo in all_combos:
-                # 基础权重 - 出现频率 (出现次数越多权重越高)
-                frequency_weight = combo_counts[combo] / len(patterns) if patterns else 0.25
-                
-                # 不同时间段的趋势权重
-                recent_weight = recent_combo_counts[combo] / len(recent_patterns) if recent_patterns else 0.25
-                mid_weight = mid_combo_counts[combo] / len(mid_patterns) if mid_patterns else 0.25
-                long_weight = long_combo_counts[combo] / len(long_patterns) if long_patterns else 0.25
-                
-                # 趋势变化权重 (最近趋势与中期趋势的差异)
-                trend_change = recent_weight - mid_weight
-                
-                # 连续性权重 (连续出现次数越多，越可能被杀)
-                streak_weight = min(combo_streaks[combo] / 5, 1.0) if combo_streaks[combo] > 0 else 0
-                
-                # 间隔权重 (间隔越长，越不可能被杀)
-                gap_weight = min(combo_gaps[combo] / 10, 1.0) if combo_gaps[combo] > 0 else 0
-                
-                # 最近出现位置权重 (越近期出现，权重越高)
-                recency_weight = 0
-                if combo_last_pos[combo] >= 0:
-                    recency_weight = 1.0 - (combo_last_pos[combo] / len(patterns)) if len(patterns) > 0 else 0
-                
-                # 周期性权重 (如果当前处于周期性高点，权重增加)
-                cycle_weight = 0
-                if avg_cycles[combo] > 0:
-                    current_pos = combo_last_pos[combo]
-                    if current_pos >= 0:
-                        periods_since_last = len(patterns) - 1 - current_pos
-                        cycle_match = (periods_since_last % avg_cycles[combo]) / avg_cycles[combo]
-                        cycle_weight = 1.0 - min(cycle_match, 1.0)  # 接近周期点时权重高
-                
-                # 转换概率权重 (基于上一期结果的转换概率)
-                transition_weight = 0
-                if latest_combo in transition_matrix:
-                    total_transitions = sum(transition_matrix[latest_combo].values())
-                    if total_transitions > 0:
-                        transition_weight = transition_matrix[latest_combo][combo] / total_transitions
-                
-                # 最近一期权重 (降低对最近一期的依赖)
-                latest_bonus = 0.05 if combo == latest_combo else 0
-                
-                # 综合权重计算 - 更加平衡的多因素分析
-                combo_weights[combo] = (
-                    frequency_weight * 0.15 +    # 历史频率 (降低权重)
-                    recent_weight * 0.20 +       # 最近趋势
-                    mid_weight * 0.10 +          # 中期趋势
-                    long_weight * 0.05 +         # 长期趋势
-                    trend_change * 0.10 +        # 趋势变化
-                    streak_weight * 0.10 +       # 连续性
-                    recency_weight * 0.10 +      # 最近出现
-                    cycle_weight * 0.10 +        # 周期性
-                    transition_weight * 0.05 +   # 转换概率
-                    latest_bonus                 # 最近一期小加成 (降低权重)
-                ) - (gap_weight * 0.05)          # 减去间隔权重 (降低权重)
-                
-                logger.debug(f"组合 {combo} 权重计算: 频率={frequency_weight:.2f}, 最近={recent_weight:.2f}, "
-                           f"中期={mid_weight:.2f}, 长期={long_weight:.2f}, 趋势变化={trend_change:.2f}, "
-                           f"连续={streak_weight:.2f}, 间隔={gap_weight:.2f}, 位置={recency_weight:.2f}, "
-                           f"周期={cycle_weight:.2f}, 转换={transition_weight:.2f}, "
-                           f"最新={latest_bonus}, 总权重={combo_weights[combo]:.2f}")
+            # 综合权重计算 - 频率、分段趋势、连续、间隔、周期、转换等多因素的加权和（权重见 scoring_weights）
+            scores = features @ np.array(scoring_weights.kill_group_vector())
+            combo_weights = dict(zip(all_combos, scores.tolist()))
             
             # 根据权重排序组合
             sorted_combos = sorted(combo_weights.items(), key=lambda x: (-x[1], random.random()))
@@ -371,11 +242,7 @@ class BaseAlgorithms:
             
             # 增加额外的随机性
             # 如果过去10期同一个组合被杀过超过3次，有25%的概率选择完全不同的组合
-            kill_history = patterns[:10]  # 最近10期
-            kill_combo_count = 0
-            for i, recent_kill in enumerate(kill_history):
-                if i < 10 and recent_kill == kill_combo:
-                    kill_combo_count += 1
+            kill_combo_count = recent_counts[all_combos.index(kill_combo)]  # 最近10期
             
             if kill_combo_count >= 3 and random.random() < 0.25:
                 # 从其他组合中随机选择
@@ -406,4 +273,23 @@ class BaseAlgorithms:
             
         except Exception as e:
             logger.error(f"杀组预测失败: {e}")
-            return f"杀{'大' if random.random() < 0.5 else '小'}{'单' if random.random() < 0.5 else '双'}" 
\ No newline at end of file
+            return f"杀{'大' if random.random() < 0.5 else '小'}{'单' if random.random() < 0.5 else '双'}" 
+    
+    @staticmethod
+    def predict_kill_group_markov(records):
+        """杀组预测实现 - 高阶马尔可夫版：杀下一期概率最低的组合
+        
+        Args:
+            records: 按期号倒序的开奖记录
+            
+        Returns:
+            str: 杀组预测结果，格式为"杀大单"等
+        """
+        try:
+            probs = markov_combo_model.predict(records)
+            logger.info(f"马尔可夫组合概率: {dict(zip(COMBOS, np.round(probs, 4).tolist()))}")
+            lowest = np.flatnonzero(probs == probs.min())
+            return f"杀{COMBOS[int(random.choice(lowest))]}"
+        except Exception as e:
+            logger.error(f"马尔可夫杀组预测失败: {e}")
+            return f"杀{random.choice(COMBOS)}"
@@ -4,6 +4,9 @@
 import random
 from loguru import logger
 from features.prediction.utils.prediction_utils import generate_special_numbers, get_last_digit
+from features.prediction.utils.draw_features import get_draw_features, COMBOS
+from features.prediction.algorithms.markov_combo_model import markov_combo_model, MARKOV_ALGORITHM
+from features.prediction.algorithms.scoring_weights import scoring_weights
 import numpy as np
 import json
 from datetime import datetime
@@ -42,32 +45,9 @@ class DoubleGroupAlgorithm:
             # 更新推荐时间
             DoubleGroupAlgorithm.last_recommendation_time = current_time
                 
-            # 分析最近的记录，计算各种组合的概率
-            recent_records = records[:30]  # 最近30期记录
-            combo_counts = {
-                '大单': 0,
-                '大双': 0,
-                '小单': 0,
-                '小双': 0
-            }
-            
-            # 统计各种组合的出现频率
-            for record in recent_records:
-                try:
-                    is_big = bool(record[5])
-                    is_odd = bool(record[6])
-                    
-                    if is_big and is_odd:
-                        combo_counts['大单'] += 1
-                    elif is_big and not is_odd:
-                        combo_counts['大双'] += 1
-                    elif not is_big and is_odd:
-                        combo_counts['小单'] += 1
-                    else:
-                        combo_counts['小双'] += 1
-                except (IndexError, TypeError) as e:
-                    logger.error(f"处理记录失败: {e}")
-                    continue
+            # 从共享的开奖特征中读取最近30期的组合频率
+            draw = get_draw_features(records)
+            combo_counts = dict(zip(COMBOS, draw.combo_counts(0, 30).tolist()))
             
             # 计算各组合的概率
             total_count = sum(combo_counts.values())
@@ -79,49 +59,33 @@ class DoubleGroupAlgorithm:
                 for combo in combo_counts:
                     combo_counts[combo] = combo_counts[combo] / total_count
             
-            # 分析最近5期的结果，降低连续出现组合的权重
-            recent_5_records = records[:5]  # 最近5期
-            recent_combos = []
-            
-            for record in recent_5_records:
-                try:
-                    is_big = bool(record[5])
-                    is_odd = bool(record[6])
-                    
-                    if is_big and is_odd:
-                        recent_combos.append('大单')
-                    elif is_big and not is_odd:
-                        recent_combos.append('大双')
-                    elif not is_big and is_odd:
-                        recent_combos.append('小单')
-                    else:
-                        recent_combos.append('小双')
-                except (IndexError, TypeError):
-                    continue
+            # 分析最近5期的结果，降低连续出现组合的权重（调整系数见 scoring_weights）
+            weights = scoring_weights.double_group
+            recent_combo_counts = dict(zip(COMBOS, draw.combo_counts(0, 5).tolist()))
             
             # 调整权重 - 降低最近出现频繁的组合权重
             for combo in combo_counts:
                 # 计算最近5期中该组合出现的次数
-                recent_count = recent_combos.count(combo)
+                recent_count = recent_combo_counts[combo]
                 # 如果最近出现频繁，降低权重
-                if recent_count >= 2:
-                    combo_counts[combo] *= (1 - 0.1 * recent_count)
+                if recent_count >= weights['repeat_threshold']:
+                    combo_counts[combo] *= (1 - weights['repeat_penalty'] * recent_count)
                     logger.info(f"组合'{combo}'最近出现{recent_count}次，降低权重")
                 
                 # 如果最近10期未出现，增加权重
-                if combo not in recent_combos and combo_counts[combo] < 0.3:
-                    combo_counts[combo] *= 1.5
+                if recent_count == 0 and combo_counts[combo] < weights['cold_limit']:
+                    combo_counts[combo] *= weights['cold_boost']
                     logger.info(f"组合'{combo}'最近未出现，增加权重")
             
             # 避免连续推荐相同组合
             if DoubleGroupAlgorithm.last_recommended_combos:
                 for combo in DoubleGroupAlgorithm.last_recommended_combos:
                     if combo in combo_counts:
-                        combo_counts[combo] *= 0.7
+                        combo_counts[combo] *= weights['last_recommended']
                         logger.info(f"组合'{combo}'上次已推荐，降低权重")
             
             # 根据算法变异系数增加随机性
-            if algo_num >= 2:
+            if algo_num in (2, 3):
                 # 增加随机因子
                 for combo in combo_counts:
                     random_factor = 0.8 + random.random() * 0.4  # 0.8-1.2的随机因子
@@ -134,8 +98,14 @@ class DoubleGroupAlgorithm:
             # 选择组合策略
             selected_combos = []
             
+            # 马尔可夫策略：选择高阶模型给出的下一期概率最高的两个组合
+            if algo_num == MARKOV_ALGORITHM:
+                probs = markov_combo_model.predict(records)
+                selected_combos = [COMBOS[int(code)] for code in np.argsort(-probs, kind='stable')[:2]]
+                logger.info(f"使用马尔可夫策略：{dict(zip(COMBOS, np.round(probs, 4).tolist()))}")
+            
             # 基础策略：选择概率最高的两个组合
-            if algo_num == 1 or random.random() < 0.4:
+            elif algo_num == 1 or random.random() < 0.4:
                 selected_combos = [sorted_combos[0][0], sorted_combos[1][0]]
                 logger.info("使用基础策略：选择概率最高的两个组合")
             
@@ -175,26 +145,9 @@ class DoubleGroupAlgorithm:
                 '小双': {'min': 0, 'max': 12, 'odd': False}    # 小双：<14且为偶数
             }
             
-            # 获取历史数据中的热门和冷门数字
-            number_frequency = {}
-            recent_numbers = set()  # 记录最近几期出现的数字
-            
-            # 初始化所有数字的出现次数为0
-            for num in range(28):  # 确保初始化0-27的所有数字
-                number_frequency[num] = 0
-                
-            # 分析历史数据中的数字出现频率
-            for idx, record in enumerate(recent_records[:30]):  # 最近30期
-                try:
-                    number = int(record[4])  # 获取和值
-                    number_frequency[number] += 1
-                    
-                    # 标记最近5期出现的数字
-                    if idx < 5:
-                        recent_numbers.add(number)
-                except Exception as e:
-                    logger.error(f"获取历史数字频率失败: {e}")
-                    continue
+            # 获取历史数据中的热门和冷门数字：最近30期各和值的出现次数，以及最近5期出现过的和值
+            number_frequency = dict(enumerate(draw.sum_counts(0, 30).tolist()))
+            recent_numbers = set(draw.sums[:5].tolist())
             
             # 查找冷门数字 (近期未出现且历史频率较低的数字)
             cold_numbers = []
@@ -0,0 +1,179 @@
+"""
+算法公式编译与向量化回测模块
+
+AlgorithmLibrary 的公式（如 "get_last_digit((A1+B2+C3)%10) + get_last_digit(A1*B1+C1)"）
+在这里解析为语法树并编译为NumPy运算：A1..C10 不再是单个数字，而是全部历史中
+每个待预测期对应的前10期数值列，一次运算即得到公式在所有历史期上的结果。
+相同的子表达式（例如多个候选公式共用的模板）在一次评估中只计算一次，
+数千个候选公式可以在一遍向量化计算中完成回测。
+"""
+import ast
+import numpy as np
+from loguru import logger
+
+from features.config.config_manager import GAME_CONFIG
+from features.prediction.utils.draw_features import get_draw_features
+
+# 公式变量：A1..A10, B1..B10, C1..C10（数字1为待预测期的上一期）
+LOOKBACK = 10
+VARIABLES = [f'{letter}{i}' for i in range(1, LOOKBACK + 1) for letter in 'ABC']
+
+_BINARY_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.Mod: np.mod,
+}
+
+def _last_digit(values):
+    """向量化的 get_last_digit：abs(int(x)) % 10"""
+    return np.abs(np.trunc(values)).astype(np.int64) % 10
+
+_FUNCTIONS = {
+    'get_last_digit': _last_digit,
+    'abs': np.abs,
+}
+
+class FormulaError(ValueError):
+    """公式包含不支持的语法"""
+
+class CompiledFormula:
+    """编译后的公式：语法树的规范化形式 + 求值函数"""
+
+    def __init__(self, source):
+        self.source = source
+        try:
+            tree = ast.parse(source, mode='eval').body
+        except SyntaxError as e:
+            raise FormulaError(f"公式语法错误: {source}: {e}") from e
+        self._node = self._compile(tree)
+
+    def _compile(self, node):
+        """将语法树转换为 (规范键, 求值函数) 的嵌套结构"""
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            left, right = self._compile(node.left), self._compile(node.right)
+            op = _BINARY_OPS[type(node.op)]
+            key = f"({left[0]}{type(node.op).__name__}{right[0]})"
+            return key, lambda env, memo: op(_evaluate(left, env, memo), _evaluate(right, env, memo))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self._compile(node.operand)
+            sign = -1 if isinstance(node.op, ast.USub) else 1
+            return f"({sign}*{operand[0]})", lambda env, memo: sign * _evaluate(operand, env, memo)
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+                and node.func.id in _FUNCTIONS and len(node.args) == 1 and not node.keywords):
+            arg = self._compile(node.args[0])
+            func = _FUNCTIONS[node.func.id]
+            return f"{node.func.id}({arg[0]})", lambda env, memo: func(_evaluate(arg, env, memo))
+        if isinstance(node, ast.Name) and node.id in VARIABLES:
+            name = node.id
+            return name, lambda env, memo: env[name]
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            value = node.value
+            return repr(value), lambda env, memo: value
+        raise FormulaError(f"公式包含不支持的语法: {ast.dump(node)}")
+
+    def evaluate(self, env, memo=None):
+        """在历史张量上求值
+
+        Args:
+            env: 变量名 -> 数值列（HistoryTensor.columns）
+            memo: 子表达式结果缓存，多个公式共用同一个字典时共享子表达式
+
+        Returns:
+            numpy.ndarray: 每个待预测期的公式结果
+        """
+        return _evaluate(self._node, env, {} if memo is None else memo)
+
+def _evaluate(node, env, memo):
+    key, func = node
+    if key not in memo:
+        memo[key] = func(env, memo)
+    return memo[key]
+
+_compiled = {}
+
+def compile_formula(source):
+    """编译公式（按源码缓存）"""
+    formula = _compiled.get(source)
+    if formula is None:
+        formula = CompiledFormula(source)
+        _compiled[source] = formula
+    return formula
+
+class HistoryTensor:
+    """(待预测期数 × 30) 的历史张量
+
+    第t行对应 records[t] 这一期：A1..C10 取自它之前的10期（records[t+1..t+10]），
+    实际结果取自 records[t] 本身。drop_invalid 为True时只保留前10期数字完整的行，
+    否则保留全部行（第t行始终对应 records[t]）。
+    """
+
+    def __init__(self, records, drop_invalid=True):
+        draw = get_draw_features(records)
+        rows = max(0, len(draw) - LOOKBACK)
+        if rows:
+            # windows[t, k, j] = digits[t+1+k, j]
+            windows = np.lib.stride_tricks.sliding_window_view(draw.digits[1:], LOOKBACK, axis=0)[:rows]
+            self.tensor = windows.transpose(0, 2, 1).reshape(rows, LOOKBACK * 3).astype(np.int64)
+        else:
+            self.tensor = np.zeros((0, LOOKBACK * 3), dtype=np.int64)
+        valid = (self.tensor >= 0).all(axis=1)
+        if not drop_invalid:
+            valid[:] = True
+        self.tensor = self.tensor[valid]
+        self.is_big = draw.is_big[:rows][valid]
+        self.is_odd = draw.is_odd[:rows][valid]
+        self.columns = {name: self.tensor[:, index] for index, name in enumerate(VARIABLES)}
+
+    def __len__(self):
+        return len(self.tensor)
+
+    def hits(self, results, pred_type, big_boundary=None):
+        """预测结果（0-27）在每一期是否命中
+
+        single_double: 结果的单双与开奖一致
+        big_small: 结果的大小与开奖一致
+        kill_group: 开奖组合不是结果对应的组合（杀中）
+        double_group: 开奖组合属于结果对应的组合及其对角组合（如 大单/小双）
+        """
+        big_boundary = GAME_CONFIG["BIG_BOUNDARY"] if big_boundary is None else big_boundary
+        results = np.abs(np.rint(results)).astype(np.int64)
+        predicted_big = results >= big_boundary
+        predicted_odd = results % 2 == 1
+        if pred_type == 'single_double':
+            return predicted_odd == self.is_odd
+        if pred_type == 'big_small':
+            return predicted_big == self.is_big
+        if pred_type == 'kill_group':
+            return (predicted_big != self.is_big) | (predicted_odd != self.is_odd)
+        if pred_type == 'double_group':
+            return (predicted_big == predicted_odd) == (self.is_big == self.is_odd)
+        raise ValueError(f"未知的预测类型: {pred_type}")
+
+def backtest_formulas(formulas, records, pred_type):
+    """在历史记录上回测一批公式
+
+    Args:
+        formulas: 公式源码列表
+        records: 按期号倒序的开奖记录
+        pred_type: 预测类型
+
+    Returns:
+        numpy.ndarray: 每个公式的命中率；无法编译的公式或可用历史不足时为nan
+    """
+    history = HistoryTensor(records)
+    rates = np.full(len(formulas), np.nan)
+    if not len(history):
+        logger.warning("历史记录不足，无法回测公式")
+        return rates
+    memo = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for index, source in enumerate(formulas):
+            try:
+                results = compile_formula(source).evaluate(history.columns, memo)
+                results = np.broadcast_to(results, (len(history),))
+                rates[index] = history.hits(np.nan_to_num(results), pred_type).mean()
+            except FormulaError as e:
+                logger.error(f"{e}")
+    return rates
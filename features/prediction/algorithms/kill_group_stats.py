@@ -0,0 +1,288 @@
+"""
+杀组滑动窗口统计模块
+
+杀组预测基于最近50期的大小单双组合计算各项权重：分段（最近10期/中期20期/长期）出现次数、
+最长连续、最长间隔、平均周期和转换次数。这些统计随新一期开奖增量更新：
+新一期从窗口头部进入、最早一期从尾部移出，每次更新为均摊O(1)，不再每次预测都重算整个窗口。
+"""
+import threading
+from collections import deque
+import numpy as np
+from loguru import logger
+
+from features.prediction.utils.draw_features import get_draw_features, COMBOS
+from features.prediction.algorithms.scoring_weights import KILL_GROUP_FEATURES
+
+# 杀组分析的窗口期数
+WINDOW = 50
+
+# 分段边界：[0, 10) 最近，[10, 30) 中期，[30, WINDOW) 长期
+SEGMENT_BOUNDS = (10, 30)
+
+def combo_code(record):
+    """开奖记录的大小单双组合编码（与 COMBOS 顺序一致）"""
+    return (0 if record[5] else 2) + (0 if record[6] else 1)
+
+class _MaxCounter:
+    """长度直方图，维护当前最大值（最大值只在对应计数归零时向下查找，均摊O(1)）"""
+
+    def __init__(self, size):
+        self._counts = [0] * (size + 2)
+        self.max = 0
+
+    def add(self, value):
+        self._counts[value] += 1
+        if value > self.max:
+            self.max = value
+
+    def remove(self, value):
+        self._counts[value] -= 1
+        while self.max > 0 and self._counts[self.max] == 0:
+            self.max -= 1
+
+class SlidingComboStats:
+    """最近 capacity 期组合的滑动窗口统计（位置0为最新一期）"""
+
+    def __init__(self, capacity=WINDOW):
+        self.capacity = capacity
+        self._codes = deque()       # 左侧最早，右侧最新
+        self._t = -1                # 最新一期的序号（每进入一期加1）
+        self.counts = [0] * len(COMBOS)
+        self.segment_counts = [[0] * len(COMBOS) for _ in range(len(SEGMENT_BOUNDS) + 1)]
+        self.transitions = [[0] * len(COMBOS) for _ in COMBOS]  # 第i期 -> 第i+1期
+        self._occurrences = [deque() for _ in COMBOS]           # 各组合出现的序号，右侧最新
+        self._runs = deque()                                    # [组合, 长度]，左侧最早
+        self._streaks = [_MaxCounter(capacity) for _ in COMBOS]
+        self._gaps = [_MaxCounter(capacity) for _ in COMBOS]    # 相邻两次出现之间的间隔
+
+    @classmethod
+    def from_codes(cls, codes, capacity=WINDOW):
+        """从按期号倒序的组合编码构建"""
+        stats = cls(capacity)
+        for code in reversed(list(codes)[:capacity]):
+            stats.push(code)
+        return stats
+
+    def __len__(self):
+        return len(self._codes)
+
+    @property
+    def latest_code(self):
+        return self._codes[-1]
+
+    def _code_at(self, position):
+        return self._codes[-1 - position]
+
+    def push(self, code):
+        """新一期进入窗口头部，超出容量时移出最早一期"""
+        code = int(code)
+        # 跨越分段边界的两期移入下一个分段
+        for segment, bound in enumerate(SEGMENT_BOUNDS):
+            if len(self._codes) >= bound:
+                moved = self._code_at(bound - 1)
+                self.segment_counts[segment][moved] -= 1
+                self.segment_counts[segment + 1][moved] += 1
+
+        if self._codes:
+            self.transitions[code][self.latest_code] += 1
+        self._t += 1
+        self._codes.append(code)
+        self.counts[code] += 1
+        self.segment_counts[0][code] += 1
+
+        occurrences = self._occurrences[code]
+        if occurrences:
+            self._gaps[code].add(self._t - occurrences[-1] - 1)
+        occurrences.append(self._t)
+
+        if self._runs and self._runs[-1][0] == code:
+            run = self._runs[-1]
+            self._streaks[code].remove(run[1])
+            run[1] += 1
+        else:
+            run = [code, 1]
+            self._runs.append(run)
+        self._streaks[code].add(run[1])
+
+        if len(self._codes) > self.capacity:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        """移出窗口尾部的最早一期"""
+        oldest_t = self._t - len(self._codes) + 1
+        code = self._codes.popleft()
+        self.counts[code] -= 1
+        self.segment_counts[self._segment_of(len(self._codes))][code] -= 1
+        if self._codes:
+            self.transitions[self._codes[0]][code] -= 1
+
+        occurrences = self._occurrences[code]
+        occurrences.popleft()
+        if occurrences:
+            self._gaps[code].remove(occurrences[0] - oldest_t - 1)
+
+        run = self._runs[0]
+        self._streaks[code].remove(run[1])
+        run[1] -= 1
+        if run[1]:
+            self._streaks[code].add(run[1])
+        else:
+            self._runs.popleft()
+
+    @staticmethod
+    def _segment_of(position):
+        for segment, bound in enumerate(SEGMENT_BOUNDS):
+            if position < bound:
+                return segment
+        return len(SEGMENT_BOUNDS)
+
+    def segment_lengths(self):
+        """各分段当前的期数"""
+        lengths, start = [], 0
+        for bound in SEGMENT_BOUNDS:
+            lengths.append(max(0, min(len(self), bound) - start))
+            start = bound
+        lengths.append(max(0, len(self) - start))
+        return lengths
+
+    def max_streak(self, code):
+        """组合在窗口内的最长连续出现期数"""
+        return self._streaks[code].max
+
+    def max_gap(self, code):
+        """组合在窗口内的最长连续未出现期数"""
+        occurrences = self._occurrences[code]
+        if not occurrences:
+            return len(self)
+        leading = self._t - occurrences[-1]
+        trailing = occurrences[0] - (self._t - len(self) + 1)
+        return max(self._gaps[code].max, leading, trailing)
+
+    def last_pos(self, code):
+        """组合最后一次（窗口内最早一期）出现的位置，未出现为-1"""
+        occurrences = self._occurrences[code]
+        return self._t - occurrences[0] if occurrences else -1
+
+    def avg_cycle(self, code):
+        """组合相邻两次出现的平均间隔，出现少于两次为0"""
+        occurrences = self._occurrences[code]
+        if len(occurrences) < 2:
+            return 0
+        return (occurrences[-1] - occurrences[0]) / (len(occurrences) - 1)
+
+def combo_features(stats):
+    """杀组打分使用的各组合特征
+
+    Args:
+        stats: 窗口统计
+
+    Returns:
+        numpy.ndarray: (4, 特征数)，行按 COMBOS 顺序，列按 KILL_GROUP_FEATURES 顺序
+    """
+    total = len(stats)
+    latest_code = stats.latest_code
+    recent_len, mid_len, long_len = stats.segment_lengths()
+    recent_counts, mid_counts, long_counts = stats.segment_counts
+    # 组合之间的转换模式：以最近一期组合为起点的转换次数
+    transitions = stats.transitions[latest_code]
+    total_transitions = sum(transitions)
+
+    rows = []
+    for code in range(len(COMBOS)):
+        feature = {}
+        # 基础权重 - 出现频率 (出现次数越多权重越高)
+        feature['frequency'] = stats.counts[code] / total
+        # 不同时间段（最近10期、中期20期、长期）的趋势权重
+        feature['recent'] = recent_counts[code] / recent_len if recent_len else 0.25
+        feature['mid'] = mid_counts[code] / mid_len if mid_len else 0.25
+        feature['long'] = long_counts[code] / long_len if long_len else 0.25
+        # 趋势变化权重 (最近趋势与中期趋势的差异)
+        feature['trend'] = feature['recent'] - feature['mid']
+        # 连续性权重 (连续出现次数越多，越可能被杀)
+        feature['streak'] = min(stats.max_streak(code) / 5, 1.0)
+        # 最近出现位置权重 (越近期出现，权重越高)
+        last_pos = stats.last_pos(code)
+        feature['recency'] = 1.0 - (last_pos / total) if last_pos >= 0 else 0
+        # 周期性权重 (接近周期点时权重高)
+        feature['cycle'] = 0
+        avg_cycle = stats.avg_cycle(code)
+        if avg_cycle > 0 and last_pos >= 0:
+            periods_since_last = total - 1 - last_pos
+            cycle_match = (periods_since_last % avg_cycle) / avg_cycle
+            feature['cycle'] = 1.0 - min(cycle_match, 1.0)
+        # 转换概率权重 (基于上一期结果的转换概率)
+        feature['transition'] = transitions[code] / total_transitions if total_transitions > 0 else 0
+        # 是否为最近一期的组合
+        feature['latest'] = 1.0 if code == latest_code else 0
+        # 间隔权重 (间隔越长，越不可能被杀)
+        feature['gap'] = min(stats.max_gap(code) / 10, 1.0)
+        rows.append([feature[name] for name in KILL_GROUP_FEATURES])
+    return np.array(rows, dtype=float)
+
+class KillGroupStatsEngine:
+    """按最新期号维护杀组滑动窗口统计"""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._stats = None
+        self._features = None
+        self._latest_record = None
+        self._lock = threading.Lock()
+        self._incremental = 0
+        self._rebuilds = 0
+
+    def sync(self, records):
+        """获取与 records 对应的窗口统计
+
+        records[1] 为已统计的最新一期时只需增量推入 records[0]，否则从记录重建。
+
+        Args:
+            records: 按期号倒序的开奖记录
+
+        Returns:
+            SlidingComboStats: 最近 min(window, len(records)) 期的统计
+        """
+        size = min(self.window, len(records))
+        with self._lock:
+            stats = self._stats
+            if stats is not None and self._latest_record == records[0] and len(stats) == size:
+                return stats
+            if (stats is not None and len(records) > 1 and self._latest_record == records[1]
+                    and min(len(stats) + 1, self.window) == size):
+                stats.push(combo_code(records[0]))
+                self._incremental += 1
+            else:
+                stats = SlidingComboStats.from_codes(get_draw_features(records).head(size).combo_codes, self.window)
+                self._rebuilds += 1
+                logger.debug(f"重建杀组窗口统计: {size} 期")
+            self._stats = stats
+            self._features = None
+            self._latest_record = records[0]
+            return stats
+
+    def features(self, records):
+        """获取与 records 对应的窗口统计及其杀组特征
+
+        同一窗口的特征只计算一次，杀组的各个算法（包括影子评估）共用。
+
+        Returns:
+            tuple: (SlidingComboStats, combo_features 的结果)
+        """
+        stats = self.sync(records)
+        with self._lock:
+            if self._stats is not stats:
+                return stats, combo_features(stats)
+            if self._features is None:
+                self._features = combo_features(stats)
+            return stats, self._features
+
+    def get_stats(self):
+        """获取更新统计"""
+        return {
+            'latest_qihao': self._latest_record[1] if self._latest_record else None,
+            'incremental': self._incremental,
+            'rebuilds': self._rebuilds
+        }
+
+# 创建全局杀组窗口统计实例
+kill_group_stats = KillGroupStatsEngine()
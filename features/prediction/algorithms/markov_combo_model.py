@@ -0,0 +1,194 @@
+"""
+高阶马尔可夫组合模型
+
+在全部历史开奖的大小单双组合序列上维护1到4阶的n-gram计数：
+第k阶以最近k期组合（4^k 种上下文）为条件，统计下一期各组合出现的次数，
+计数保存在紧凑的整数数组中。每期开奖只需对各阶的一个单元加1（O(阶数)），
+查询下一期各组合的概率只需读取当前上下文对应的各阶计数（O(阶数×4)），与历史长度无关。
+"""
+import threading
+import numpy as np
+from loguru import logger
+
+from features.config.config_manager import ALGORITHM_CONFIG
+from features.data.db_manager import db_manager
+from features.prediction.utils.draw_features import COMBOS
+from features.prediction.algorithms.kill_group_stats import combo_code
+
+# 马尔可夫模型在杀组、双组中的算法号
+MARKOV_ALGORITHM = 4
+
+# 支持的最高阶数
+MAX_ORDER = 4
+
+class MarkovComboModel:
+    """大小单双组合序列的1..max_order阶计数模型"""
+
+    def __init__(self, max_order=MAX_ORDER, smoothing=2.0):
+        self.max_order = max(1, min(int(max_order), MAX_ORDER))
+        self.smoothing = smoothing
+        size = len(COMBOS)
+        self.unigram = np.zeros(size, dtype=np.int64)
+        # counts[k]: (4^k, 4)，行为最近k期组成的上下文，列为下一期组合
+        self.counts = [None] + [np.zeros((size ** k, size), dtype=np.int32) for k in range(1, self.max_order + 1)]
+        self.totals = [None] + [np.zeros(size ** k, dtype=np.int32) for k in range(1, self.max_order + 1)]
+        self._context = 0   # 最近 max_order 期的4进制编码，最低位为最新一期
+        self._length = 0    # 已观察的期数
+
+    @classmethod
+    def from_codes(cls, codes, **kwargs):
+        """从按时间顺序（最早在前）的组合编码构建（向量化计数，与逐期 observe 结果相同）"""
+        model = cls(**kwargs)
+        codes = np.asarray(codes, dtype=np.int64)
+        size = len(COMBOS)
+        model.unigram += np.bincount(codes, minlength=size)
+        for order in range(1, model.max_order + 1):
+            if len(codes) <= order:
+                break
+            # 第i期之前order期的上下文编码，最低位为最近一期
+            contexts = np.zeros(len(codes) - order, dtype=np.int64)
+            for lag in range(order, 0, -1):
+                contexts = contexts * size + codes[order - lag:len(codes) - lag]
+            np.add.at(model.counts[order], (contexts, codes[order:]), 1)
+            model.totals[order] += np.bincount(contexts, minlength=size ** order).astype(np.int32)
+        for code in codes[-model.max_order:]:
+            model._context = (model._context * size + int(code)) % (size ** model.max_order)
+        model._length = len(codes)
+        return model
+
+    def __len__(self):
+        return self._length
+
+    def _context_index(self, order):
+        """当前上下文在第order阶计数中的行号"""
+        return self._context % (len(COMBOS) ** order)
+
+    def observe(self, code):
+        """新一期组合进入序列，各阶计数加1"""
+        code = int(code)
+        for order in range(1, min(self._length, self.max_order) + 1):
+            row = self._context_index(order)
+            self.counts[order][row, code] += 1
+            self.totals[order][row] += 1
+        self.unigram[code] += 1
+        self._context = (self._context * len(COMBOS) + code) % (len(COMBOS) ** self.max_order)
+        self._length += 1
+
+    def probabilities(self, max_order=None):
+        """下一期各组合的概率（按 COMBOS 顺序）
+
+        从0阶（拉普拉斯平滑的总体频率）开始逐阶插值：第k阶概率为
+        (计数 + 平滑强度 × 第k-1阶概率) / (上下文总数 + 平滑强度)，
+        上下文出现越多，高阶计数的影响越大；未出现过的上下文直接沿用低阶概率。
+
+        Args:
+            max_order: 使用的最高阶数，默认使用模型的全部阶数
+
+        Returns:
+            numpy.ndarray: 长度为4、和为1的概率数组
+        """
+        size = len(COMBOS)
+        probs = (self.unigram + 1) / (self._length + size)
+        top = min(max_order or self.max_order, self.max_order, self._length)
+        for order in range(1, top + 1):
+            row = self._context_index(order)
+            total = self.totals[order][row]
+            if total:
+                probs = (self.counts[order][row] + self.smoothing * probs) / (total + self.smoothing)
+        return probs
+
+class MarkovComboEngine:
+    """按最新期号维护全历史马尔可夫组合模型"""
+
+    def __init__(self):
+        self._model = None
+        self._latest_qihao = None
+        self._lock = threading.Lock()
+        self._incremental = 0
+        self._rebuilds = 0
+
+    def _new_model(self):
+        return MarkovComboModel(
+            max_order=ALGORITHM_CONFIG["MARKOV_MAX_ORDER"],
+            smoothing=ALGORITHM_CONFIG["MARKOV_SMOOTHING"]
+        )
+
+    def _observe_history(self, rows):
+        """按时间顺序观察 get_combo_history 返回的记录"""
+        for qihao, is_big, is_odd in rows:
+            self._model.observe((0 if is_big else 2) + (0 if is_odd else 1))
+            self._latest_qihao = int(qihao)
+
+    def _pending(self, records):
+        """records 中尚未观察的记录（按期号倒序，遇到已观察的期号即停止）"""
+        if self._latest_qihao is None:
+            return list(records)
+        pending = []
+        for record in records:
+            if int(record[1]) <= self._latest_qihao:
+                break
+            pending.append(record)
+        return pending
+
+    def sync(self, records):
+        """获取已观察到 records[0] 的模型
+
+        首次使用（或回到更早的期号）时从数据库加载全部历史；之后只观察新的开奖，
+        records 与已观察的期号之间有缺口时从数据库补齐。
+
+        Args:
+            records: 按期号倒序的开奖记录
+
+        Returns:
+            MarkovComboModel: 模型
+        """
+        latest = int(records[0][1])
+        with self._lock:
+            if self._model is not None and self._latest_qihao == latest:
+                return self._model
+
+            if self._model is None or self._latest_qihao is None or latest < self._latest_qihao:
+                self._model = self._new_model()
+                self._latest_qihao = None
+                self._observe_history(db_manager.get_combo_history(until_qihao=records[0][1]))
+                self._rebuilds += 1
+                logger.info(f"马尔可夫组合模型已加载 {len(self._model)} 期历史")
+
+            pending = self._pending(records)
+            if pending and self._latest_qihao is not None and int(pending[-1][1]) > self._latest_qihao + 1:
+                # 传入的记录没有覆盖到已观察的最新一期，先从数据库补齐
+                self._observe_history(db_manager.get_combo_history(self._latest_qihao, pending[-1][1]))
+                pending = self._pending(pending)
+
+            for record in reversed(pending):
+                self._model.observe(combo_code(record))
+                self._latest_qihao = int(record[1])
+                self._incremental += 1
+            return self._model
+
+    def reset(self, model, latest_qihao):
+        """直接设置模型（回测时由历史前缀构建，避免读取数据库）
+
+        Args:
+            model: 已观察到 latest_qihao 的模型
+            latest_qihao: 模型已观察的最新期号
+        """
+        with self._lock:
+            self._model = model
+            self._latest_qihao = int(latest_qihao)
+
+    def predict(self, records):
+        """下一期各组合的概率"""
+        return self.sync(records).probabilities()
+
+    def get_stats(self):
+        """获取更新统计"""
+        return {
+            'latest_qihao': self._latest_qihao,
+            'observed': len(self._model) if self._model is not None else 0,
+            'incremental': self._incremental,
+            'rebuilds': self._rebuilds
+        }
+
+# 创建全局马尔可夫组合模型实例
+markov_combo_model = MarkovComboEngine()
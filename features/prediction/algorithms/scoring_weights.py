@@ -0,0 +1,121 @@
+"""
+杀组、双组打分权重模块
+
+杀组的组合得分是各项窗口统计的线性加权，双组的组合概率经过若干乘数调整，
+这些权重原本直接写在算法中。这里保存默认值，并在启动时加载 weight_search 搜索得到的
+带版本号的权重文件；文件不存在或无效时使用默认值，与原算法完全一致。
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from loguru import logger
+
+from features.config.config_manager import ALGORITHM_CONFIG
+
+# 杀组各项特征的权重（特征顺序同 KILL_GROUP_FEATURES，间隔为负权重：间隔越长越不可能被杀）
+DEFAULT_KILL_GROUP_WEIGHTS = {
+    'frequency': 0.15,    # 历史频率
+    'recent': 0.20,       # 最近趋势
+    'mid': 0.10,          # 中期趋势
+    'long': 0.05,         # 长期趋势
+    'trend': 0.10,        # 趋势变化
+    'streak': 0.10,       # 连续性
+    'recency': 0.10,      # 最近出现
+    'cycle': 0.10,        # 周期性
+    'transition': 0.05,   # 转换概率
+    'latest': 0.05,       # 最近一期加成
+    'gap': -0.05          # 间隔
+}
+
+KILL_GROUP_FEATURES = tuple(DEFAULT_KILL_GROUP_WEIGHTS)
+
+# 双组组合概率的调整系数
+DEFAULT_DOUBLE_GROUP_WEIGHTS = {
+    'repeat_threshold': 2,      # 最近5期出现不少于该次数时降低权重
+    'repeat_penalty': 0.1,      # 每出现一次降低的比例
+    'cold_limit': 0.3,          # 最近5期未出现且概率低于该值时增加权重
+    'cold_boost': 1.5,          # 未出现组合的权重乘数
+    'last_recommended': 0.7     # 上次已推荐组合的权重乘数
+}
+
+class ScoringWeights:
+    """当前使用的打分权重（带版本号的JSON文件）"""
+
+    def __init__(self, path=None):
+        self.path = path or ALGORITHM_CONFIG["SCORING_WEIGHTS_PATH"]
+        self.version = 0
+        self.kill_group = dict(DEFAULT_KILL_GROUP_WEIGHTS)
+        self.double_group = dict(DEFAULT_DOUBLE_GROUP_WEIGHTS)
+        self._lock = threading.Lock()
+        self.load()
+
+    def kill_group_vector(self):
+        """按 KILL_GROUP_FEATURES 顺序的杀组权重列表"""
+        return [self.kill_group[name] for name in KILL_GROUP_FEATURES]
+
+    def load(self):
+        """从文件加载权重，缺少的项使用默认值
+
+        Returns:
+            bool: 是否从文件加载
+        """
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            kill_group = {**DEFAULT_KILL_GROUP_WEIGHTS, **{
+                name: float(value) for name, value in data.get('kill_group', {}).items()
+                if name in DEFAULT_KILL_GROUP_WEIGHTS
+            }}
+            double_group = {**DEFAULT_DOUBLE_GROUP_WEIGHTS, **{
+                name: type(DEFAULT_DOUBLE_GROUP_WEIGHTS[name])(value)
+                for name, value in data.get('double_group', {}).items()
+                if name in DEFAULT_DOUBLE_GROUP_WEIGHTS
+            }}
+            with self._lock:
+                self.kill_group, self.double_group = kill_group, double_group
+                self.version = int(data.get('version', 0))
+            logger.info(f"已加载打分权重 v{self.version}: {self.path}")
+            return True
+        except Exception as e:
+            logger.error(f"加载打分权重失败，使用默认值: {e}")
+            return False
+
+    def save(self, kill_group=None, double_group=None, metrics=None):
+        """写入新版本的权重文件（上一版本保留为 .v<版本号> 备份）
+
+        Args:
+            kill_group: 新的杀组权重，None 表示沿用当前值
+            double_group: 新的双组系数，None 表示沿用当前值
+            metrics: 搜索结果等附加信息
+
+        Returns:
+            int: 新的版本号
+        """
+        with self._lock:
+            version = self.version + 1
+            data = {
+                'version': version,
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'kill_group': {**self.kill_group, **(kill_group or {})},
+                'double_group': {**self.double_group, **(double_group or {})},
+                'metrics': metrics or {}
+            }
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(self.path):
+                os.replace(self.path, f"{self.path}.v{self.version}")
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+            self.kill_group, self.double_group = data['kill_group'], data['double_group']
+            self.version = version
+        logger.info(f"打分权重 v{version} 已写入 {self.path}")
+        return version
+
+# 创建全局打分权重实例
+scoring_weights = ScoringWeights()
@@ -0,0 +1,175 @@
+"""
+推测预计算模块
+
+单双、大小预测只依赖最近10期的A1..C10值，下一期开奖只可能是1000种数字组合之一。
+在两期开奖之间，对全部1000种可能的下一期号码向量化地预先计算预测结果，
+真实开奖到达后只需查表即可得到下一期预测。
+"""
+import random
+import threading
+import numpy as np
+from loguru import logger
+
+from features.prediction.algorithms.base_algorithms import BaseAlgorithms
+from features.prediction.utils.prediction_utils import prepare_test_values
+
+# 预测值的列顺序：A1..A10, B1..B10, C1..C10
+VALUE_KEYS = [f"{letter}{i}" for letter in 'ABC' for i in range(1, 11)]
+
+# 支持推测预计算的预测类型：类型 -> (算法集合, 结果格式化函数)
+SPECULATIVE_TYPES = {
+    'single_double': (BaseAlgorithms.get_single_double_algorithms, BaseAlgorithms.format_single_double),
+    'big_small': (BaseAlgorithms.get_big_small_algorithms, BaseAlgorithms.format_big_small),
+}
+
+def _linear_coefficients(algorithm):
+    """探测算法对A1..C10的线性系数
+
+    Returns:
+        tuple: (截距, 系数数组)；算法不是线性函数时返回None
+    """
+    zero = {key: 0 for key in VALUE_KEYS}
+    intercept = algorithm(zero)
+    coefficients = np.zeros(len(VALUE_KEYS))
+    for index, key in enumerate(VALUE_KEYS):
+        probe = dict(zero)
+        probe[key] = 1
+        coefficients[index] = algorithm(probe) - intercept
+
+    # 用随机样本校验线性关系
+    rng = random.Random(0)
+    for _ in range(5):
+        sample = {key: rng.randint(0, 9) for key in VALUE_KEYS}
+        expected = intercept + sum(coefficients[i] * sample[key] for i, key in enumerate(VALUE_KEYS))
+        if abs(algorithm(sample) - expected) > 1e-9:
+            return None
+    return intercept, coefficients
+
+def _candidate_matrix(values):
+    """构建1000种下一期号码对应的A1..C10矩阵
+
+    下一期开奖成为A1/B1/C1，当前的第i期顺移为第i+1期。
+
+    Args:
+        values: 当前的A1..C10值（prepare_test_values 的返回值）
+
+    Returns:
+        np.ndarray: 形状为 (1000, 30)，第 a*100+b*10+c 行对应号码 a+b+c
+    """
+    digits = np.arange(1000)
+    matrix = np.zeros((1000, len(VALUE_KEYS)))
+    for offset, letter in enumerate('ABC'):
+        base = offset * 10
+        matrix[:, base] = (digits // (100, 10, 1)[offset]) % 10
+        for i in range(1, 10):
+            matrix[:, base + i] = values.get(f"{letter}{i}", 0)
+    return matrix
+
+def _triple_index(opennum):
+    """开奖号码转为查表下标"""
+    parts = opennum.split('+') if '+' in opennum else list(opennum)
+    if len(parts) != 3:
+        raise ValueError(f"开奖号码格式错误: {opennum}")
+    a, b, c = (int(part) for part in parts)
+    return a * 100 + b * 10 + c
+
+class SpeculativeEngine:
+    """下一期预测的推测预计算引擎"""
+
+    def __init__(self):
+        self._base_qihao = None
+        self._tables = {}   # (预测类型, 算法号) -> np.ndarray[1000]（四舍五入后的结果值）
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coefficients = {}
+        for pred_type, (get_algorithms, _) in SPECULATIVE_TYPES.items():
+            for algo_num, algorithm in get_algorithms().items():
+                linear = _linear_coefficients(algorithm)
+                if linear is None:
+                    logger.warning(f"{pred_type}算法{algo_num}不是线性公式，不参与推测预计算")
+                    continue
+                self._coefficients[(pred_type, algo_num)] = linear
+
+    @property
+    def base_qihao(self):
+        return self._base_qihao
+
+    def prepare(self, records):
+        """基于当前最新开奖，预计算下一期全部可能号码对应的预测
+
+        Args:
+            records: 按期号倒序的开奖记录（至少10期）
+
+        Returns:
+            bool: 是否完成预计算
+        """
+        if not records or len(records) < 10:
+            return False
+        base_qihao = records[0][1]
+        if base_qihao == self._base_qihao:
+            return True
+        try:
+            values = prepare_test_values(records)
+            matrix = _candidate_matrix(values)
+            tables = {}
+            for key, (intercept, coefficients) in self._coefficients.items():
+                raw = matrix @ coefficients + intercept
+                result = np.abs(np.round(raw)).astype(int)
+                # 与 Python round 在 .5 附近的取整可能不一致，这些行回退为逐行计算
+                ambiguous = np.nonzero(np.abs(np.abs(raw - np.floor(raw)) - 0.5) < 1e-9)[0]
+                if ambiguous.size:
+                    algorithm = SPECULATIVE_TYPES[key[0]][0]()[key[1]]
+                    for row in ambiguous:
+                        sample = dict(zip(VALUE_KEYS, matrix[row].astype(int).tolist()))
+                        result[row] = abs(int(round(algorithm(sample))))
+                tables[key] = result
+            with self._lock:
+                self._tables = tables
+                self._base_qihao = base_qihao
+            logger.debug(f"已推测预计算{base_qihao}期之后的{len(tables)}组预测表")
+            return True
+        except Exception as e:
+            logger.error(f"推测预计算失败: {e}")
+            return False
+
+    def lookup(self, pred_type, algo_num, records, big_boundary=14):
+        """查表获取预测结果
+
+        Args:
+            pred_type: 预测类型
+            algo_num: 算法号
+            records: 按期号倒序的开奖记录，records[0] 为刚到达的开奖
+            big_boundary: 大小分界
+
+        Returns:
+            str: 预测结果；未命中（预计算的基准期号不匹配等）时返回None
+        """
+        if pred_type not in SPECULATIVE_TYPES or not records or len(records) < 10:
+            return None
+        table = self._tables.get((pred_type, algo_num))
+        if table is None or records[1][1] != self._base_qihao:
+            self._misses += 1
+            return None
+        try:
+            result = int(table[_triple_index(records[0][3])])
+        except (ValueError, TypeError, IndexError):
+            self._misses += 1
+            return None
+        self._hits += 1
+        formatter = SPECULATIVE_TYPES[pred_type][1]
+        if pred_type == 'big_small':
+            return formatter(result, big_boundary)
+        return formatter(result)
+
+    def get_stats(self):
+        """获取命中统计"""
+        return {
+            'base_qihao': self._base_qihao,
+            'tables': len(self._tables),
+            'hits': self._hits,
+            'misses': self._misses
+        }
+
+# 创建全局推测预计算引擎实例
+speculative_engine = SpeculativeEngine()
@@ -0,0 +1,328 @@
+"""
+历史回测引擎
+
+按时间顺序重放 lottery_records，对每一期用它之前的开奖记录调用全部预测类型的全部算法，
+再按实时运行时的切换逻辑模拟 AlgorithmSwitcher，得到分窗口命中率、连中/连错分布和切换次数。
+
+- 单双、大小算法是A..C值的公式，通过 HistoryTensor 对全部历史一次向量化计算；
+- 杀组、双组算法有随机性和跨期状态，按期逐一重放：历史按区间切分到进程池，
+  每次调用前以 (种子, 预测类型, 算法, 期号) 设置随机数种子，随机数与切分方式无关；
+- 切换模拟以各算法的命中序列为输入（见 switch_simulator），每个预测类型、每组切换配置一个任务。
+
+命令行：python bot.py backtest --draws 100000 --workers 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from loguru import logger
+
+from features.config.config_manager import ALGORITHM_CONFIG
+from features.data.db_manager import db_manager
+from features.prediction.utils.draw_features import DrawFeatures, prime_draw_features
+from features.prediction.utils.prediction_utils import prepare_test_values, PredictionJudge
+from features.prediction.algorithms.base_algorithms import BaseAlgorithms
+from features.prediction.algorithms.double_group_algorithm import DoubleGroupAlgorithm
+from features.prediction.algorithms.algorithm_switcher import ALGORITHM_NUMBERS
+from features.prediction.algorithms.markov_combo_model import MarkovComboModel, markov_combo_model
+from features.prediction.algorithms.kill_group_stats import combo_code
+from features.prediction.algorithms.formula_engine import HistoryTensor
+from features.prediction.switch_simulator import simulate_switching_task, save_outcomes, FIXED_TYPES
+
+# 预测类型
+PREDICTION_TYPES = ['single_double', 'big_small', 'kill_group', 'double_group']
+
+# 各预测类型使用的历史记录数（与 prediction_store 一致）
+RECORD_LIMITS = {
+    'single_double': 10,
+    'big_small': 10,
+    'kill_group': 100,
+    'double_group': 10
+}
+
+# 每一期预测所需的历史期数
+HISTORY = max(RECORD_LIMITS.values())
+
+# 只由A..C值公式决定、可以向量化计算的预测类型
+FORMULA_TYPES = ('single_double', 'big_small')
+
+def _formula_outcomes(draws, pred_type):
+    """向量化计算单双、大小各算法在每一期是否命中
+
+    Returns:
+        numpy.ndarray: (期数, 算法数) 的命中矩阵，按时间顺序
+    """
+    history = HistoryTensor(draws[::-1], drop_invalid=False)
+    rows = len(draws) - HISTORY
+    if pred_type == 'single_double':
+        algorithms = BaseAlgorithms.get_single_double_algorithms()
+    else:
+        algorithms = BaseAlgorithms.get_big_small_algorithms()
+
+    outcomes = np.zeros((rows, len(ALGORITHM_NUMBERS[pred_type])), dtype=bool)
+    for column, algo_num in enumerate(ALGORITHM_NUMBERS[pred_type]):
+        # 与 predict_single_double / predict_big_small 相同：不存在的算法号回退到1号
+        formula = algorithms.get(algo_num, algorithms[1])
+        hits = history.hits(formula(history.columns), pred_type)
+        outcomes[:, column] = hits[:rows][::-1]
+    return outcomes
+
+def _init_worker():
+    """进程池初始化：回测期间关闭算法模块的逐期日志"""
+    logger.disable('features')
+
+def _predict(pred_type, algo_num, records):
+    """与 PredictorModel 相同的调用方式计算一次预测"""
+    if pred_type == 'kill_group':
+        values = prepare_test_values(records)
+        values['_raw_records_'] = records
+        return BaseAlgorithms.predict_kill_group(values, algo_num)
+    return DoubleGroupAlgorithm.predict_double_group(records, algo_num)
+
+def _replay_chunk(task):
+    """重放一段历史中的杀组、双组预测
+
+    Args:
+        task: (draws, prefix_codes, seed, jobs)
+            draws: 按时间顺序的记录，前 HISTORY 期只作为历史，预测其后的每一期
+            prefix_codes: draws[HISTORY] 之前全部历史的组合编码（马尔可夫模型的起点）
+            seed: 随机数种子
+            jobs: [(预测类型, 算法号)]
+
+    Returns:
+        dict: (预测类型, 算法号) -> 按时间顺序的命中数组
+    """
+    draws, prefix_codes, seed, jobs = task
+    newest_first = draws[::-1]
+    features = DrawFeatures.from_records(newest_first)
+    total = len(draws)
+
+    markov_combo_model.reset(
+        MarkovComboModel.from_codes(
+            prefix_codes,
+            max_order=ALGORITHM_CONFIG["MARKOV_MAX_ORDER"],
+            smoothing=ALGORITHM_CONFIG["MARKOV_SMOOTHING"]
+        ),
+        draws[HISTORY - 1][1]
+    )
+
+    # 每个算法各自的跨期状态（实时运行时同一时刻只有一个算法在使用这些状态）
+    states = {job: (0, []) for job in jobs}
+    outcomes = {job: np.zeros(total - HISTORY, dtype=bool) for job in jobs}
+
+    for index in range(HISTORY, total):
+        offset = total - index
+        records = newest_first[offset:offset + HISTORY]
+        prime_draw_features(records, features.window(offset, offset + HISTORY))
+        actual = draws[index]
+        actual_data = {'is_big': bool(actual[5]), 'is_odd': bool(actual[6])}
+
+        for job in jobs:
+            pred_type, algo_num = job
+            random.seed(f"{seed}:{pred_type}:{algo_num}:{actual[1]}")
+            BaseAlgorithms.kill_group_counter, DoubleGroupAlgorithm.last_recommended_combos = states[job]
+            prediction = _predict(pred_type, algo_num, records[:RECORD_LIMITS[pred_type]])
+            states[job] = (BaseAlgorithms.kill_group_counter, DoubleGroupAlgorithm.last_recommended_combos)
+            outcomes[job][index - HISTORY] = bool(prediction) and PredictionJudge.check_prediction_correctness(
+                pred_type, prediction, actual_data
+            )
+    return outcomes
+
+def _run_lengths(mask):
+    """布尔序列中每段连续True的长度"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.nonzero(edges == -1)[0] - np.nonzero(edges == 1)[0]
+
+def summarize(hits, window):
+    """命中序列的统计：总命中率、分窗口命中率、连中/连错分布"""
+    starts = np.arange(0, len(hits), window)
+    sizes = np.diff(np.append(starts, len(hits)))
+    win_runs = _run_lengths(hits)
+    loss_runs = _run_lengths(~hits)
+    return {
+        'accuracy': float(hits.mean()) if len(hits) else 0.0,
+        'window_accuracy': (np.add.reduceat(hits.astype(np.int64), starts) / sizes).round(4).tolist() if len(hits) else [],
+        'max_win_streak': int(win_runs.max()) if win_runs.size else 0,
+        'max_loss_streak': int(loss_runs.max()) if loss_runs.size else 0,
+        'win_streaks': {int(k): int(v) for k, v in enumerate(np.bincount(win_runs)) if v},
+        'loss_streaks': {int(k): int(v) for k, v in enumerate(np.bincount(loss_runs)) if v}
+    }
+
+def _draws_from_records(records):
+    """按期号倒序的记录 -> 按时间顺序的元组列表"""
+    draws = [tuple(record) for record in reversed(records)]
+    if len(draws) <= HISTORY:
+        raise ValueError(f"开奖记录不足，至少需要 {HISTORY + 1} 期")
+    return draws
+
+def compute_outcomes(records, executor, workers, seed=0, types=None):
+    """计算每个预测类型的每个算法在每一期是否命中
+
+    Args:
+        records: 按期号倒序的开奖记录
+        executor: 进程池（create_executor 创建）
+        workers: 进程池的进程数，用于切分区间
+        seed: 随机数种子
+        types: 预测类型，默认全部
+
+    Returns:
+        dict: 预测类型 -> (期数, 算法数) 的命中矩阵，按时间顺序，列顺序同 ALGORITHM_NUMBERS
+    """
+    draws = _draws_from_records(records)
+    types = types or PREDICTION_TYPES
+    rows = len(draws) - HISTORY
+
+    outcomes = {pred_type: _formula_outcomes(draws, pred_type) for pred_type in types if pred_type in FORMULA_TYPES}
+
+    jobs = [(pred_type, algo_num) for pred_type in types if pred_type not in FORMULA_TYPES
+            for algo_num in ALGORITHM_NUMBERS[pred_type]]
+    if jobs:
+        codes = [combo_code(draw) for draw in draws]
+        # 每个进程约4个区间，区间之间重叠 HISTORY 期作为历史
+        chunk = max(1, -(-rows // (workers * 4)))
+        starts = range(0, rows, chunk)
+        tasks = [
+            (draws[start:min(start + chunk, rows) + HISTORY], codes[:start + HISTORY], seed, jobs)
+            for start in starts
+        ]
+        for pred_type in {pred_type for pred_type, _ in jobs}:
+            outcomes[pred_type] = np.zeros((rows, len(ALGORITHM_NUMBERS[pred_type])), dtype=bool)
+        for start, result in zip(starts, executor.map(_replay_chunk, tasks)):
+            for (pred_type, algo_num), hits in result.items():
+                column = ALGORITHM_NUMBERS[pred_type].index(algo_num)
+                outcomes[pred_type][start:start + len(hits), column] = hits
+    return outcomes
+
+def create_executor(workers):
+    """创建回测使用的进程池"""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker
+    )
+
+def run_backtest(records, workers=None, seed=0, window=1000, switch_configs=None, types=None, outcomes_path=None):
+    """回测全部算法和切换配置
+
+    Args:
+        records: 按期号倒序的开奖记录
+        workers: 进程数，默认为CPU核数
+        seed: 随机数种子
+        window: 分窗口统计的期数
+        switch_configs: 切换配置列表（覆盖默认 switch_config 的字典），默认只模拟默认配置
+        types: 回测的预测类型，默认全部
+        outcomes_path: 将命中矩阵保存为位图文件（供 switch_simulator 使用）
+
+    Returns:
+        dict: 回测报告
+    """
+    started = time.time()
+    draws = _draws_from_records(records)
+    types = types or PREDICTION_TYPES
+    switch_configs = switch_configs or [{}]
+    workers = workers or os.cpu_count() or 1
+    rows = len(draws) - HISTORY
+
+    with create_executor(workers) as executor:
+        outcomes = compute_outcomes(records, executor, workers, seed, types)
+        replay_duration = time.time() - started
+        if outcomes_path:
+            save_outcomes(outcomes_path, outcomes)
+
+        simulations = [
+            (pred_type, config) for pred_type in types if pred_type not in FIXED_TYPES
+            for config in switch_configs
+        ]
+        switch_results = list(executor.map(
+            simulate_switching_task,
+            [(pred_type, outcomes[pred_type], config, seed) for pred_type, config in simulations]
+        ))
+
+    report = {
+        'draws': rows,
+        'first_qihao': draws[HISTORY][1],
+        'last_qihao': draws[-1][1],
+        'seed': seed,
+        'window': window,
+        'replay_duration': replay_duration,
+        'types': {}
+    }
+    for pred_type in types:
+        report['types'][pred_type] = {
+            'algorithms': {
+                algo_num: summarize(outcomes[pred_type][:, column], window)
+                for column, algo_num in enumerate(ALGORITHM_NUMBERS[pred_type])
+            },
+            'switching': []
+        }
+    for (pred_type, config), result in zip(simulations, switch_results):
+        report['types'][pred_type]['switching'].append({
+            'config': config,
+            'switches': result['switches'],
+            'usage': result['usage'],
+            **summarize(result['hits'], window)
+        })
+    report['duration'] = time.time() - started
+    return report
+
+def format_report(report):
+    """将回测报告格式化为文本"""
+    algorithm_names = {'single_double': '单双', 'big_small': '大小', 'kill_group': '杀组', 'double_group': '双组'}
+    lines = [
+        f"回测 {report['draws']} 期 ({report['first_qihao']} - {report['last_qihao']}), "
+        f"种子 {report['seed']}, 耗时 {report['duration']:.2f}秒 (重放 {report['replay_duration']:.2f}秒)"
+    ]
+    for pred_type, result in report['types'].items():
+        lines.append(f"[{algorithm_names.get(pred_type, pred_type)}]")
+        for algo_num, summary in result['algorithms'].items():
+            windows = summary['window_accuracy']
+            lines.append(
+                f"  {algo_num}号算法: 命中率 {summary['accuracy']:.2%}, "
+                f"窗口命中率 {min(windows):.2%}-{max(windows):.2%}, "
+                f"最长连中 {summary['max_win_streak']}, 最长连错 {summary['max_loss_streak']}"
+            )
+        for switching in result['switching']:
+            lines.append(
+                f"  切换策略 {json.dumps(switching['config'], ensure_ascii=False)}: 命中率 {switching['accuracy']:.2%}, "
+                f"切换 {switching['switches']} 次, 最长连错 {switching['max_loss_streak']}"
+            )
+    return "\n".join(lines)
+
+def main(argv=None):
+    """命令行入口：python bot.py backtest [选项]"""
+    parser = argparse.ArgumentParser(prog='bot.py backtest', description='历史回测全部预测算法和切换配置')
+    parser.add_argument('--draws', type=int, default=100000, help='回测的期数')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--window', type=int, default=1000, help='分窗口统计的期数')
+    parser.add_argument('--types', nargs='+', choices=PREDICTION_TYPES, default=None, help='回测的预测类型')
+    parser.add_argument('--switch-config', action='append', type=json.loads, default=None,
+                        help='切换配置（JSON，覆盖默认 switch_config），可重复指定')
+    parser.add_argument('--output', default=None, help='将完整报告写入JSON文件')
+    parser.add_argument('--save-outcomes', default=None, help='将各算法的命中位图写入文件（供切换策略模拟使用）')
+    args = parser.parse_args(argv)
+
+    records = db_manager.get_recent_records(args.draws + HISTORY)
+    if not records or len(records) <= HISTORY:
+        logger.error(f"开奖记录不足，无法回测，当前记录数：{len(records) if records else 0}")
+        return 1
+
+    report = run_backtest(
+        records,
+        workers=args.workers,
+        seed=args.seed,
+        window=args.window,
+        switch_configs=args.switch_config,
+        types=args.types,
+        outcomes_path=args.save_outcomes
+    )
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"回测报告已写入 {args.output}")
+    return 0
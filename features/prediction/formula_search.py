@@ -0,0 +1,95 @@
+"""
+算法库公式搜索
+
+用向量化回测为 AlgorithmLibrary 挑选公式：历史按时间切分，较早的部分交给
+search_algorithms 生成并回测一批候选公式，把命中率最高的加入算法库；
+最近的部分再由 evaluate_algorithms 重新回测库中的公式，得到不参与选择的验证命中率。
+
+命令行：python bot.py formula-search [--types single_double big_small] [--candidates 1000]
+"""
+import argparse
+import json
+import random
+import time
+from loguru import logger
+
+from features.data.db_manager import db_manager
+from features.prediction.algorithms.algorithm_library import AlgorithmLibrary
+from features.prediction.algorithms.formula_engine import LOOKBACK
+
+SEARCH_TYPES = ('single_double', 'big_small', 'kill_group', 'double_group')
+
+def split_records(records, validation):
+    """按时间切分历史
+
+    Args:
+        records: 按期号倒序的开奖记录
+        validation: 最近的期数中用于验证的比例
+
+    Returns:
+        tuple: (训练记录, 验证记录)；验证记录额外包含回看所需的 LOOKBACK 期
+    """
+    held_out = int(len(records) * validation)
+    return records[held_out:], records[:held_out + LOOKBACK] if held_out else []
+
+def search_library(records, types, candidates, validation=0.2, seed=0):
+    """搜索各预测类型的公式并验证
+
+    Args:
+        records: 按期号倒序的开奖记录
+        types: 预测类型列表
+        candidates: 每个类型的候选公式数量
+        validation: 最近的期数中用于验证的比例
+        seed: 随机数种子
+
+    Returns:
+        tuple: (AlgorithmLibrary, 预测类型 -> [{'formula', 'train', 'validation'}])
+    """
+    train, held_out = split_records(records, validation)
+    library = AlgorithmLibrary()
+    results = {}
+    for pred_type in types:
+        random.seed(f"{seed}:formula:{pred_type}")
+        library.search_algorithms(pred_type, train, candidates)
+        train_rates = {algo['id']: algo['success_rate'] for algo in library.libraries[pred_type]}
+        if held_out:
+            library.evaluate_algorithms(pred_type, held_out)
+        results[pred_type] = [
+            {
+                'formula': algo['formula'],
+                'train': train_rates[algo['id']],
+                'validation': algo['success_rate'] if held_out else None
+            }
+            for algo in library.get_best_algorithms(pred_type, library.MAX_ALGORITHMS)
+        ]
+    return library, results
+
+def main(argv=None):
+    """命令行入口：python bot.py formula-search [选项]"""
+    parser = argparse.ArgumentParser(prog='bot.py formula-search', description='回测并挑选算法库公式')
+    parser.add_argument('--draws', type=int, default=100000, help='使用的历史期数')
+    parser.add_argument('--types', nargs='+', choices=SEARCH_TYPES, default=list(SEARCH_TYPES), help='搜索的预测类型')
+    parser.add_argument('--candidates', type=int, default=1000, help='每个预测类型的候选公式数量')
+    parser.add_argument('--validation', type=float, default=0.2, help='最近的期数中用于验证的比例')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--output', default=None, help='将结果写入JSON文件')
+    args = parser.parse_args(argv)
+
+    records = db_manager.get_recent_records(args.draws + LOOKBACK)
+    if not records or len(records) <= LOOKBACK:
+        logger.error(f"开奖记录不足，无法搜索，当前记录数：{len(records) if records else 0}")
+        return 1
+
+    started = time.time()
+    _, results = search_library(records, args.types, args.candidates, args.validation, args.seed)
+    for pred_type, algorithms in results.items():
+        print(f"[{pred_type}] 算法库 {len(algorithms)} 个公式")
+        for rank, algo in enumerate(algorithms, 1):
+            validation = f"{algo['validation']:.2%}" if algo['validation'] is not None else '-'
+            print(f"  {rank}. 训练 {algo['train']:.2%}, 验证 {validation}, {algo['formula']}")
+    logger.info(f"公式搜索完成: {len(records)} 期，耗时 {time.time() - started:.2f}秒")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        logger.info(f"结果已写入 {args.output}")
+    return 0
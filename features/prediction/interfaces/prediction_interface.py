@@ -5,6 +5,8 @@ from abc import ABC, abstractmethod
 from typing import Dict, List, Any, Optional, Tuple
 from loguru import logger
 
+from features.prediction.utils.draw_features import get_draw_features, COMBO_TYPES
+
 class PredictionData:
     """预测数据类，标准化预测所需的数据结构"""
     
@@ -42,60 +44,17 @@ class PredictionData:
             except (IndexError, ValueError) as e:
                 logger.error(f"提取元数据失败: {e}")
             
-            # 提取A、B、C值
-            for i, record in enumerate(self.raw_records[:10]):
-                try:
-                    opennum = record[3]  # 开奖号码字段
-                    
-                    # 分割开奖号码
-                    if '+' in opennum:
-                        abc_values = opennum.split('+')
-                        if len(abc_values) == 3:
-                            processed['values'][f'A{i+1}'] = int(abc_values[0])
-                            processed['values'][f'B{i+1}'] = int(abc_values[1])
-                            processed['values'][f'C{i+1}'] = int(abc_values[2])
-                        else:
-                            logger.warning(f"开奖号码格式错误: {opennum}")
-                except (IndexError, ValueError) as e:
-                    logger.warning(f"处理记录 {i} 失败: {e}")
-                    continue
-            
-            # 提取特征数据 - 大小比例
-            big_count = 0
-            for record in self.raw_records[:20]:
-                try:
-                    is_big = bool(record[5])
-                    if is_big:
-                        big_count += 1
-                except (IndexError, ValueError):
-                    continue
-                    
-            processed['features']['big_ratio'] = big_count / min(20, len(self.raw_records))
+            # 从共享的开奖特征中读取A、B、C值和各项比例
+            features = get_draw_features(self.raw_records)
+            processed['values'] = features.values(minimum=5)
             
-            # 提取特征数据 - 单双比例
-            odd_count = 0
-            for record in self.raw_records[:20]:
-                try:
-                    is_odd = bool(record[6])
-                    if is_odd:
-                        odd_count += 1
-                except (IndexError, ValueError):
-                    continue
-                    
-            processed['features']['odd_ratio'] = odd_count / min(20, len(self.raw_records))
+            window = min(20, len(self.raw_records))
+            processed['features']['big_ratio'] = features.big_count(20) / window
+            processed['features']['odd_ratio'] = features.odd_count(20) / window
             
             # 提取特征数据 - 组合类型分布
-            combo_counts = {"豹子": 0, "对子": 0, "顺子": 0, "杂六": 0}
-            for record in self.raw_records[:20]:
-                try:
-                    combo_type = record[7]
-                    if combo_type in combo_counts:
-                        combo_counts[combo_type] += 1
-                except (IndexError, ValueError):
-                    continue
-                    
-            for combo, count in combo_counts.items():
-                processed['features'][f'{combo}_ratio'] = count / min(20, len(self.raw_records))
+            for combo, count in zip(COMBO_TYPES, features.combo_type_counts(20)):
+                processed['features'][f'{combo}_ratio'] = int(count) / window
                 
         except Exception as e:
             logger.error(f"处理原始数据失败: {e}")
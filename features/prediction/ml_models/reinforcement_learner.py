@@ -8,6 +8,8 @@ from datetime import datetime
 from loguru import logger
 import random
 
+from features.prediction.utils.draw_features import get_draw_features, leading_run, COMBOS, COMBO_TYPES
+
 class ReinforcementLearner:
     """强化学习模型类，实现预测算法的自我学习和优化"""
     
@@ -231,7 +233,7 @@ class ReinforcementLearner:
             logger.error(f"调整学习参数失败: {e}")
 
 class FeatureExtractor:
-    """特征提取器类，从历史数据中提取有用特征"""
+    """特征提取器类，从历史数据中提取有用特征（读取共享的开奖特征）"""
     
     def extract_features(self, records, pred_type):
         """提取特征
@@ -246,303 +248,156 @@ class FeatureExtractor:
         features = {}
         
         try:
+            draw = get_draw_features(records)
+            
             # 基础统计特征
-            self._extract_basic_stats(records, features)
+            self._extract_basic_stats(draw, features)
             
             # 根据预测类型提取特定特征
             if pred_type == 'single_double':
-                self._extract_single_double_features(records, features)
+                self._extract_single_double_features(draw, features)
             elif pred_type == 'big_small':
-                self._extract_big_small_features(records, features)
+                self._extract_big_small_features(draw, features)
             elif pred_type == 'kill_group':
-                self._extract_kill_group_features(records, features)
+                self._extract_kill_group_features(draw, features)
             elif pred_type == 'double_group':
-                self._extract_double_group_features(records, features)
+                self._extract_double_group_features(draw, features)
             
             # 提取趋势特征
-            self._extract_trend_features(records, features)
+            self._extract_trend_features(draw, features)
             
             # 提取周期特征
-            self._extract_cycle_features(records, features)
+            self._extract_cycle_features(draw, features)
             
         except Exception as e:
             logger.error(f"提取特征失败: {e}")
             
         return features
     
-    def _extract_basic_stats(self, records, features):
+    def _extract_basic_stats(self, draw, features):
         """提取基础统计特征"""
         try:
-            if not records or len(records) < 5:
+            if len(draw) < 5:
                 return
                 
-            # 分析最近的记录
-            big_count = 0
-            odd_count = 0
-            combo_types = {"豹子": 0, "对子": 0, "顺子": 0, "杂六": 0}
-            
-            for record in records[:10]:  # 最近10期
-                try:
-                    is_big = bool(record[5])
-                    is_odd = bool(record[6])
-                    combo_type = record[7]
-                    
-                    if is_big:
-                        big_count += 1
-                    if is_odd:
-                        odd_count += 1
-                    
-                    if combo_type in combo_types:
-                        combo_types[combo_type] += 1
-                except IndexError:
-                    continue
-            
-            # 记录特征
-            total = min(10, len(records))
-            features['big_ratio'] = big_count / total if total > 0 else 0.5
-            features['odd_ratio'] = odd_count / total if total > 0 else 0.5
+            # 分析最近10期
+            total = min(10, len(draw))
+            features['big_ratio'] = draw.big_count(10) / total
+            features['odd_ratio'] = draw.odd_count(10) / total
             
             # 组合类型比例
-            for combo, count in combo_types.items():
-                features[f'{combo}_ratio'] = count / total if total > 0 else 0
+            for combo, count in zip(COMBO_TYPES, draw.combo_type_counts(10)):
+                features[f'{combo}_ratio'] = int(count) / total
                 
         except Exception as e:
             logger.error(f"提取基础统计特征失败: {e}")
     
-    def _extract_single_double_features(self, records, features):
+    @staticmethod
+    def _window_streak(flags):
+        """最近10期中最早一段连续相同值的长度
+        
+        与逐期比较的计数方式一致：整段都相同时不计第一期。
+        
+        Returns:
+            tuple: (该段的值, 长度)；不足两期时长度为0
+        """
+        if len(flags) < 2:
+            return None, 0
+        streak = leading_run(flags[::-1])
+        if streak == len(flags):
+            streak -= 1
+        return bool(flags[-1]), streak
+    
+    def _extract_single_double_features(self, draw, features):
         """提取单双特征"""
         try:
             # 统计连续出现的单双次数
-            odd_streak = 0
-            even_streak = 0
-            last_is_odd = None
-            
-            for record in records[:10]:
-                try:
-                    is_odd = bool(record[6])
-                    
-                    if last_is_odd is None:
-                        last_is_odd = is_odd
-                        continue
-                    
-                    if is_odd:
-                        if last_is_odd:
-                            odd_streak += 1
-                            even_streak = 0
-                        else:
-                            odd_streak = 1
-                            even_streak = 0
-                    else:
-                        if not last_is_odd:
-                            even_streak += 1
-                            odd_streak = 0
-                        else:
-                            even_streak = 1
-                            odd_streak = 0
-                            
-                    last_is_odd = is_odd
-                except IndexError:
-                    continue
-            
-            # 记录特征
-            features['odd_streak'] = odd_streak
-            features['even_streak'] = even_streak
+            is_odd, streak = self._window_streak(draw.is_odd[:10])
+            features['odd_streak'] = streak if is_odd else 0
+            features['even_streak'] = streak if is_odd is False else 0
             
         except Exception as e:
             logger.error(f"提取单双特征失败: {e}")
     
-    def _extract_big_small_features(self, records, features):
+    def _extract_big_small_features(self, draw, features):
         """提取大小特征"""
         try:
             # 统计连续出现的大小次数
-            big_streak = 0
-            small_streak = 0
-            last_is_big = None
-            
-            for record in records[:10]:
-                try:
-                    is_big = bool(record[5])
-                    
-                    if last_is_big is None:
-                        last_is_big = is_big
-                        continue
-                    
-                    if is_big:
-                        if last_is_big:
-                            big_streak += 1
-                            small_streak = 0
-                        else:
-                            big_streak = 1
-                            small_streak = 0
-                    else:
-                        if not last_is_big:
-                            small_streak += 1
-                            big_streak = 0
-                        else:
-                            small_streak = 1
-                            big_streak = 0
-                            
-                    last_is_big = is_big
-                except IndexError:
-                    continue
-            
-            # 记录特征
-            features['big_streak'] = big_streak
-            features['small_streak'] = small_streak
+            is_big, streak = self._window_streak(draw.is_big[:10])
+            features['big_streak'] = streak if is_big else 0
+            features['small_streak'] = streak if is_big is False else 0
             
         except Exception as e:
             logger.error(f"提取大小特征失败: {e}")
     
-    def _extract_kill_group_features(self, records, features):
+    def _extract_kill_group_features(self, draw, features):
         """提取杀组特征"""
         try:
-            # 分析最近5期的组合类型
-            combos = []
-            for record in records[:5]:
-                try:
-                    is_big = bool(record[5])
-                    is_odd = bool(record[6])
-                    combo = f"{'大' if is_big else '小'}{'单' if is_odd else '双'}"
-                    combos.append(combo)
-                except IndexError:
-                    continue
-            
-            # 统计各组合出现次数
-            combo_counts = {
-                "大单": 0,
-                "大双": 0,
-                "小单": 0,
-                "小双": 0
-            }
-            
-            for combo in combos:
-                if combo in combo_counts:
-                    combo_counts[combo] += 1
-            
-            # 记录特征
-            for combo, count in combo_counts.items():
-                features[f'{combo}_count'] = count
+            # 统计最近5期各组合出现次数
+            combo_counts = draw.combo_counts(0, 5)
+            for combo, count in zip(COMBOS, combo_counts):
+                features[f'{combo}_count'] = int(count)
             
             # 找出出现次数最多的组合
-            most_common = max(combo_counts.items(), key=lambda x: x[1])[0] if combo_counts else None
-            features['most_common_combo'] = most_common
+            features['most_common_combo'] = COMBOS[int(np.argmax(combo_counts))]
             
         except Exception as e:
             logger.error(f"提取杀组特征失败: {e}")
     
-    def _extract_double_group_features(self, records, features):
+    def _extract_double_group_features(self, draw, features):
         """提取双组特征"""
         try:
             # 与杀组特征提取类似，但增加分析
-            self._extract_kill_group_features(records, features)
-            
-            # 额外分析最近10期的组合转换模式
-            transitions = {
-                "大单→大双": 0,
-                "大单→小单": 0,
-                "大单→小双": 0,
-                "大双→大单": 0,
-                "大双→小单": 0,
-                "大双→小双": 0,
-                "小单→大单": 0,
-                "小单→大双": 0,
-                "小单→小双": 0,
-                "小双→大单": 0,
-                "小双→大双": 0,
-                "小双→小单": 0
-            }
+            self._extract_kill_group_features(draw, features)
             
-            last_combo = None
-            for record in records[:10]:
-                try:
-                    is_big = bool(record[5])
-                    is_odd = bool(record[6])
-                    combo = f"{'大' if is_big else '小'}{'单' if is_odd else '双'}"
-                    
-                    if last_combo:
-                        transition = f"{last_combo}→{combo}"
-                        if transition in transitions:
-                            transitions[transition] += 1
-                    
-                    last_combo = combo
-                except IndexError:
-                    continue
+            # 额外分析最近10期的组合转换模式（不含同组合之间的转换）
+            matrix = draw.transition_counts(10)
+            transitions = [
+                (f"{COMBOS[i]}→{COMBOS[j]}", int(matrix[i, j]))
+                for i in range(len(COMBOS)) for j in range(len(COMBOS)) if i != j
+            ]
             
             # 找出最常见的转换模式
-            common_transitions = sorted(
-                transitions.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:2]
-            
-            if common_transitions:
-                features['common_transition1'] = common_transitions[0][0]
-                if len(common_transitions) > 1:
-                    features['common_transition2'] = common_transitions[1][0]
+            common_transitions = sorted(transitions, key=lambda x: x[1], reverse=True)[:2]
+            features['common_transition1'] = common_transitions[0][0]
+            features['common_transition2'] = common_transitions[1][0]
             
         except Exception as e:
             logger.error(f"提取双组特征失败: {e}")
     
-    def _extract_trend_features(self, records, features):
+    def _extract_trend_features(self, draw, features):
         """提取趋势特征"""
         try:
-            # 分析和值的趋势
-            sums = []
-            for record in records[:15]:  # 分析最近15期
-                try:
-                    sum_value = int(record[4])
-                    sums.append(sum_value)
-                except (IndexError, ValueError):
-                    continue
+            # 分析最近15期和值的趋势
+            sums = draw.sums[:15].astype(np.int64)
             
             if len(sums) >= 5:
                 # 计算平均值
-                avg_sum = sum(sums) / len(sums)
+                avg_sum = int(sums.sum()) / len(sums)
                 features['avg_sum'] = avg_sum
                 
                 # 计算趋势（使用简单线性回归）
-                if len(sums) >= 3:
-                    x = np.array(range(len(sums)))
-                    y = np.array(sums)
-                    slope = np.cov(x, y)[0, 1] / np.var(x)
-                    features['sum_trend'] = slope
+                x = np.arange(len(sums))
+                features['sum_trend'] = np.cov(x, sums)[0, 1] / np.var(x)
                 
                 # 最近值相对于平均值的位置
-                if sums:
-                    recent_sum = sums[0]
-                    features['recent_vs_avg'] = (recent_sum - avg_sum) / avg_sum if avg_sum else 0
+                features['recent_vs_avg'] = (int(sums[0]) - avg_sum) / avg_sum if avg_sum else 0
             
         except Exception as e:
             logger.error(f"提取趋势特征失败: {e}")
     
-    def _extract_cycle_features(self, records, features):
+    def _extract_cycle_features(self, draw, features):
         """提取周期特征"""
         try:
             # 尝试检测大小、单双的周期
-            big_small_seq = []
-            odd_even_seq = []
-            
-            for record in records[:20]:
-                try:
-                    is_big = bool(record[5])
-                    is_odd = bool(record[6])
-                    
-                    big_small_seq.append(1 if is_big else 0)
-                    odd_even_seq.append(1 if is_odd else 0)
-                except IndexError:
-                    continue
+            big_small_seq = draw.is_big[:20].astype(int).tolist()
+            odd_even_seq = draw.is_odd[:20].astype(int).tolist()
             
             # 检测简单周期
             for seq_len in [2, 3, 4]:
                 if len(big_small_seq) >= seq_len * 2:
-                    # 检查大小序列是否有周期
-                    has_big_small_cycle = self._check_cycle(big_small_seq, seq_len)
-                    features[f'has_big_small_cycle_{seq_len}'] = has_big_small_cycle
-                
-                if len(odd_even_seq) >= seq_len * 2:
-                    # 检查单双序列是否有周期
-                    has_odd_even_cycle = self._check_cycle(odd_even_seq, seq_len)
-                    features[f'has_odd_even_cycle_{seq_len}'] = has_odd_even_cycle
+                    features[f'has_big_small_cycle_{seq_len}'] = self._check_cycle(big_small_seq, seq_len)
+                    features[f'has_odd_even_cycle_{seq_len}'] = self._check_cycle(odd_even_seq, seq_len)
             
         except Exception as e:
             logger.error(f"提取周期特征失败: {e}")
@@ -7,10 +7,11 @@ from datetime import datetime
 from loguru import logger  # type: ignore
 from features.data.db_manager import db_manager
 from features.config.config_manager import GAME_CONFIG
-from features.prediction.utils.prediction_utils import prepare_test_values, calculate_confidence_score
+from features.prediction.utils.prediction_utils import prepare_test_values, create_performance_stats, update_performance_stats
 from features.prediction.algorithms.base_algorithms import BaseAlgorithms
 from features.prediction.algorithms.double_group_algorithm import DoubleGroupAlgorithm
-from features.prediction.algorithms.algorithm_switcher import AlgorithmSwitcher
+from features.prediction.algorithms.algorithm_switcher import AlgorithmSwitcher, ALGORITHM_NUMBERS
+from features.prediction.algorithms.speculative_engine import speculative_engine
 
 # 初始化数据库连接
 # db = Database()  # 不再需要，使用 db_manager 替代
@@ -36,18 +37,8 @@ class PredictorModel:
         
         # 为每个预测类型初始化算法性能数据
         for pred_type in ['single_double', 'big_small', 'kill_group', 'double_group']:
-            for algo_num in [1, 2, 3]:
-                self.algorithm_performance[pred_type][algo_num] = {
-                    'total_predictions': 0,
-                    'correct_predictions': 0,
-                    'recent_results': [],  # 最近20次预测结果
-                    'consecutive_correct': 0,  # 连续正确次数
-                    'consecutive_wrong': 0,    # 连续错误次数
-                    'last_switch_time': 0,     # 上次切换时间（预测次数）
-                    'success_rate': 0.5,       # 成功率
-                    'recent_success_rate': 0.5, # 最近20次成功率
-                    'confidence_score': 0.5,    # 置信度分数
-                }
+            for algo_num in ALGORITHM_NUMBERS[pred_type]:
+                self.algorithm_performance[pred_type][algo_num] = create_performance_stats()
         
         self.algorithm_names = {
             'single_double': '单双',
@@ -72,6 +63,14 @@ class PredictorModel:
             'double_group': 0
         }
         
+        # 各预测类型的算法检查次数（每100次重置一次强制探索）
+        self.switch_counters = {
+            'single_double': 0,
+            'big_small': 0,
+            'kill_group': 0,
+            'double_group': 0
+        }
+        
         # 初始化算法切换器
         self.algorithm_switcher = AlgorithmSwitcher()
         
@@ -114,7 +113,7 @@ class PredictorModel:
                                 logger.warning(f"算法编号无效: {algo_num_str}")
                                 continue
                                 
-                            if algo_num not in [1, 2, 3]:
+                            if algo_num not in self.algorithm_performance[pred_type]:
                                 logger.warning(f"算法编号超出范围: {algo_num}")
                                 continue
                                 
@@ -167,7 +166,7 @@ class PredictorModel:
                 }
                 
                 # 添加各算法性能数据
-                for algo_num in [1, 2, 3]:
+                for algo_num in self.algorithm_performance[pred_type]:
                     # 创建算法性能数据的深拷贝，避免修改原始数据
                     algo_perf = self.algorithm_performance[pred_type][algo_num].copy()
                     
@@ -194,31 +193,8 @@ class PredictorModel:
         """更新算法性能统计"""
         perf = self.algorithm_performance[pred_type][algo_num]
         
-        # 更新基础统计
-        perf['total_predictions'] += 1
-        if is_correct:
-            perf['correct_predictions'] += 1
-            perf['consecutive_correct'] += 1
-            perf['consecutive_wrong'] = 0
-        else:
-            perf['consecutive_wrong'] += 1
-            perf['consecutive_correct'] = 0
-        
-        # 更新最近结果
-        perf['recent_results'].append(1 if is_correct else 0)
-        if len(perf['recent_results']) > self.algorithm_switcher.switch_config['max_recent_results']:
-            perf['recent_results'].pop(0)
-        
-        # 更新成功率
-        perf['success_rate'] = perf['correct_predictions'] / perf['total_predictions']
-        
-        # 更新最近成功率
-        recent_correct = sum(perf['recent_results'])
-        recent_total = len(perf['recent_results'])
-        perf['recent_success_rate'] = recent_correct / recent_total if recent_total > 0 else 0.5
-        
-        # 更新置信度分数
-        perf['confidence_score'] = calculate_confidence_score(perf)
+        # 更新总数、连续次数、最近结果、成功率和置信度
+        update_performance_stats(perf, is_correct, self.algorithm_switcher.switch_config['max_recent_results'])
         
         logger.info(f"算法性能更新 - 类型: {pred_type}, 算法: {algo_num}, "
                    f"成功率: {perf['success_rate']:.2%}, "
@@ -234,7 +210,7 @@ class PredictorModel:
         self.save_algorithm_performance()
     
     def calculate_prediction(self, records, prediction_type):
-        """计算预测结果"""
+        """计算预测结果（优先使用缓存，新计算的结果写入缓存）"""
         try:
             # 获取最新期号和下一期号
             latest_qihao = records[0][1]
@@ -244,53 +220,93 @@ class PredictorModel:
             cached_prediction = db_manager.get_cached_prediction(next_qihao, prediction_type)
             if cached_prediction:
                 logger.info(f"使用缓存的预测结果: {prediction_type} {next_qihao}")
-                
-                # 构建返回数据，根据cached_prediction的类型进行适配
-                if isinstance(cached_prediction, dict):
-                    return {
-                        'qihao': next_qihao,
-                        'prediction': cached_prediction['prediction'],
-                        'prediction_type': prediction_type,
-                        'algorithm_used': cached_prediction['algorithm_used'],
-                        'switch_info': None  # 使用缓存时没有切换信息
-                    }
-                else:  # 如果是元组
-                    return {
-                        'qihao': next_qihao,
-                        'prediction': cached_prediction[2],  # 假设prediction在索引2
-                        'prediction_type': prediction_type,
-                        'algorithm_used': cached_prediction[4],  # 假设algorithm_used在索引4
-                        'switch_info': None  # 使用缓存时没有切换信息
-                    }
+                return self.prediction_from_cache(next_qihao, prediction_type, cached_prediction)
+            
+            prediction_result, state = self.compute_prediction(records, prediction_type)
+            if prediction_result:
+                self.commit_prediction(prediction_type, state)
+                # 记录预测结果到缓存
+                db_manager.cache_prediction(next_qihao, prediction_type, {
+                    'prediction': prediction_result['prediction'],
+                    'algorithm_used': prediction_result['algorithm_used']
+                })
+            return prediction_result
+            
+        except Exception as e:
+            logger.error(f"预测计算失败: {e}")
+            return None
+    
+    @staticmethod
+    def prediction_from_cache(next_qihao, prediction_type, cached_prediction):
+        """由缓存的预测记录构建预测结果"""
+        # 构建返回数据，根据cached_prediction的类型进行适配
+        if isinstance(cached_prediction, dict):
+            return {
+                'qihao': next_qihao,
+                'prediction': cached_prediction['prediction'],
+                'prediction_type': prediction_type,
+                'algorithm_used': cached_prediction['algorithm_used'],
+                'switch_info': None  # 使用缓存时没有切换信息
+            }
+        else:  # 如果是元组
+            return {
+                'qihao': next_qihao,
+                'prediction': cached_prediction[2],  # 假设prediction在索引2
+                'prediction_type': prediction_type,
+                'algorithm_used': cached_prediction[4],  # 假设algorithm_used在索引4
+                'switch_info': None  # 使用缓存时没有切换信息
+            }
+    
+    @staticmethod
+    def algorithm_state(prediction_type):
+        """获取预测类型的算法跨期状态（杀组平衡计数器、双组上次推荐的组合），其他类型为None"""
+        if prediction_type == 'kill_group':
+            return getattr(BaseAlgorithms, 'kill_group_counter', 0)
+        if prediction_type == 'double_group':
+            return (list(DoubleGroupAlgorithm.last_recommended_combos), DoubleGroupAlgorithm.last_recommendation_time)
+        return None
+    
+    @staticmethod
+    def set_algorithm_state(prediction_type, state):
+        """设置预测类型的算法跨期状态（algorithm_state 的返回值）"""
+        if prediction_type == 'kill_group':
+            BaseAlgorithms.kill_group_counter = state
+        elif prediction_type == 'double_group':
+            DoubleGroupAlgorithm.last_recommended_combos, DoubleGroupAlgorithm.last_recommendation_time = state
+    
+    def compute_prediction(self, records, prediction_type):
+        """检查算法切换并计算预测结果
+        
+        只读取预测器的状态：切换计数、当前算法和算法的跨期状态的变化记录在返回的 state 中，
+        由 commit_prediction 在结果被采用时写回；结果被丢弃（如计算超时）时预测器状态不变。
+        不同的预测类型可在线程池中并发调用，同一预测类型同一时间只能有一个计算。
+        马尔可夫算法（4号）在模型尚未同步到 records[0] 时会读取数据库，
+        并发调用前应先调用 markov_combo_model.sync 加载（见 PredictionRunner.run）。
+        
+        Returns:
+            tuple: (预测结果, state)，失败时预测结果为None
+        """
+        try:
+            # 获取最新期号和下一期号
+            latest_qihao = records[0][1]
+            next_qihao = str(int(latest_qihao) + 1)
             
-            # 重置算法切换计数器 (如果不存在)
-            if not hasattr(self, 'switch_counters'):
-                self.switch_counters = {
-                    'single_double': 0,
-                    'big_small': 0,
-                    'kill_group': 0,
-                    'double_group': 0
-                }
-                
             # 增加算法检查计数
-            self.switch_counters[prediction_type] = self.switch_counters.get(prediction_type, 0) + 1
+            switch_counter = self.switch_counters.get(prediction_type, 0) + 1
+            reset_exploration = False
             
             # 检查是否需要切换算法
-            algorithm_switched = False
             switch_info = None
             current_algo = self.current_algorithms.get(prediction_type, 1)
             
             # 对于大小预测，始终使用算法1
             if prediction_type == 'big_small':
-                # 强制设置当前算法为1号算法
                 current_algo = 1
-                self.current_algorithms[prediction_type] = 1
             else:
                 # 周期性强制算法探索 (每100次检查重置一次强制探索状态)
-                if self.switch_counters[prediction_type] >= 100:
-                    self.algorithm_switcher.reset_forced_exploration()
-                    self.switch_counters[prediction_type] = 0
-                    logger.info(f"重置{prediction_type}算法强制探索状态")
+                if switch_counter >= 100:
+                    reset_exploration = True
+                    switch_counter = 0
                     
                 # 检查是否需要切换算法
                 new_algo, switch_reason = self.algorithm_switcher.should_switch_algorithm(
@@ -299,32 +315,25 @@ class PredictorModel:
                     self.algorithm_performance[prediction_type]
                 )
                 
-                # 如果需要切换算法
+                # 如果需要切换算法，记录算法切换信息
                 if new_algo != current_algo:
-                    old_algo = current_algo
-                    self.current_algorithms[prediction_type] = new_algo
-                    algorithm_switched = True
-                    
-                    # 记录算法切换信息
                     switch_info = {
-                        'from_algo': old_algo,
+                        'from_algo': current_algo,
                         'to_algo': new_algo,
                         'reason': switch_reason
                     }
-                    
-                    logger.info(f"算法切换: {prediction_type} 从 {old_algo}号 切换到 {new_algo}号, 原因: {switch_reason}")
-                    
-                    # 更新当前使用的算法
                     current_algo = new_algo
             
-            # 记录当前期号使用的算法
-            self.last_used_algorithms[prediction_type][next_qihao] = current_algo
-            
-            # 使用当前算法进行预测
-            prediction_content = self.predict(prediction_type, records)
+            # 使用选定的算法进行预测，算法的跨期状态在预测后恢复，由 commit_prediction 写回
+            before = self.algorithm_state(prediction_type)
+            try:
+                prediction_content = self.predict(prediction_type, records, current_algo)
+                after = self.algorithm_state(prediction_type)
+            finally:
+                self.set_algorithm_state(prediction_type, before)
             if not prediction_content:
                 logger.error(f"预测失败: {prediction_type}")
-                return None
+                return None, None
                 
             # 构建预测结果
             prediction_result = {
@@ -335,20 +344,59 @@ class PredictorModel:
             }
             
             # 如果发生了算法切换，添加切换信息
-            if algorithm_switched:
+            if switch_info:
                 prediction_result['switch_info'] = switch_info
-            
-            # 记录预测结果到缓存
-            db_manager.cache_prediction(next_qihao, prediction_type, {
-                'prediction': prediction_content,
-                'algorithm_used': json.dumps({prediction_type: current_algo})
-            })
 
-            return prediction_result
+            state = {
+                'qihao': next_qihao,
+                'algorithm': current_algo,
+                'switch_counter': switch_counter,
+                'reset_exploration': reset_exploration,
+                'switch_info': switch_info,
+                'algorithm_state': after
+            }
+            return prediction_result, state
 
         except Exception as e:
             logger.error(f"预测计算失败: {e}")
-            return None
+            return None, None
+    
+    def commit_prediction(self, prediction_type, state):
+        """采用 compute_prediction 的结果：写回切换计数、当前算法和算法的跨期状态"""
+        self.switch_counters[prediction_type] = state['switch_counter']
+        if state['reset_exploration']:
+            self.algorithm_switcher.reset_forced_exploration()
+            logger.info(f"重置{prediction_type}算法强制探索状态")
+        
+        switch_info = state['switch_info']
+        if switch_info:
+            logger.info(f"算法切换: {prediction_type} 从 {switch_info['from_algo']}号 切换到 {switch_info['to_algo']}号, 原因: {switch_info['reason']}")
+        
+        # 更新当前使用的算法，并记录当前期号使用的算法
+        self.current_algorithms[prediction_type] = state['algorithm']
+        self.last_used_algorithms[prediction_type][state['qihao']] = state['algorithm']
+        self.set_algorithm_state(prediction_type, state['algorithm_state'])
+    
+    def export_state(self):
+        """导出预测器的热状态（用于快照）"""
+        return {
+            'current_algorithms': self.current_algorithms,
+            'consecutive_errors': self.consecutive_errors,
+            # 每种类型只保留最近50期的算法记录
+            'last_used_algorithms': {
+                pred_type: dict(sorted(used.items())[-50:])
+                for pred_type, used in self.last_used_algorithms.items()
+            },
+            'switcher': self.algorithm_switcher.export_state()
+        }
+    
+    def restore_state(self, state):
+        """从快照恢复预测器的热状态"""
+        self.current_algorithms.update(state.get('current_algorithms', {}))
+        self.consecutive_errors.update(state.get('consecutive_errors', {}))
+        for pred_type, used in state.get('last_used_algorithms', {}).items():
+            self.last_used_algorithms.setdefault(pred_type, {}).update(used)
+        self.algorithm_switcher.restore_state(state.get('switcher', {}))
     
     def get_algorithm_status(self):
         """获取算法状态报告"""
@@ -386,7 +434,7 @@ class PredictorModel:
                 best_algo = None
                 best_score = -1
                 
-                for algo_num in [1, 2, 3]:
+                for algo_num in ALGORITHM_NUMBERS.get(pred_type, []):
                     if pred_type in self.algorithm_performance and algo_num in self.algorithm_performance[pred_type]:
                         algo_perf = self.algorithm_performance[pred_type][algo_num]
                         # 使用置信度分数作为评价指标
@@ -438,32 +486,30 @@ class PredictorModel:
             logger.error(f"获取最佳算法失败: {e}")
             return None
     
-    def predict(self, pred_type, records):
+    def predict(self, pred_type, records, algo_num=None):
         """预测主方法，根据预测类型调用对应的预测方法
         
         Args:
             pred_type: 预测类型
             records: 历史记录
+            algo_num: 使用的算法号，默认为当前算法
             
         Returns:
             str: 预测结果
         """
         try:
+            current_algo = algo_num or self.current_algorithms.get(pred_type, 1)
             if pred_type == 'single_double':
-                # 单双预测逻辑 - 当前使用算法1
-                current_algo = self.current_algorithms.get(pred_type, 1)
+                # 单双预测逻辑
                 return self.single_double_prediction(records, current_algo)
             elif pred_type == 'big_small':
                 # 大小预测逻辑 - 当前使用算法1
-                current_algo = self.current_algorithms.get(pred_type, 1)
                 return self.big_small_prediction(records, current_algo)
             elif pred_type == 'kill_group':
                 # 杀组预测逻辑
-                current_algo = self.current_algorithms.get(pred_type, 1)
                 return self.kill_group_prediction(records, current_algo)
             elif pred_type == 'double_group':
                 # 双组预测逻辑
-                current_algo = self.current_algorithms.get(pred_type, 1)
                 return self.double_group_prediction(records, current_algo)
             else:
                 logger.error(f"未知的预测类型: {pred_type}")
@@ -494,6 +540,11 @@ class PredictorModel:
             str: 预测结果
         """
         try:
+            # 优先使用开奖前推测预计算的结果
+            cached = speculative_engine.lookup('single_double', algo_num, records)
+            if cached:
+                return cached
+            
             # 准备测试值
             test_values = prepare_test_values(records)
             
@@ -514,6 +565,11 @@ class PredictorModel:
             str: 预测结果
         """
         try:
+            # 优先使用开奖前推测预计算的结果
+            cached = speculative_engine.lookup('big_small', algo_num, records)
+            if cached:
+                return cached
+            
             # 准备测试值
             test_values = prepare_test_values(records)
             
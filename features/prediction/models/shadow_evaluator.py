@@ -0,0 +1,134 @@
+"""
+影子评估模块
+
+实时运行时每期只使用一个算法，开奖后也只有这个算法的性能统计得到更新，
+其他算法的最近结果停留在它们上次被使用的时候。影子评估在预先计算下一期预测时，
+用同一份共享特征一次性算出其余全部算法的预测（单双、大小读取推测预计算的结果表，
+杀组的窗口特征只计算一次），只保存在内存中，不发送也不入库；开奖后按各自“假设使用时”
+的对错更新性能统计，切换器因此总是基于最新的数据做决定。
+开奖验证已记入实时结果的算法不再重复评估；固定使用1号算法的大小预测不参与影子评估。
+"""
+import random
+import threading
+from collections import OrderedDict
+from loguru import logger
+
+from features.config.config_manager import ALGORITHM_CONFIG
+from features.prediction.utils.prediction_utils import PredictionJudge
+from features.prediction.algorithms.base_algorithms import BaseAlgorithms
+from features.prediction.algorithms.double_group_algorithm import DoubleGroupAlgorithm
+from features.prediction.algorithms.algorithm_switcher import ALGORITHM_NUMBERS, FIXED_TYPES, credited_algorithm
+
+class ShadowEvaluator:
+    """为未使用的算法计算影子预测，并在开奖后更新它们的性能统计"""
+
+    def __init__(self, predictor, max_pending=16):
+        self.predictor = predictor
+        self.max_pending = max_pending
+        self._pending = OrderedDict()   # 期号 -> {预测类型: {算法号: 预测}}
+        # 各影子算法自己的跨期状态（杀组平衡计数器、双组上次推荐的组合），与实时算法互不干扰
+        self._states = {}
+        self._lock = threading.Lock()
+        self._evaluated = 0
+        self._verified = 0
+
+    def _predict_methods(self):
+        return {
+            'single_double': self.predictor.single_double_prediction,
+            'big_small': self.predictor.big_small_prediction,
+            'kill_group': self.predictor.kill_group_prediction,
+            'double_group': self.predictor.double_group_prediction
+        }
+
+    def prepare(self, next_qihao, records_by_type, predictions):
+        """计算下一期全部未使用算法的影子预测
+
+        Args:
+            next_qihao: 预测的期号
+            records_by_type: 预测类型 -> 该类型使用的历史记录（与实时预测相同）
+            predictions: 预测类型 -> 实时预测结果（用于排除开奖验证时记入实时结果的算法）
+        """
+        if not ALGORITHM_CONFIG["SHADOW_EVALUATION"]:
+            return
+        next_qihao = str(next_qihao)
+        methods = self._predict_methods()
+        with self._lock:
+            if next_qihao in self._pending:
+                return
+
+            # 保存实时算法的状态和随机数状态，影子预测结束后恢复
+            live_state = (
+                getattr(BaseAlgorithms, 'kill_group_counter', 0),
+                DoubleGroupAlgorithm.last_recommended_combos,
+                DoubleGroupAlgorithm.last_recommendation_time,
+                random.getstate()
+            )
+            shadow = {}
+            try:
+                for pred_type, records in records_by_type.items():
+                    if pred_type in FIXED_TYPES:
+                        continue
+                    # 与 verify_prediction 记入的算法一致；没有实时预测时验证不更新任何算法，全部影子评估
+                    live = predictions.get(pred_type)
+                    credited = credited_algorithm(pred_type, live.get('algorithm_used')) if live else None
+                    for algo_num in ALGORITHM_NUMBERS[pred_type]:
+                        if algo_num == credited:
+                            continue
+                        key = (pred_type, algo_num)
+                        random.seed(f"shadow:{next_qihao}:{pred_type}:{algo_num}")
+                        BaseAlgorithms.kill_group_counter, DoubleGroupAlgorithm.last_recommended_combos = \
+                            self._states.get(key, (0, []))
+                        prediction = methods[pred_type](records, algo_num)
+                        self._states[key] = (BaseAlgorithms.kill_group_counter, DoubleGroupAlgorithm.last_recommended_combos)
+                        if prediction:
+                            shadow.setdefault(pred_type, {})[algo_num] = prediction
+            except Exception as e:
+                logger.error(f"影子预测失败: {e}")
+            finally:
+                (BaseAlgorithms.kill_group_counter, DoubleGroupAlgorithm.last_recommended_combos,
+                 DoubleGroupAlgorithm.last_recommendation_time, random_state) = live_state
+                random.setstate(random_state)
+
+            self._pending[next_qihao] = shadow
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+            self._evaluated += sum(len(algos) for algos in shadow.values())
+            logger.info(f"已计算{next_qihao}期影子预测: {sum(len(algos) for algos in shadow.values())} 个算法")
+
+    def verify(self, qihao, is_big, is_odd):
+        """按开奖结果更新影子算法的性能统计（同一期只更新一次）
+
+        Args:
+            qihao: 开奖期号
+            is_big: 是否为大
+            is_odd: 是否为单
+
+        Returns:
+            int: 更新的算法数
+        """
+        with self._lock:
+            shadow = self._pending.pop(str(qihao), None)
+        if not shadow:
+            return 0
+
+        actual_data = {'is_big': bool(is_big), 'is_odd': bool(is_odd)}
+        updated = 0
+        for pred_type, algos in shadow.items():
+            for algo_num, prediction in algos.items():
+                try:
+                    is_correct = PredictionJudge.check_prediction_correctness(pred_type, prediction, actual_data)
+                    self.predictor.update_algorithm_performance(pred_type, algo_num, is_correct)
+                    updated += 1
+                except Exception as e:
+                    logger.error(f"更新影子算法性能失败 - 类型: {pred_type}, 算法: {algo_num}: {e}")
+        self._verified += updated
+        logger.info(f"{qihao}期影子评估完成: 更新 {updated} 个算法的性能统计")
+        return updated
+
+    def get_stats(self):
+        """获取影子评估统计"""
+        return {
+            'pending': list(self._pending),
+            'evaluated': self._evaluated,
+            'verified': self._verified
+        }
@@ -0,0 +1,247 @@
+"""
+算法切换策略模拟器
+
+把回测得到的各算法命中位图（每期每个算法是否命中）按时间顺序喂给 AlgorithmSwitcher：
+每一期调用 should_switch_algorithm 决定当前算法，读取该算法这一期的命中结果，
+再更新性能统计和趋势，与实时运行的切换流程一致。模拟只读取预先计算的结果，
+不重新运行预测，每一步只需数微秒，大量 switch_config 参数组合可以在进程池中并行模拟，
+按实际命中率和切换频率排序。
+
+命令行：python bot.py switch-sim --outcomes outcomes.npz --top 10
+（命中位图由 python bot.py backtest --save-outcomes outcomes.npz 生成）
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+import numpy as np
+from loguru import logger
+
+from features.prediction.utils.prediction_utils import create_performance_stats, update_performance_stats
+from features.prediction.algorithms.algorithm_switcher import AlgorithmSwitcher, ALGORITHM_NUMBERS, FIXED_TYPES
+
+# 切换目标的选择方式：
+# default  - should_switch_algorithm 内置的选择（置信度最高的其他算法，实时运行使用）
+# weighted - select_next_algorithm（结合趋势和记忆的加权随机选择）
+SELECTORS = ('default', 'weighted')
+
+# 默认的参数搜索空间
+SWITCH_SEARCH_SPACE = {
+    'min_predictions_before_switch': [3, 5, 10],
+    'max_consecutive_errors': [2, 3, 4, 6],
+    'min_confidence_score': [0.3, 0.4, 0.5],
+    'min_recent_success_rate': [0.3, 0.4, 0.5],
+    'exploration_probability': [0.0, 0.1, 0.2]
+}
+
+def save_outcomes(path, outcomes):
+    """将命中矩阵按位压缩保存
+
+    Args:
+        path: 文件路径（.npz）
+        outcomes: 预测类型 -> (期数, 算法数) 的布尔矩阵
+    """
+    arrays = {}
+    for pred_type, matrix in outcomes.items():
+        arrays[pred_type] = np.packbits(matrix, axis=0)
+        arrays[f'{pred_type}__rows'] = np.array(len(matrix))
+    np.savez_compressed(path, **arrays)
+    logger.info(f"命中位图已写入 {path}")
+
+def load_outcomes(path):
+    """读取 save_outcomes 保存的命中矩阵"""
+    with np.load(path) as data:
+        return {
+            name: np.unpackbits(data[name], axis=0, count=int(data[f'{name}__rows'])).astype(bool)
+            for name in data.files if not name.endswith('__rows')
+        }
+
+def simulate_switching(pred_type, outcomes, switch_config=None, seed=0, selector='default'):
+    """按实时运行的切换逻辑模拟 AlgorithmSwitcher
+
+    每一期先检查是否切换（每100次检查重置一次强制探索），使用当前算法的命中结果，
+    再更新该算法的性能统计和趋势，与 PredictorModel.compute_prediction 和验证流程一致。
+
+    Args:
+        pred_type: 预测类型
+        outcomes: (期数, 算法数) 的命中矩阵，列顺序同 ALGORITHM_NUMBERS[pred_type]
+        switch_config: 覆盖默认 switch_config 的配置项
+        seed: 随机数种子
+        selector: 切换目标的选择方式，见 SELECTORS
+
+    Returns:
+        dict: switches 切换次数, hits 按时间顺序的命中数组, usage 各算法使用期数
+    """
+    random.seed(f"{seed}:switch:{pred_type}")
+    switcher = AlgorithmSwitcher(persistence_check=False)
+    switcher.switch_config.update(switch_config or {})
+    max_recent = switcher.switch_config['max_recent_results']
+
+    algos = ALGORITHM_NUMBERS[pred_type]
+    columns = {algo_num: column for column, algo_num in enumerate(algos)}
+    perf = {algo_num: create_performance_stats() for algo_num in algos}
+    performance = {pred_type: perf}
+    current = algos[0]
+    checks = 0
+    switches = 0
+    usage = dict.fromkeys(algos, 0)
+    hits = np.zeros(len(outcomes), dtype=bool)
+
+    for index, row in enumerate(outcomes.tolist()):
+        checks += 1
+        if checks >= 100:
+            switcher.reset_forced_exploration()
+            checks = 0
+        new_algo, _ = switcher.should_switch_algorithm(pred_type, current, perf)
+        if new_algo != current:
+            if selector == 'weighted':
+                new_algo, _ = switcher.select_next_algorithm(pred_type, current, performance)
+            if new_algo != current:
+                switches += 1
+                current = new_algo
+        hit = row[columns[current]]
+        hits[index] = hit
+        usage[current] += 1
+        update_performance_stats(perf[current], hit, max_recent)
+        switcher.update_algorithm_trends(pred_type, current, perf[current]['recent_success_rate'])
+
+    return {'switches': switches, 'hits': hits, 'usage': usage}
+
+def simulate_switching_task(task):
+    """进程池任务：(预测类型, 命中矩阵, 切换配置, 种子) -> simulate_switching 的结果"""
+    pred_type, outcomes, switch_config, seed = task
+    return simulate_switching(pred_type, outcomes, switch_config, seed)
+
+def _policy_task(task):
+    """进程池任务：模拟一组策略，只返回排序所需的指标"""
+    pred_type, outcomes, switch_config, selector, seed = task
+    started = time.perf_counter()
+    result = simulate_switching(pred_type, outcomes, switch_config, seed, selector)
+    hits = result['hits']
+    edges = np.diff(np.concatenate(([0], (~hits).astype(np.int8), [0])))
+    losses = np.nonzero(edges == -1)[0] - np.nonzero(edges == 1)[0]
+    return {
+        'accuracy': float(hits.mean()) if len(hits) else 0.0,
+        'switches': result['switches'],
+        'max_loss_streak': int(losses.max()) if losses.size else 0,
+        'usage': result['usage'],
+        'step_us': (time.perf_counter() - started) / max(1, len(hits)) * 1e6
+    }
+
+def parameter_grid(space):
+    """参数空间的全部组合
+
+    Args:
+        space: 配置项 -> 候选值列表
+
+    Returns:
+        list: switch_config 覆盖字典列表
+    """
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+
+def rank_policies(outcomes, configs, executor, seed=0, selectors=('default',), churn_weight=0.1, types=None):
+    """并行模拟全部策略，并按得分排序
+
+    得分 = 命中率 - churn_weight × 每期切换次数，切换越频繁扣分越多。
+
+    Args:
+        outcomes: 预测类型 -> 命中矩阵
+        configs: switch_config 覆盖字典列表
+        executor: 进程池
+        seed: 随机数种子
+        selectors: 切换目标的选择方式列表
+        churn_weight: 切换频率的扣分权重
+        types: 模拟的预测类型，默认为 outcomes 中可切换的全部类型
+
+    Returns:
+        dict: 预测类型 -> 按得分降序的结果列表
+    """
+    types = [t for t in (types or outcomes) if t in outcomes and t not in FIXED_TYPES]
+    policies = [
+        (pred_type, config, selector)
+        for pred_type in types for config in configs for selector in selectors
+    ]
+    results = executor.map(
+        _policy_task,
+        [(pred_type, outcomes[pred_type], config, selector, seed) for pred_type, config, selector in policies],
+        chunksize=max(1, len(policies) // (4 * (os.cpu_count() or 1)))
+    )
+
+    ranking = {pred_type: [] for pred_type in types}
+    for (pred_type, config, selector), metrics in zip(policies, results):
+        draws = len(outcomes[pred_type])
+        churn = metrics['switches'] / draws if draws else 0.0
+        ranking[pred_type].append({
+            'config': config,
+            'selector': selector,
+            'churn': churn,
+            'score': metrics['accuracy'] - churn_weight * churn,
+            **metrics
+        })
+    for results in ranking.values():
+        results.sort(key=lambda item: item['score'], reverse=True)
+    return ranking
+
+def format_ranking(ranking, top=10):
+    """将排序结果格式化为文本"""
+    algorithm_names = {'single_double': '单双', 'big_small': '大小', 'kill_group': '杀组', 'double_group': '双组'}
+    lines = []
+    for pred_type, results in ranking.items():
+        lines.append(f"[{algorithm_names.get(pred_type, pred_type)}] 共 {len(results)} 组策略")
+        for rank, item in enumerate(results[:top], 1):
+            lines.append(
+                f"  {rank}. 得分 {item['score']:.4f}, 命中率 {item['accuracy']:.2%}, "
+                f"每百期切换 {item['churn'] * 100:.1f} 次, 最长连错 {item['max_loss_streak']}, "
+                f"{item['selector']} {json.dumps(item['config'], ensure_ascii=False)}"
+            )
+    return "\n".join(lines)
+
+def main(argv=None):
+    """命令行入口：python bot.py switch-sim [选项]"""
+    from features.prediction.backtest import create_executor, compute_outcomes, HISTORY, PREDICTION_TYPES
+    from features.data.db_manager import db_manager
+
+    parser = argparse.ArgumentParser(prog='bot.py switch-sim', description='离线模拟并排序算法切换策略')
+    parser.add_argument('--outcomes', default=None, help='backtest --save-outcomes 生成的命中位图；不指定时重新回测')
+    parser.add_argument('--draws', type=int, default=100000, help='未指定 --outcomes 时回测的期数')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--types', nargs='+', choices=PREDICTION_TYPES, default=None, help='模拟的预测类型')
+    parser.add_argument('--grid', type=json.loads, default=None, help='参数搜索空间（JSON：配置项 -> 候选值列表）')
+    parser.add_argument('--selector', action='append', choices=SELECTORS, default=None, help='切换目标的选择方式，可重复指定')
+    parser.add_argument('--churn-weight', type=float, default=0.1, help='切换频率的扣分权重')
+    parser.add_argument('--top', type=int, default=10, help='每个预测类型显示的策略数')
+    parser.add_argument('--output', default=None, help='将完整排序结果写入JSON文件')
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count() or 1
+    configs = parameter_grid(args.grid or SWITCH_SEARCH_SPACE)
+    started = time.time()
+    with create_executor(workers) as executor:
+        if args.outcomes:
+            outcomes = load_outcomes(args.outcomes)
+        else:
+            records = db_manager.get_recent_records(args.draws + HISTORY)
+            if not records or len(records) <= HISTORY:
+                logger.error(f"开奖记录不足，无法模拟，当前记录数：{len(records) if records else 0}")
+                return 1
+            outcomes = compute_outcomes(records, executor, workers, args.seed, args.types)
+
+        ranking = rank_policies(
+            outcomes, configs, executor,
+            seed=args.seed,
+            selectors=args.selector or ('default',),
+            churn_weight=args.churn_weight,
+            types=args.types
+        )
+
+    print(format_ranking(ranking, args.top))
+    logger.info(f"模拟 {sum(len(r) for r in ranking.values())} 组策略，耗时 {time.time() - started:.2f}秒")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(ranking, f, ensure_ascii=False, indent=2)
+        logger.info(f"排序结果已写入 {args.output}")
+    return 0
@@ -0,0 +1,247 @@
+"""
+开奖窗口特征模块
+
+各预测算法和强化学习的状态编码都要从同一批最近开奖中统计大小、单双、组合的
+频率、连续和间隔。DrawFeatures 在新一期开奖后只解析一次记录，以NumPy数组保存
+数字矩阵、组合编码和累计计数，所有使用方从中读取，不再各自逐行循环。
+"""
+import random
+import threading
+import numpy as np
+from loguru import logger
+
+# 大小单双组合（编码顺序）：编码 = 小*2 + 双
+COMBOS = ['大单', '大双', '小单', '小双']
+
+# 号码形态（record[7]）
+COMBO_TYPES = ['豹子', '对子', '顺子', '杂六']
+
+# 和值取值范围 0..27
+SUM_RANGE = 28
+
+def _parse_digits(opennum):
+    """解析开奖号码为三个数字，格式如 "0+6+9" 或 "069" """
+    parts = opennum.split('+') if '+' in opennum else list(opennum)
+    if len(parts) != 3:
+        raise ValueError(f"开奖号码格式错误: {opennum}")
+    return [int(part) for part in parts]
+
+def max_run(mask):
+    """布尔序列中最长的连续True长度"""
+    if not mask.any():
+        return 0
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return int((np.nonzero(edges == -1)[0] - np.nonzero(edges == 1)[0]).max())
+
+def leading_run(flags):
+    """序列开头（最近一期起）连续相同值的长度"""
+    if len(flags) == 0:
+        return 0
+    changes = np.nonzero(flags != flags[0])[0]
+    return int(changes[0]) if changes.size else len(flags)
+
+class DrawFeatures:
+    """按期号倒序的开奖窗口特征（第0行为最新一期）
+
+    Attributes:
+        digits: (n, 3) 开奖数字矩阵，无法解析的行为-1
+        sums: (n,) 和值
+        is_big / is_odd: (n,) 大小、单双标记（取自记录字段）
+        combo_codes: (n,) 大小单双组合编码，对应 COMBOS
+        combo_types: (n,) 号码形态编码，对应 COMBO_TYPES，未知为-1
+        combo_cumulative: (n+1, 4) 组合出现次数的前缀和，任意区间计数为两行之差
+    """
+
+    def __init__(self, qihao, digits, sums, is_big, is_odd, combo_types):
+        self.qihao = qihao
+        self.digits = digits
+        self.sums = sums
+        self.is_big = is_big
+        self.is_odd = is_odd
+        self.combo_types = combo_types
+        self.combo_codes = ((~is_big).astype(np.int8) * 2 + (~is_odd).astype(np.int8))
+        onehot = self.combo_codes[:, None] == np.arange(len(COMBOS))
+        self.combo_cumulative = np.vstack((np.zeros((1, len(COMBOS)), dtype=np.int32), np.cumsum(onehot, axis=0)))
+        self.big_cumulative = np.concatenate(([0], np.cumsum(is_big)))
+        self.odd_cumulative = np.concatenate(([0], np.cumsum(is_odd)))
+        self._values = None
+        self._heads = {}
+        self._combo_stats = None
+
+    @classmethod
+    def from_records(cls, records):
+        """解析开奖记录（唯一一次逐行循环）"""
+        n = len(records)
+        digits = np.full((n, 3), -1, dtype=np.int16)
+        sums = np.zeros(n, dtype=np.int16)
+        is_big = np.zeros(n, dtype=bool)
+        is_odd = np.zeros(n, dtype=bool)
+        combo_types = np.full(n, -1, dtype=np.int8)
+        for i, record in enumerate(records):
+            try:
+                digits[i] = _parse_digits(record[3])
+            except (IndexError, ValueError, TypeError, AttributeError) as e:
+                logger.error(f"提取A、B、C值失败: {e}, record: {record}")
+            try:
+                sums[i] = int(record[4])
+                is_big[i] = bool(record[5])
+                is_odd[i] = bool(record[6])
+                if record[7] in COMBO_TYPES:
+                    combo_types[i] = COMBO_TYPES.index(record[7])
+            except (IndexError, ValueError, TypeError) as e:
+                logger.error(f"处理开奖记录失败: {e}, record: {record}")
+        qihao = records[0][1] if n else None
+        return cls(qihao, digits, sums, is_big, is_odd, combo_types)
+
+    def __len__(self):
+        return len(self.sums)
+
+    def head(self, n):
+        """最近n期的特征（结果会被缓存）"""
+        if n >= len(self):
+            return self
+        features = self._heads.get(n)
+        if features is None:
+            features = DrawFeatures(
+                self.qihao, self.digits[:n], self.sums[:n],
+                self.is_big[:n], self.is_odd[:n], self.combo_types[:n]
+            )
+            self._heads[n] = features
+        return features
+
+    def window(self, start, stop):
+        """第 [start, stop) 行组成的特征（数组为视图，只重新计算累计计数）"""
+        return DrawFeatures(
+            None, self.digits[start:stop], self.sums[start:stop],
+            self.is_big[start:stop], self.is_odd[start:stop], self.combo_types[start:stop]
+        )
+
+    def values(self, minimum=10):
+        """最近10期的A1..C10值（与 prepare_test_values 的返回格式相同）
+
+        Args:
+            minimum: 至少需要的期数，不足时返回空字典
+
+        Returns:
+            dict: 新的字典副本，调用方可以自由添加键
+        """
+        if len(self) < minimum:
+            logger.warning("历史记录不足，无法提取完整的预测值")
+            return {}
+        if self._values is None:
+            values = {}
+            for i in range(min(10, len(self))):
+                row = self.digits[i]
+                if (row < 0).any():
+                    # 无法解析的号码使用随机值代替
+                    row = [random.randint(0, 9) for _ in range(3)]
+                values[f'A{i+1}'], values[f'B{i+1}'], values[f'C{i+1}'] = (int(x) for x in row)
+            self._values = values
+        return dict(self._values)
+
+    def big_count(self, stop=None):
+        """前stop期中大的次数"""
+        return int(self.big_cumulative[min(stop or len(self), len(self))])
+
+    def odd_count(self, stop=None):
+        """前stop期中单的次数"""
+        return int(self.odd_cumulative[min(stop or len(self), len(self))])
+
+    def combo_counts(self, start=0, stop=None):
+        """区间 [start, stop) 内各组合的出现次数，按 COMBOS 顺序"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = min(start, stop)
+        return self.combo_cumulative[stop] - self.combo_cumulative[start]
+
+    def combo_type_counts(self, stop=None):
+        """前stop期中各号码形态的出现次数，按 COMBO_TYPES 顺序"""
+        types = self.combo_types[:stop]
+        return np.bincount(types[types >= 0], minlength=len(COMBO_TYPES))
+
+    def sum_counts(self, start=0, stop=None):
+        """区间 [start, stop) 内各和值的出现次数（长度28）"""
+        sums = self.sums[start:stop]
+        return np.bincount(sums[(sums >= 0) & (sums < SUM_RANGE)], minlength=SUM_RANGE)
+
+    def transition_counts(self, stop=None):
+        """前stop期中相邻两期（第i期 -> 第i+1期）的组合转换次数矩阵 (4, 4)"""
+        codes = self.combo_codes[:stop]
+        matrix = np.zeros((len(COMBOS), len(COMBOS)), dtype=np.int32)
+        if len(codes) > 1:
+            np.add.at(matrix, (codes[:-1], codes[1:]), 1)
+        return matrix
+
+    def gaps(self):
+        """各组合距最近一次出现的期数，窗口内未出现时为窗口长度"""
+        n = len(self)
+        return np.array([
+            int(np.argmax(self.combo_codes == code)) if (self.combo_codes == code).any() else n
+            for code in range(len(COMBOS))
+        ])
+
+    def combo_stats(self):
+        """各组合在整个窗口内的连续、间隔和周期统计
+
+        Returns:
+            dict: 均为按 COMBOS 顺序的数组
+                max_streaks: 最长连续出现期数
+                max_gaps: 最长连续未出现期数
+                last_pos: 最后一次（最早一期）出现的位置，未出现为-1
+                avg_cycles: 相邻两次出现的平均间隔，出现少于两次为0
+        """
+        if self._combo_stats is None:
+            max_streaks, max_gaps, last_pos, avg_cycles = [], [], [], []
+            for code in range(len(COMBOS)):
+                mask = self.combo_codes == code
+                positions = np.nonzero(mask)[0]
+                max_streaks.append(max_run(mask))
+                max_gaps.append(max_run(~mask))
+                last_pos.append(int(positions[-1]) if positions.size else -1)
+                avg_cycles.append(
+                    int(positions[-1] - positions[0]) / (positions.size - 1) if positions.size > 1 else 0
+                )
+            self._combo_stats = {
+                'max_streaks': np.array(max_streaks),
+                'max_gaps': np.array(max_gaps),
+                'last_pos': np.array(last_pos),
+                'avg_cycles': np.array(avg_cycles, dtype=float)
+            }
+        return self._combo_stats
+
+# 最近一次构建的特征：新一期开奖后首次使用时构建，之后各算法共用
+_latest = None
+_latest_first_record = None
+_lock = threading.Lock()
+
+def get_draw_features(records):
+    """获取开奖记录对应的特征
+
+    同一最新一期的记录只解析一次；已有特征覆盖的期数不少于请求的记录数时直接截取。
+
+    Args:
+        records: 按期号倒序的开奖记录
+
+    Returns:
+        DrawFeatures: 与 records 等长的特征
+    """
+    global _latest, _latest_first_record
+    if not records:
+        return DrawFeatures.from_records([])
+    with _lock:
+        if _latest is not None and _latest_first_record == records[0] and len(_latest) >= len(records):
+            return _latest.head(len(records))
+        features = DrawFeatures.from_records(records)
+        _latest, _latest_first_record = features, records[0]
+        return features
+
+def prime_draw_features(records, features):
+    """将已构建的特征登记为 records 的特征（回测时由整段历史截取窗口，避免逐期重新解析）
+
+    Args:
+        records: 按期号倒序的开奖记录
+        features: 与 records 对应的特征，长度不少于 records
+    """
+    global _latest, _latest_first_record
+    features.qihao = records[0][1]
+    with _lock:
+        _latest, _latest_first_record = features, records[0]
@@ -4,10 +4,56 @@
 import random
 from loguru import logger
 
+from features.prediction.utils.draw_features import get_draw_features
+
 def get_last_digit(number):
     """获取数字的最后一位（个位数）"""
     return abs(int(number)) % 10
 
+def create_performance_stats():
+    """创建初始的算法性能数据"""
+    return {
+        'total_predictions': 0,
+        'correct_predictions': 0,
+        'recent_results': [],  # 最近20次预测结果
+        'consecutive_correct': 0,  # 连续正确次数
+        'consecutive_wrong': 0,    # 连续错误次数
+        'last_switch_time': 0,     # 上次切换时间（预测次数）
+        'success_rate': 0.5,       # 成功率
+        'recent_success_rate': 0.5, # 最近20次成功率
+        'confidence_score': 0.5,    # 置信度分数
+    }
+
+def update_performance_stats(perf, is_correct, max_recent_results=20):
+    """将一次预测结果计入算法性能统计（总数、连续次数、最近结果、成功率和置信度）
+    
+    Args:
+        perf: 算法性能数据字典
+        is_correct: 预测是否正确
+        max_recent_results: 最近结果保留的数量
+    """
+    perf['total_predictions'] += 1
+    if is_correct:
+        perf['correct_predictions'] += 1
+        perf['consecutive_correct'] += 1
+        perf['consecutive_wrong'] = 0
+    else:
+        perf['consecutive_wrong'] += 1
+        perf['consecutive_correct'] = 0
+    
+    # 更新最近结果
+    perf['recent_results'].append(1 if is_correct else 0)
+    if len(perf['recent_results']) > max_recent_results:
+        perf['recent_results'].pop(0)
+    
+    # 更新成功率和最近成功率
+    perf['success_rate'] = perf['correct_predictions'] / perf['total_predictions']
+    recent_total = len(perf['recent_results'])
+    perf['recent_success_rate'] = sum(perf['recent_results']) / recent_total if recent_total > 0 else 0.5
+    
+    # 更新置信度分数
+    perf['confidence_score'] = calculate_confidence_score(perf)
+
 def calculate_confidence_score(perf):
     """计算置信度分数
     
@@ -44,39 +90,7 @@ def extract_values_from_records(records):
     Returns:
         包含预测所需值的字典
     """
-    values = {}
-    
-    try:
-        # 确保有足够的记录
-        if len(records) < 10:
-            logger.warning("历史记录不足，无法提取完整的预测值")
-            return values
-            
-        # 提取最近10期的A、B、C值
-        for i in range(min(10, len(records))):
-            record = records[i]
-            
-            # 提取A、B、C值
-            try:
-                a_val = int(record[3])
-                b_val = int(record[4])
-                c_val = int(record[5])
-                
-                # 存储值
-                values[f'A{i+1}'] = a_val
-                values[f'B{i+1}'] = b_val
-                values[f'C{i+1}'] = c_val
-            except (IndexError, ValueError, TypeError) as e:
-                logger.error(f"提取A、B、C值失败: {e}, record: {record}")
-                # 使用随机值代替
-                values[f'A{i+1}'] = random.randint(0, 9)
-                values[f'B{i+1}'] = random.randint(0, 9)
-                values[f'C{i+1}'] = random.randint(0, 9)
-    
-    except Exception as e:
-        logger.error(f"提取预测值失败: {e}")
-        
-    return values
+    return prepare_test_values(records)
 
 def prepare_test_values(records):
     """准备测试数据，从历史记录中提取预测所需的值
@@ -85,58 +99,13 @@ def prepare_test_values(records):
         records: 历史开奖记录
         
     Returns:
-        包含预测所需值的字典
+        包含预测所需值的字典（A1..C10，从共享的开奖特征中读取）
     """
-    values = {}
-    
     try:
-        # 确保有足够的记录
-        if len(records) < 10:
-            logger.warning("历史记录不足，无法提取完整的预测值")
-            return values
-            
-        # 提取最近10期的A、B、C值
-        for i in range(min(10, len(records))):
-            record = records[i]
-            
-            # 提取A、B、C值
-            try:
-                # 获取开奖号码字段 (格式如 "0+6+9")
-                opennum = record[3]  # 假设开奖号码在索引3
-                
-                # 分割开奖号码
-                if '+' in opennum:
-                    abc_values = opennum.split('+')
-                    if len(abc_values) == 3:
-                        a_val = int(abc_values[0])
-                        b_val = int(abc_values[1])
-                        c_val = int(abc_values[2])
-                    else:
-                        raise ValueError(f"开奖号码格式错误: {opennum}")
-                else:
-                    # 如果没有+分隔符，尝试按位置解析
-                    if len(opennum) == 3:
-                        a_val = int(opennum[0])
-                        b_val = int(opennum[1])
-                        c_val = int(opennum[2])
-                    else:
-                        raise ValueError(f"开奖号码格式错误: {opennum}")
-                
-                # 存储值
-                values[f'A{i+1}'] = a_val
-                values[f'B{i+1}'] = b_val
-                values[f'C{i+1}'] = c_val
-            except (IndexError, ValueError, TypeError) as e:
-                logger.error(f"提取A、B、C值失败: {e}, record: {record}")
-                # 使用随机值代替
-                values[f'A{i+1}'] = random.randint(0, 9)
-                values[f'B{i+1}'] = random.randint(0, 9)
-                values[f'C{i+1}'] = random.randint(0, 9)
-    
+        return get_draw_features(records).values()
     except Exception as e:
         logger.error(f"提取预测值失败: {e}")
-        
-    return values
+        return {}
 
 def generate_special_numbers(selected_combos):
     """根据选定的组合生成特码
@@ -0,0 +1,297 @@
+"""
+杀组、双组打分权重搜索
+
+在全部历史上搜索 scoring_weights 中的权重，结果写入带版本号的权重文件，算法启动时加载：
+- 特征预先计算一次：杀组为每一期四个组合的窗口特征（与 combo_features 相同），
+  双组为每一期的组合频率和最近5期出现次数。
+- 杀组得分是特征的线性加权，一批候选权重的打分只是一次矩阵乘法；
+  双组的“上次已推荐”依赖上一期的选择，按时间逐期模拟，但每一步同时处理整批候选。
+- 候选分批在进程池中评估：先在整个空间随机采样，再围绕得分最高的候选逐轮缩小范围细化。
+- 历史按时间切分，较早的部分用于选择，最近的部分只用于验证；
+  最优候选的验证命中率不低于当前权重时才写入（--force 可跳过检查）。
+
+评估的是算法1的确定性部分（杀权重最高的组合、选概率最高的两个组合），
+算法2、3在此基础上叠加的随机变化与权重无关。
+
+命令行：python bot.py weight-search [--types kill_group double_group] [--candidates 2000] [--rounds 4]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from loguru import logger
+
+from features.data.db_manager import db_manager
+from features.prediction.utils.draw_features import get_draw_features, COMBOS
+from features.prediction.algorithms.kill_group_stats import SlidingComboStats, combo_features, WINDOW
+from features.prediction.algorithms.scoring_weights import (
+    ScoringWeights, scoring_weights, KILL_GROUP_FEATURES,
+    DEFAULT_KILL_GROUP_WEIGHTS, DEFAULT_DOUBLE_GROUP_WEIGHTS
+)
+from features.prediction.backtest import RECORD_LIMITS
+
+SEARCH_TYPES = ('kill_group', 'double_group')
+
+DOUBLE_GROUP_PARAMS = tuple(DEFAULT_DOUBLE_GROUP_WEIGHTS)
+
+# 双组各系数的随机采样范围
+DOUBLE_GROUP_BOUNDS = {
+    'repeat_threshold': (1, 5),
+    'repeat_penalty': (0.0, 0.3),
+    'cold_limit': (0.0, 0.6),
+    'cold_boost': (1.0, 3.0),
+    'last_recommended': (0.2, 1.2)
+}
+
+# 每批评估的候选数：杀组受打分矩阵的内存限制；双组逐期模拟的开销主要在每一步，批次越大越划算
+BATCH_SIZES = {'kill_group': 32, 'double_group': 256}
+
+# 进程池中的特征：预测类型 -> (特征, 实际组合编码, 训练/验证分界)
+_features = {}
+
+def kill_group_features(codes):
+    """按时间顺序的组合编码 -> 每一期的杀组特征
+
+    Args:
+        codes: 按时间顺序的组合编码，前 WINDOW 期只作为历史
+
+    Returns:
+        numpy.ndarray: (期数 - WINDOW, 4, 特征数)
+    """
+    stats = SlidingComboStats(WINDOW)
+    features = np.zeros((max(0, len(codes) - WINDOW), len(COMBOS), len(KILL_GROUP_FEATURES)), dtype=np.float32)
+    for index, code in enumerate(codes):
+        if index >= WINDOW:
+            features[index - WINDOW] = combo_features(stats)
+        stats.push(code)
+    return features
+
+def double_group_features(codes):
+    """按时间顺序的组合编码 -> 每一期的双组特征
+
+    与 predict_double_group 一致：频率取自传入的最近 RECORD_LIMITS['double_group'] 期，
+    另统计最近5期的出现次数。
+
+    Returns:
+        tuple: (频率 (期数, 4), 最近5期出现次数 (期数, 4))，第一行对应第 RECORD_LIMITS['double_group'] 期
+    """
+    history = RECORD_LIMITS['double_group']
+    onehot = np.eye(len(COMBOS), dtype=np.int32)[np.asarray(codes, dtype=np.int64)]
+    cumulative = np.concatenate((np.zeros((1, len(COMBOS)), dtype=np.int32), np.cumsum(onehot, axis=0)))
+    stop = np.arange(history, len(codes))
+    counts = cumulative[stop] - cumulative[stop - min(30, history)]
+    recent = cumulative[stop] - cumulative[stop - min(5, history)]
+    totals = counts.sum(axis=1, keepdims=True)
+    probs = np.where(totals > 0, counts / np.maximum(totals, 1), 0.25)
+    return probs, recent
+
+def _init_search_worker(features):
+    logger.disable('features')
+    _features.update(features)
+
+def _accuracy(hits, split):
+    """(期数, 候选数) 的命中矩阵 -> (候选数, 2)：训练、验证命中率"""
+    return np.stack((hits[:split].mean(axis=0), hits[split:].mean(axis=0)), axis=1)
+
+def _score_kill_group(weights):
+    """一批杀组权重 (候选数, 特征数) 的命中率"""
+    features, actual, split = _features['kill_group']
+    scores = features @ weights.astype(np.float32).T          # (期数, 4, 候选数)
+    killed = scores.argmax(axis=1)                            # (期数, 候选数)
+    return _accuracy(killed != actual[:, None], split)
+
+def _score_double_group(params):
+    """一批双组系数 (候选数, 参数数) 的命中率（按时间逐期模拟，整批候选同时计算）"""
+    (probs, recent), actual, split = _features['double_group']
+    threshold, penalty, cold_limit, cold_boost, last_recommended = (params[:, [i]] for i in range(len(DOUBLE_GROUP_PARAMS)))
+    candidates = len(params)
+    rows = np.arange(candidates)[:, None]
+    last = np.zeros((candidates, len(COMBOS)), dtype=bool)
+    hits = np.zeros((len(actual), candidates), dtype=bool)
+    for t in range(len(actual)):
+        weights = np.where(recent[t] >= threshold, probs[t] * (1 - penalty * recent[t]), probs[t])
+        weights = np.where((recent[t] == 0) & (weights < cold_limit), weights * cold_boost, weights)
+        weights = np.where(last, weights * last_recommended, weights)
+        selected = np.argsort(-weights, axis=1, kind='stable')[:, :2]
+        hits[t] = (selected == actual[t]).any(axis=1)
+        last[:] = False
+        last[rows, selected] = True
+    return _accuracy(hits, split)
+
+def _score_task(task):
+    pred_type, candidates = task
+    if pred_type == 'kill_group':
+        return _score_kill_group(candidates)
+    return _score_double_group(candidates)
+
+def _candidate(pred_type, weights):
+    """权重字典 -> 候选数组"""
+    names = KILL_GROUP_FEATURES if pred_type == 'kill_group' else DOUBLE_GROUP_PARAMS
+    return np.array([weights[name] for name in names], dtype=float)
+
+def _sample(pred_type, rng, count, centers=None, scale=1.0):
+    """随机采样候选；给定 centers 时在其附近按 scale 扰动
+
+    杀组得分只比较大小，权重整体缩放不影响结果，采样后统一缩放到默认权重的L1范数。
+    """
+    if pred_type == 'kill_group':
+        norm = np.abs(_candidate(pred_type, DEFAULT_KILL_GROUP_WEIGHTS)).sum()
+        if centers is None:
+            candidates = rng.normal(size=(count, len(KILL_GROUP_FEATURES)))
+        else:
+            base = centers[rng.integers(len(centers), size=count)]
+            candidates = base / norm + rng.normal(scale=scale / len(KILL_GROUP_FEATURES), size=base.shape)
+        return candidates / np.abs(candidates).sum(axis=1, keepdims=True) * norm
+
+    low = np.array([DOUBLE_GROUP_BOUNDS[name][0] for name in DOUBLE_GROUP_PARAMS], dtype=float)
+    high = np.array([DOUBLE_GROUP_BOUNDS[name][1] for name in DOUBLE_GROUP_PARAMS], dtype=float)
+    if centers is None:
+        candidates = rng.uniform(low, high, size=(count, len(DOUBLE_GROUP_PARAMS)))
+    else:
+        base = centers[rng.integers(len(centers), size=count)]
+        candidates = np.clip(base + rng.normal(scale=scale * (high - low) / 2, size=base.shape), low, high)
+    candidates[:, DOUBLE_GROUP_PARAMS.index('repeat_threshold')] = np.rint(
+        candidates[:, DOUBLE_GROUP_PARAMS.index('repeat_threshold')])
+    return candidates
+
+def _evaluate(executor, pred_type, candidates):
+    size = BATCH_SIZES[pred_type]
+    batches = [candidates[i:i + size] for i in range(0, len(candidates), size)]
+    return np.concatenate(list(executor.map(_score_task, [(pred_type, batch) for batch in batches])))
+
+def search_weights(pred_type, executor, candidates=2000, rounds=4, elite=16, seed=0, baseline=None):
+    """随机搜索并逐轮细化一个预测类型的权重
+
+    Args:
+        pred_type: 'kill_group' 或 'double_group'
+        executor: 已加载特征的进程池
+        candidates: 每轮评估的候选数
+        rounds: 细化轮数（第0轮为全空间随机采样）
+        elite: 每轮保留用于细化的候选数
+        seed: 随机数种子
+        baseline: 作为对照的当前权重（ScoringWeights），默认为全局实例
+
+    Returns:
+        dict: best 最优候选, baseline 当前权重, 两者的训练/验证命中率, evaluated 评估的候选总数
+    """
+    baseline = baseline or scoring_weights
+    rng = np.random.default_rng([seed, SEARCH_TYPES.index(pred_type)])
+    current = _candidate(pred_type, getattr(baseline, pred_type))
+    pool = np.vstack((current, _sample(pred_type, rng, candidates)))
+    scores = _evaluate(executor, pred_type, pool)
+    logger.info(f"{pred_type} 第0轮: 最佳训练命中率 {scores[:, 0].max():.4%}")
+
+    for round_index in range(1, rounds + 1):
+        centers = pool[np.argsort(-scores[:, 0], kind='stable')[:elite]]
+        refined = _sample(pred_type, rng, candidates, centers, scale=0.5 ** round_index)
+        pool = np.vstack((pool, refined))
+        scores = np.vstack((scores, _evaluate(executor, pred_type, refined)))
+        logger.info(f"{pred_type} 第{round_index}轮: 最佳训练命中率 {scores[:, 0].max():.4%}")
+
+    best = int(np.argmax(scores[:, 0]))
+    names = KILL_GROUP_FEATURES if pred_type == 'kill_group' else DOUBLE_GROUP_PARAMS
+    return {
+        'best': _to_weights(pred_type, dict(zip(names, pool[best].tolist()))),
+        'baseline': _to_weights(pred_type, dict(zip(names, current.tolist()))),
+        'train_accuracy': float(scores[best, 0]),
+        'validation_accuracy': float(scores[best, 1]),
+        'baseline_train_accuracy': float(scores[0, 0]),
+        'baseline_validation_accuracy': float(scores[0, 1]),
+        'evaluated': len(pool)
+    }
+
+def _to_weights(pred_type, values):
+    """候选数组 -> 权重字典（双组的次数阈值为整数）"""
+    if pred_type == 'double_group':
+        values['repeat_threshold'] = int(round(values['repeat_threshold']))
+    return {name: round(value, 6) if isinstance(value, float) else value for name, value in values.items()}
+
+def prepare_features(records, types, validation=0.2):
+    """计算各预测类型的搜索特征
+
+    Args:
+        records: 按期号倒序的开奖记录
+        types: 预测类型
+        validation: 最近的期数中用于验证的比例
+
+    Returns:
+        dict: 预测类型 -> (特征, 实际组合编码, 训练/验证分界)
+    """
+    codes = get_draw_features(records).combo_codes[::-1].astype(np.int64)
+    features = {}
+    for pred_type in types:
+        if pred_type == 'kill_group':
+            data, offset = kill_group_features(codes), WINDOW
+        else:
+            data, offset = double_group_features(codes), RECORD_LIMITS['double_group']
+        actual = codes[offset:]
+        features[pred_type] = (data, actual, int(len(actual) * (1 - validation)))
+    return features
+
+def main(argv=None):
+    """命令行入口：python bot.py weight-search [选项]"""
+    parser = argparse.ArgumentParser(prog='bot.py weight-search', description='搜索杀组、双组的打分权重')
+    parser.add_argument('--draws', type=int, default=100000, help='使用的历史期数')
+    parser.add_argument('--types', nargs='+', choices=SEARCH_TYPES, default=list(SEARCH_TYPES), help='搜索的预测类型')
+    parser.add_argument('--candidates', type=int, default=2000, help='每轮评估的候选数')
+    parser.add_argument('--rounds', type=int, default=4, help='细化轮数')
+    parser.add_argument('--elite', type=int, default=16, help='每轮保留用于细化的候选数')
+    parser.add_argument('--validation', type=float, default=0.2, help='最近的期数中用于验证的比例')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--output', default=None, help='权重文件路径，默认为 SCORING_WEIGHTS_PATH')
+    parser.add_argument('--dry-run', action='store_true', help='只输出结果，不写入权重文件')
+    parser.add_argument('--force', action='store_true', help='验证命中率低于当前权重时也写入')
+    args = parser.parse_args(argv)
+
+    records = db_manager.get_recent_records(args.draws + WINDOW)
+    if not records or len(records) <= WINDOW:
+        logger.error(f"开奖记录不足，无法搜索，当前记录数：{len(records) if records else 0}")
+        return 1
+
+    started = time.time()
+    features = prepare_features(records, args.types, args.validation)
+    logger.info(f"特征计算完成: {len(records)} 期，耗时 {time.time() - started:.2f}秒")
+
+    target = ScoringWeights(args.output) if args.output else scoring_weights
+    results = {}
+    with ProcessPoolExecutor(
+        max_workers=args.workers or os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_search_worker,
+        initargs=(features,)
+    ) as executor:
+        for pred_type in args.types:
+            results[pred_type] = search_weights(
+                pred_type, executor, args.candidates, args.rounds, args.elite, args.seed, target
+            )
+
+    accepted = {}
+    for pred_type, result in results.items():
+        print(
+            f"[{pred_type}] 训练 {result['baseline_train_accuracy']:.4%} -> {result['train_accuracy']:.4%}, "
+            f"验证 {result['baseline_validation_accuracy']:.4%} -> {result['validation_accuracy']:.4%}, "
+            f"评估 {result['evaluated']} 组"
+        )
+        print(f"  {result['best']}")
+        if args.force or result['validation_accuracy'] >= result['baseline_validation_accuracy']:
+            accepted[pred_type] = result
+        else:
+            logger.warning(f"{pred_type} 最优权重的验证命中率低于当前权重，不写入")
+    logger.info(f"搜索完成，耗时 {time.time() - started:.2f}秒")
+
+    if accepted and not args.dry_run:
+        version = target.save(
+            kill_group=accepted['kill_group']['best'] if 'kill_group' in accepted else None,
+            double_group=accepted['double_group']['best'] if 'double_group' in accepted else None,
+            metrics={
+                'draws': len(records),
+                'latest_qihao': records[0][1],
+                **{pred_type: {k: v for k, v in result.items() if k not in ('best', 'baseline')}
+                   for pred_type, result in accepted.items()}
+            }
+        )
+        print(f"已写入 {target.path} (v{version})")
+    return 0
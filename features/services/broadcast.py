@@ -6,11 +6,16 @@ import asyncio
 import random
 
 from ..data.db_manager import db_manager
+from ..data.chat_registry import chat_registry
 from ..utils.message_utils import send_message_with_retry
-from ..data.cache_manager import cache
-from ..config.config_manager import CACHE_CONFIG, BROADCAST_CONFIG
+from ..utils.delivery_tracker import delivery_tracker
+from ..config.config_manager import BROADCAST_CONFIG
 from ..utils.utils_helper import format_broadcast_message, format_lottery_record, fetch_lottery_data, parse_datetime, analyze_lottery_data
-from ..services.prediction import start_prediction
+from ..services.prediction import start_prediction, send_prediction
+from ..services.live_board import update_live_board
+from ..services.sharded_broadcast import sharded_broadcaster
+from ..utils.render_cache import render_cache, TEMPLATE_LATEST, TEMPLATE_HISTORY
+from ..data.state_snapshot import state_snapshot
 
 # 定义特定群组ID
 SPECIAL_GROUP_ID = -1002312536972
@@ -18,27 +23,28 @@ SPECIAL_GROUP_ID = -1002312536972
 # 记录最新处理的期号
 latest_processed_qihao = None
 
+def _restore_broadcast_state(state):
+    """从快照恢复已处理的期号"""
+    global latest_processed_qihao
+    latest_processed_qihao = state.get('latest_processed_qihao')
+
+state_snapshot.register(
+    'broadcast',
+    lambda: {'latest_processed_qihao': latest_processed_qihao},
+    _restore_broadcast_state
+)
+
 async def send_broadcast(context: ContextTypes.DEFAULT_TYPE, chat_id=None):
     """发送开奖播报"""
     try:
         # 获取最近的开奖记录
-        recent_records = db_manager.get_recent_records(10)  # 使用配置中的BROADCAST_HISTORY_COUNT
+        recent_records = db_manager.get_recent_records(BROADCAST_CONFIG["HISTORY_COUNT"])
         if not recent_records:
             logger.error("获取开奖记录失败")
             return None
             
-        # 检查缓存是否过期
-        cache_key = 'last_broadcast_message'
-        current_time = datetime.now().timestamp()
-        if (cache.get(cache_key) and 
-            current_time - cache.get('last_broadcast_time', 0) < CACHE_CONFIG["BROADCAST_TTL"]):
-            logger.info("使用缓存的播报消息")
-            message = cache[cache_key]
-        else:
-            logger.info("生成新的播报消息")
-            message = format_broadcast_message(recent_records)
-            cache[cache_key] = message
-            cache['last_broadcast_time'] = current_time
+        # 按最新期号取渲染缓存，新一期到来后自动失效
+        payload = render_cache.get(recent_records, TEMPLATE_HISTORY)
             
         # 如果指定了聊天ID，发送消息
         if chat_id:
@@ -46,11 +52,12 @@ async def send_broadcast(context: ContextTypes.DEFAULT_TYPE, chat_id=None):
             await send_message_with_retry(
                 context,
                 chat_id=chat_id,
-                text=message,
+                text=payload.text,
                 parse_mode='MarkdownV2',
-                broadcast_mode=True
+                broadcast_mode=True,
+                escaped_text=payload.escaped
             )
-        return message
+        return payload.text
     except Exception as e:
         logger.error(f"发送开奖播报失败: {e}")
         return None
@@ -60,7 +67,7 @@ async def start_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     
     # 记录活跃聊天
-    db_manager.add_active_chat(chat_id)
+    chat_registry.add(chat_id)
     
     # 发送初始播报
     message = await send_broadcast(context, chat_id)
@@ -73,8 +80,9 @@ async def stop_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """停止开奖播报"""
     chat_id = update.effective_chat.id
     
-    # 移除活跃聊天
-    db_manager.remove_active_chat(chat_id)
+    # 移除活跃聊天，同时关闭看板模式
+    chat_registry.remove(chat_id)
+    db_manager.remove_live_board(chat_id)
     
     await update.message.reply_text("✅ 开奖播报已停止")
 
@@ -142,65 +150,46 @@ async def send_special_group_info(context, record):
         latest_processed_qihao = latest_qihao
         
         # 1. 发送开奖信息 - 使用最新获取的数据
-        recent_records = db_manager.get_recent_records(10)
+        recent_records = db_manager.get_recent_records(BROADCAST_CONFIG["HISTORY_COUNT"])
         if recent_records:
-            message = format_broadcast_message(recent_records)
-            await send_message_with_retry(context, SPECIAL_GROUP_ID, message, parse_mode='MarkdownV2', broadcast_mode=True)
+            payload = render_cache.get(recent_records, TEMPLATE_HISTORY)
+            await send_message_with_retry(
+                context, SPECIAL_GROUP_ID, payload.text, parse_mode='MarkdownV2',
+                broadcast_mode=True, escaped_text=payload.escaped
+            )
         
         # 添加随机延迟
         await asyncio.sleep(random.uniform(0.1, 0.3))
         
         # 2. 发送单双预测
-        await start_prediction_for_group(context, 'single_double')
+        await start_prediction_for_group(context, 'single_double', latest_qihao)
         
         # 添加随机延迟
         await asyncio.sleep(random.uniform(0.1, 0.3))
         
         # 3. 发送大小预测
-        await start_prediction_for_group(context, 'big_small')
+        await start_prediction_for_group(context, 'big_small', latest_qihao)
         
         # 添加随机延迟
         await asyncio.sleep(random.uniform(0.1, 0.3))
         
         # 4. 发送双组预测
-        await start_prediction_for_group(context, 'double_group')
+        await start_prediction_for_group(context, 'double_group', latest_qihao)
         
         # 添加随机延迟
         await asyncio.sleep(random.uniform(0.1, 0.3))
         
         # 5. 发送杀组预测
-        await start_prediction_for_group(context, 'kill_group')
+        await start_prediction_for_group(context, 'kill_group', latest_qihao)
         
         logger.info(f"已向特定群组 {SPECIAL_GROUP_ID} 发送期号 {latest_qihao} 的所有信息")
     except Exception as e:
         logger.error(f"向特定群组发送信息失败: {e}")
 
-async def start_prediction_for_group(context, pred_type):
-    """为特定群组启动预测"""
+async def start_prediction_for_group(context, pred_type, latest_qihao=None):
+    """为特定群组发送预测（读取预先计算的结果）"""
     try:
-        # 创建一个模拟更新对象，以便调用预测函数
-        class MockUpdate:
-            def __init__(self, chat_id):
-                self.effective_chat = MockChat(chat_id)
-                self.message = MockMessage(chat_id)
-                
-        class MockChat:
-            def __init__(self, chat_id):
-                self.id = chat_id
-                
-        class MockMessage:
-            def __init__(self, chat_id):
-                self.chat_id = chat_id
-                self.chat = MockChat(chat_id)
-                
-            async def reply_text(self, text, parse_mode=None, reply_markup=None):
-                await send_message_with_retry(context, self.chat_id, text, parse_mode=parse_mode, reply_markup=reply_markup, broadcast_mode=True)
-        
-        # 创建模拟更新对象
-        mock_update = MockUpdate(SPECIAL_GROUP_ID)
-        
-        # 调用预测函数
-        await start_prediction(mock_update, context, pred_type)
+        await send_prediction(context, SPECIAL_GROUP_ID, pred_type, latest_qihao)
     except Exception as e:
         logger.error(f"为特定群组启动预测失败: {e}")
 
@@ -210,37 +199,77 @@ async def check_latest_lottery(context):
         # 直接调用send_special_group_info，不传入参数
         await send_special_group_info(context, None)
         
-        # 检查活跃聊天
-        active_chats = db_manager.get_active_chats()
+        # 向活跃聊天推送
+        await broadcast_to_active_chats(context)
+    except Exception as e:
+        logger.error(f"检查最新开奖结果失败: {e}")
+
+async def broadcast_to_active_chats(context):
+    """向所有活跃聊天推送最新开奖
+
+    普通聊天每期收到一条新消息；开启看板模式的聊天只编辑自己的看板消息。
+    """
+    try:
+        # 检查活跃聊天（读取内存注册表，不查询数据库）
+        active_chats = chat_registry.get_chats()
         if not active_chats:
             return
             
-        # 给除了特定群组外的其他活跃聊天发送广播
-        for chat_id in active_chats:
+        # 获取当前最新记录
+        recent_records = db_manager.get_recent_records(BROADCAST_CONFIG["HISTORY_COUNT"])
+        if not recent_records:
+            return
+        latest_record = recent_records[0]
+        
+        # 每期只渲染一次，所有聊天共用同一份内容
+        latest_payload = render_cache.get(recent_records, TEMPLATE_LATEST)
+        live_boards = db_manager.get_live_boards()
+        
+        if sharded_broadcaster.enabled:
+            # 分片模式：普通聊天交给发送进程，主进程只负责看板聊天和发送进程已退出的分片
+            local_shards = set(sharded_broadcaster.publish(latest_record[1], latest_payload.escaped))
+            active_chats = [
+                chat_id for chat_id in active_chats
+                if chat_id in live_boards or sharded_broadcaster.shard_of(chat_id) in local_shards
+            ]
+        
+        # 看板内容包含历史记录，所有看板聊天共用同一份内容
+        board_payload = render_cache.get(recent_records, TEMPLATE_HISTORY) if live_boards else None
+            
+        # 给除了特定群组外的其他活跃聊天发送广播，连续投递失败的聊天排在最后
+        for chat_id in delivery_tracker.order_chats(active_chats):
             # 跳过特定群组，避免重复发送
             if chat_id == SPECIAL_GROUP_ID:
                 continue
-                
-            # 获取当前最新记录
-            latest_record = db_manager.get_latest_record()
-            if latest_record:
-                await send_broadcast_message(context, chat_id, latest_record)
+            
+            if chat_id in live_boards and board_payload:
+                await update_live_board(context, chat_id, board_payload, live_boards[chat_id])
+            else:
+                await send_broadcast_message(context, chat_id, latest_record, latest_payload)
     except Exception as e:
-        logger.error(f"检查最新开奖结果失败: {e}")
+        logger.error(f"推送活跃聊天失败: {e}")
+    finally:
+        # 群发结束后在单个事务中移除本轮发现的无效聊天
+        delivery_tracker.flush_removals()
 
-async def send_broadcast_message(context, chat_id, record):
-    """向指定聊天发送广播消息"""
+async def send_broadcast_message(context, chat_id, record, payload=None):
+    """向指定聊天发送广播消息
+    
+    payload: 预先渲染的RenderedPayload，群发时由调用方传入以避免逐个聊天重复渲染
+    """
     try:
         # 格式化消息
-        message = format_broadcast_message([record])
+        if payload is None:
+            payload = render_cache.get([record], TEMPLATE_LATEST)
         
         # 使用重试机制发送消息，设置为广播模式
         await send_message_with_retry(
             context,
             chat_id=chat_id,
-            text=message,
+            text=payload.text,
             parse_mode='MarkdownV2',
-            broadcast_mode=True  # 使用广播模式，发送失败后不重试
+            broadcast_mode=True,  # 使用广播模式，发送失败后不重试
+            escaped_text=payload.escaped
         )
         logger.debug(f"已向聊天 {chat_id} 发送播报消息")
         return True
@@ -0,0 +1,113 @@
+from loguru import logger
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from ..data.db_manager import db_manager
+from ..data.chat_registry import chat_registry
+from ..utils.message_utils import send_message_with_retry, edit_message_with_retry, MESSAGE_NOT_MODIFIED
+from ..utils.delivery_tracker import delivery_tracker
+from ..config.config_manager import BROADCAST_CONFIG
+from ..utils.render_cache import render_cache, TEMPLATE_HISTORY
+
+async def update_live_board(context, chat_id, payload, board=None):
+    """将最新播报写入聊天的看板消息
+
+    优先编辑已有的看板消息；内容未变化时直接跳过；编辑失败时发送新消息并重新置顶，
+    聊天已不可用（永久失败，等待移除）时不再发送。
+
+    Args:
+        context: 机器人上下文
+        chat_id: 聊天ID
+        payload: 渲染缓存中的播报内容（RenderedPayload）
+        board: 预先查询的看板信息，为None时从数据库读取
+
+    Returns:
+        bool: 看板是否为最新内容
+    """
+    try:
+        if board is None:
+            board = db_manager.get_live_boards().get(chat_id, {})
+
+        message_id = board.get('message_id')
+
+        # 内容未变化，不产生任何API调用
+        if message_id and board.get('last_text') == payload.text:
+            logger.debug(f"看板内容未变化，跳过: {chat_id}")
+            return True
+
+        if message_id:
+            # 看板模式下只尝试一次编辑，失败后立即改为发送新消息
+            result = await edit_message_with_retry(
+                context,
+                chat_id=chat_id,
+                message_id=message_id,
+                text=payload.text,
+                parse_mode='MarkdownV2',
+                max_retries=0,
+                escaped_text=payload.escaped
+            )
+            # 内容未修改说明看板已是最新内容，同样视为成功
+            if result == MESSAGE_NOT_MODIFIED or result:
+                db_manager.save_live_board(chat_id, message_id, payload.text)
+                logger.debug(f"已编辑看板消息: {chat_id}, {message_id}")
+                return True
+            if delivery_tracker.is_pending_removal(chat_id):
+                logger.warning(f"聊天不可用，不再发送新的看板消息: {chat_id}")
+                return False
+            logger.warning(f"编辑看板消息失败，改为发送新消息: {chat_id}, {message_id}")
+
+        sent = await send_message_with_retry(
+            context,
+            chat_id=chat_id,
+            text=payload.text,
+            parse_mode='MarkdownV2',
+            broadcast_mode=True,
+            escaped_text=payload.escaped
+        )
+        if not sent:
+            return False
+
+        # 群组升级为超级群组时消息发往新的聊天ID，看板记录在新ID下
+        chat_id = sent.chat_id
+        db_manager.save_live_board(chat_id, sent.message_id, payload.text)
+
+        if BROADCAST_CONFIG["LIVE_BOARD_PIN"]:
+            try:
+                await context.bot.pin_chat_message(
+                    chat_id=chat_id,
+                    message_id=sent.message_id,
+                    disable_notification=True
+                )
+            except Exception as e:
+                # 没有置顶权限时看板仍可正常编辑，只记录日志
+                logger.warning(f"置顶看板消息失败 {chat_id}: {e}")
+
+        logger.info(f"已创建新的看板消息: {chat_id}, {sent.message_id}")
+        return True
+    except Exception as e:
+        logger.error(f"更新看板消息失败 {chat_id}: {e}")
+        return False
+
+async def start_live_board(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """开启看板模式"""
+    chat_id = update.effective_chat.id
+
+    # 看板模式同样依赖活跃聊天列表接收推送
+    chat_registry.add(chat_id)
+    # 清空旧的看板消息ID，确保重新发送并置顶一条新看板
+    db_manager.save_live_board(chat_id)
+
+    recent_records = db_manager.get_recent_records(BROADCAST_CONFIG["HISTORY_COUNT"])
+    if not recent_records:
+        await update.message.reply_text("❌ 启动看板播报失败，请稍后再试")
+        return
+
+    payload = render_cache.get(recent_records, TEMPLATE_HISTORY)
+    if await update_live_board(context, chat_id, payload, board={}):
+        await update.message.reply_text("✅ 看板播报已启动，每期开奖将更新置顶的看板消息")
+    else:
+        await update.message.reply_text("❌ 启动看板播报失败，请稍后再试")
+
+def stop_live_board(chat_id):
+    """关闭看板模式（保留看板消息本身）"""
+    return db_manager.remove_live_board(chat_id)
@@ -7,26 +7,39 @@ import sys
 from datetime import datetime
 from loguru import logger
 from telegram.ext import ContextTypes
-from time import time
 
 from ..config.config_manager import BROADCAST_CONFIG
 from ..data.db_manager import db_manager
-from ..data.cache_manager import cache
+from ..data.cache_manager import cache_manager
+from ..data.state_snapshot import state_snapshot
 from ..services.prediction import verify_prediction, auto_run_all_predictions
-from ..services.broadcast import send_broadcast, check_latest_lottery, send_special_group_info, send_broadcast_message
-from ..utils.utils_helper import fetch_lottery_data, parse_datetime, analyze_lottery_data
+from ..services.broadcast import send_broadcast, check_latest_lottery, send_special_group_info, send_broadcast_message, broadcast_to_active_chats
+from ..utils.utils_helper import fetch_lottery_data, parse_datetime, analyze_lottery_data, render_broadcast_history_line
 from ..utils.message_handler import is_broadcasting, check_broadcasting_status
 from ..utils.message_utils import send_message_with_retry
+from ..utils.render_cache import render_cache
 
 # 定义特定群组ID
 SPECIAL_GROUP_ID = -1002312536972
 
+def _export_recent_draws():
+    """导出最近开奖窗口（用于快照）"""
+    records = db_manager.get_recent_records(BROADCAST_CONFIG["HISTORY_COUNT"])
+    return [tuple(record) for record in records or []]
+
+def _restore_recent_draws(records):
+    """从快照恢复最新期号，并预先渲染最近开奖窗口的播报历史行"""
+    if not records:
+        return
+    cache_manager.latest_qihao = records[0][1]
+    for record in records:
+        render_broadcast_history_line(record)
+
+state_snapshot.register('recent_draws', _export_recent_draws, _restore_recent_draws)
+
 async def check_lottery_update(context: ContextTypes.DEFAULT_TYPE):
     """检查新开奖结果并更新数据库"""
     try:
-        # 更新当前时间戳
-        cache['current_time'] = time()
-        
         # 获取最新开奖数据
         lottery_data = fetch_lottery_data(page=1, min_records=BROADCAST_CONFIG["HISTORY_COUNT"])
         if not lottery_data:
@@ -81,6 +94,12 @@ async def check_lottery_update(context: ContextTypes.DEFAULT_TYPE):
                 
                 logger.info(f"新增开奖记录: 期号={qihao}, 开奖号码={opennum}, 和值={total_sum}")
                 
+                # 开奖事件：失效与上一期绑定的缓存（播报渲染、预测结果等）
+                cache_manager.on_new_draw(qihao)
+                
+                # 渲染并追加本期的播报历史行
+                render_broadcast_history_line((None, qihao, opentime, opennum, total_sum, is_big, is_odd, combination_type))
+                
                 # 验证预测结果
                 try:
                     # 使用asyncio.create_task包装可能的非协程函数
@@ -113,25 +132,15 @@ async def check_lottery_update(context: ContextTypes.DEFAULT_TYPE):
                 logger.error(f"处理开奖记录失败: {e}")
                 continue
         
+        # 新一期入库后立即渲染播报内容，后续所有发送方直接复用
+        render_cache.prime(db_manager.get_recent_records(BROADCAST_CONFIG["HISTORY_COUNT"]))
+        
         # 向特定群组发送信息，直接调用send_special_group_info，不再传入record参数
         # send_special_group_info函数会自己获取最新数据
         await send_special_group_info(context, None)
         
-        # 检查活跃聊天
-        active_chats = db_manager.get_active_chats()
-        if not active_chats:
-            return
-            
-        # 给除了特定群组外的其他活跃聊天发送广播
-        for chat_id in active_chats:
-            # 跳过特定群组，避免重复发送
-            if chat_id == SPECIAL_GROUP_ID:
-                continue
-            
-            # 获取更新后的最新记录用于发送给其他用户
-            updated_record = db_manager.get_latest_record()
-            if updated_record:
-                await send_broadcast_message(context, chat_id, updated_record)
+        # 给除了特定群组外的其他活跃聊天发送广播（看板模式的聊天改为编辑看板消息）
+        await broadcast_to_active_chats(context)
             
     except Exception as e:
         logger.error(f"检查新开奖结果失败: {e}")
@@ -141,7 +150,6 @@ def initialize_lottery_data():
     try:
         lottery_data = fetch_lottery_data(page=1, min_records=BROADCAST_CONFIG["HISTORY_COUNT"])
         if lottery_data:
-            cache['last_lottery_data'] = lottery_data
             latest_record = lottery_data[0]
             
             # 保存所有获取到的记录
@@ -10,80 +10,24 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from ..data.db_manager import db_manager
-from ..prediction import predictor
+from ..data.chat_registry import chat_registry
+from ..prediction import predictor, shadow_evaluator
+from ..prediction.algorithms.algorithm_switcher import credited_algorithm
 from ..utils.message_utils import send_message_with_retry
-from ..data.cache_manager import cache
-from ..config.config_manager import PREDICTION_CONFIG, CACHE_CONFIG
-from ..utils.utils_helper import format_prediction_message, analyze_lottery_data
+from ..utils.utils_helper import analyze_lottery_data, render_prediction_history_line
+from ..services.prediction_store import prediction_store
 
-async def send_prediction(context: ContextTypes.DEFAULT_TYPE, chat_id, prediction_type):
-    """发送预测消息"""
+async def send_prediction(context: ContextTypes.DEFAULT_TYPE, chat_id, prediction_type, latest_qihao=None):
+    """发送预测消息（读取预先计算的结果，尚未计算时等待后台计算）"""
     try:
-        logger.info("开始获取预测数据...")
-        # 根据预测类型获取不同数量的历史记录
-        if prediction_type == 'kill_group':
-            # 杀组预测需要更多的历史数据
-            recent_records = db_manager.get_recent_records(100)  # 获取100条记录用于杀组预测
-            if not recent_records or len(recent_records) < 10:
-                logger.error(f"获取历史记录失败，当前记录数：{len(recent_records) if recent_records else 0}")
-                return None
-            logger.info(f"为杀组预测获取了 {len(recent_records)} 条历史记录")
+        prepared = prediction_store.get(prediction_type, latest_qihao)
+        if prepared is None:
+            prepared = await prediction_store.wait(prediction_type, latest_qihao)
+        if prepared:
+            logger.info(f"使用预先计算的预测结果：{prediction_type} {prepared.qihao}")
+            message = prepared.message
         else:
-            # 其他预测类型使用原来的10条记录
-            recent_records = db_manager.get_recent_records(10)
-            if not recent_records or len(recent_records) < 10:
-                logger.error(f"获取历史记录失败，当前记录数：{len(recent_records) if recent_records else 0}")
-                return None
-            
-        latest_qihao = recent_records[0][1]
-        next_qihao = str(int(latest_qihao) + 1)
-        logger.info(f"当前最新期号：{latest_qihao}，准备预测{next_qihao}期结果")
-        
-        # 检查缓存是否过期
-        cache_key = f'last_prediction_message_{prediction_type}'
-        current_time = datetime.now().timestamp()
-        if (cache.get(cache_key) and 
-            current_time - cache.get(f'last_prediction_time_{prediction_type}', 0) < CACHE_CONFIG["PREDICTION_TTL"] and
-            cache.get(f'last_prediction_qihao_{prediction_type}') == next_qihao):
-            logger.info("使用缓存的预测结果")
-            message = cache[cache_key]
-        else:
-            logger.info("计算新的预测结果")
-            prediction = predictor.calculate_prediction(recent_records, prediction_type)
-            if prediction:
-                try:
-                    # 获取历史预测记录
-                    prediction_history = db_manager.get_prediction_history(prediction_type)
-                    
-                    # 保存新预测
-                    db_manager.save_prediction(prediction)
-                    
-                    # 检查是否有算法切换信息
-                    switch_info = prediction.get('switch_info')
-                    if switch_info:
-                        switch_message = f"⚠️ 算法已从{switch_info['from_algo']}号切换为{switch_info['to_algo']}号\n"
-                        switch_message += f"原因: {switch_info['reason']}\n\n"
-                    else:
-                        switch_message = ""
-                    
-                    # 格式化消息
-                    message = format_prediction_message(prediction, prediction_history)
-                    
-                    # 如果有算法切换信息，添加到消息前面
-                    if switch_info:
-                        message = switch_message + message
-                    
-                    # 更新缓存
-                    cache[cache_key] = message
-                    cache[f'last_prediction_qihao_{prediction_type}'] = next_qihao
-                    cache[f'last_prediction_time_{prediction_type}'] = current_time
-                    
-                    logger.info(f"预测结果已缓存：{prediction_type} {next_qihao}")
-                except Exception as e:
-                    logger.error(f"处理预测结果失败: {e}")
-                    message = f"预测失败: {e}"
-            else:
-                message = "无法生成预测，请稍后再试"
+            message = "无法生成预测，请稍后再试"
         
         # 使用重试机制发送消息，设置为广播模式
         await send_message_with_retry(
@@ -103,7 +47,7 @@ async def start_prediction(update: Update, context: ContextTypes.DEFAULT_TYPE, p
     chat_id = update.effective_chat.id
     
     # 记录活跃聊天
-    db_manager.add_active_chat(chat_id)
+    chat_registry.add(chat_id)
     
     # 发送预测
     message = await send_prediction(context, chat_id, prediction_type)
@@ -228,29 +172,21 @@ def verify_prediction(context=None, qihao=None, opennum=None, total_sum=None, is
                 
             logger.info(f"验证预测结果: {qihao}期 {pred_type} {'正确' if is_correct else '错误'}")
             
+            # 渲染并追加该类型的预测历史行
+            render_prediction_history_line(pred_type, {
+                'qihao': qihao,
+                'prediction': prediction[2],
+                'result': opennum,
+                'sum': total_sum,
+                'is_big': is_big,
+                'is_odd': is_odd,
+                'combination_type': combination_type
+            })
+            
             # 更新算法性能
             try:
-                # 获取使用的算法号
-                if prediction[5] and prediction[5].strip():  # 确保algorithm_used不为空
-                    try:
-                        algo_info = json.loads(prediction[5])
-                        algo_num = algo_info.get(pred_type, 1)
-                    except json.JSONDecodeError:
-                        logger.error(f"解析算法信息失败: {prediction[5]}")
-                        algo_num = 1
-                else:
-                    # 如果算法信息为空，使用默认算法号
-                    logger.warning(f"算法信息为空，使用默认值")
-                    algo_num = 1
-                    
-                # 确保算法号在有效范围内
-                if algo_num < 1 or algo_num > 3:
-                    logger.warning(f"算法号超出有效范围: {algo_num}，使用默认值1")
-                    algo_num = 1
-                
-                # 针对单双和大小预测，强制使用算法1
-                if pred_type in ['single_double', 'big_small']:
-                    algo_num = 1
+                # 获取使用的算法号（algorithm_used 列；大小固定记入1号算法）
+                algo_num = credited_algorithm(pred_type, prediction[4])
                     
                 # 记录当前尝试更新的算法号
                 logger.info(f"更新算法性能 - 类型: {pred_type}, 算法号: {algo_num}, 是否正确: {is_correct}")
@@ -260,6 +196,9 @@ def verify_prediction(context=None, qihao=None, opennum=None, total_sum=None, is
             except Exception as e:
                 logger.error(f"更新算法性能失败: {e}")
         
+        # 影子评估：按本期开奖更新未使用算法的性能统计
+        shadow_evaluator.verify(qihao, is_big, is_odd)
+        
         return verified_any  # 返回是否验证了任何预测
     except Exception as e:
         logger.error(f"验证预测结果失败: {e}")
@@ -270,62 +209,16 @@ async def auto_run_all_predictions(context: ContextTypes.DEFAULT_TYPE):
     try:
         logger.info("自动运行所有类型的预测开始")
         
-        # 获取最新开奖记录
-        latest_record = db_manager.get_latest_record()
-        if not latest_record:
-            logger.error("获取最新开奖记录失败")
+        # 一次性计算并缓存下一期的全部预测，交互请求和特定群组直接复用（在后台线程中执行，不阻塞事件循环）。
+        # 交互请求触发的刷新可能在本期开奖入库前开始，等它结束后再刷新一次（已是最新时立即返回）
+        await asyncio.wrap_future(prediction_store.refresh_in_background())
+        if not await asyncio.wrap_future(prediction_store.refresh_in_background()):
+            logger.error("预先计算预测失败")
             return False
-            
-        qihao = latest_record[1]
-        
-        # 计算下一期期号
-        next_qihao = str(int(qihao) + 1)
-        
-        # 获取历史记录 - 移到循环外部，避免重复获取
-        recent_records = db_manager.get_recent_records(30)
-        if not recent_records:
-            logger.error("获取历史记录失败")
-            return False
-        
-        # 为每种预测类型进行预测
-        for pred_type in ['single_double', 'big_small', 'kill_group', 'double_group']:
-            # 检查是否已经有该期号的预测
-            existing_prediction = db_manager.get_prediction_by_qihao(next_qihao, pred_type)
-            if existing_prediction:
-                logger.info(f"{next_qihao}期的{pred_type}预测已存在，跳过")
-                continue
-                
-            # 根据预测类型进行预测
-            try:
-                # 进行预测
-                prediction_result = predictor.predict(pred_type, recent_records)
-                if not prediction_result:
-                    logger.error(f"{pred_type}预测失败")
-                    continue
-                    
-                # 获取算法信息
-                algo_used = predictor.get_current_algorithm(pred_type)
-                    
-                # 构建预测数据
-                prediction_data = {
-                    'qihao': next_qihao,
-                    'prediction': prediction_result,
-                    'prediction_type': pred_type,
-                    'algorithm_used': str(algo_used),
-                    'created_at': datetime.now().isoformat()
-                }
-                
-                # 保存预测
-                db_manager.save_prediction(prediction_data)
-                logger.info(f"已自动保存{pred_type}预测: {next_qihao}期, 内容: {prediction_result}")
-                
-            except Exception as e:
-                logger.error(f"自动运行{pred_type}预测失败: {e}")
-                continue
         
         logger.info("自动运行所有类型的预测完成")
         return True
         
     except Exception as e:
         logger.error(f"自动运行所有预测失败: {e}")
-        return False 
\ No newline at end of file
+        return False 
@@ -0,0 +1,161 @@
+"""
+预测执行模块
+
+新一期开奖后为下一期计算全部四种预测：共享的输入（开奖记录、该期已有的预测和缓存、
+马尔可夫模型的历史）只读取一次，需要新计算的预测类型在线程池中并发计算，每个类型有独立的超时时间，
+新的预测在一个事务中写入预测表和预测缓存，并记录每个类型的计算耗时。
+
+计算本身不修改预测器状态，只有被采用的结果才会写回（PredictorModel.commit_prediction）。
+超时的计算仍在线程中运行，在它结束之前同一预测类型不会再次提交计算：
+同一期再次执行时复用这个计算的结果，之后的期号则跳过该类型。
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from loguru import logger
+
+from ..data.db_manager import db_manager
+from ..prediction import predictor
+from ..prediction.algorithms.markov_combo_model import markov_combo_model
+from ..config.config_manager import PREDICTION_CONFIG
+
+class PredictionRunner:
+    """并发计算并批量保存各预测类型的预测"""
+
+    def __init__(self, workers=None, timeout=None):
+        self.workers = workers or PREDICTION_CONFIG["WORKERS"]
+        self.timeout = timeout or PREDICTION_CONFIG["TYPE_TIMEOUT"]
+        self._executor = None
+        self._lock = threading.Lock()
+        self._inflight = {}  # 预测类型 -> (期号, future)，结果被取用后移除
+        self.last_timings = {}
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='prediction')
+        return self._executor
+
+    @staticmethod
+    def _compute(records, pred_type):
+        """在线程池中计算单个预测类型，返回 (预测结果, 待写回的状态, 耗时秒数)"""
+        started = time.perf_counter()
+        prediction, state = predictor.compute_prediction(records, pred_type)
+        return prediction, state, time.perf_counter() - started
+
+    def _submit(self, next_qihao, records, pred_type):
+        """提交或复用同一预测类型的计算
+
+        Returns:
+            Future: 计算的future；该类型上一期的计算仍未结束时返回None
+        """
+        with self._lock:
+            inflight = self._inflight.get(pred_type)
+            if inflight and inflight[0] == next_qihao:
+                # 同一期之前超时的计算：结果尚未被取用，直接复用
+                logger.info(f"复用已提交的{pred_type}预测计算: {next_qihao}")
+                return inflight[1]
+            if inflight and not inflight[1].done():
+                logger.warning(f"{pred_type}上一次（{inflight[0]}期）的预测计算尚未结束，跳过本次计算")
+                return None
+            future = self._get_executor().submit(self._compute, records, pred_type)
+            self._inflight[pred_type] = (next_qihao, future)
+            return future
+
+    def _release(self, pred_type, future):
+        """结果已取用，移除该类型的计算记录"""
+        with self._lock:
+            if self._inflight.get(pred_type, (None, None))[1] is future:
+                del self._inflight[pred_type]
+
+    def busy(self):
+        """是否有尚未结束的计算（包括已超时、结果被丢弃的计算）"""
+        with self._lock:
+            return any(not future.done() for _, future in self._inflight.values())
+
+    @staticmethod
+    def _from_existing(next_qihao, pred_type, existing):
+        """已保存的预测（如重启后）沿用数据库中的结果，保证同一期只有一个预测"""
+        return {
+            'qihao': next_qihao,
+            'prediction': existing[2],
+            'prediction_type': pred_type,
+            'algorithm_used': existing[4],
+            'switch_info': None
+        }
+
+    def run(self, records_by_type, next_qihao):
+        """计算并保存下一期的预测
+
+        Args:
+            records_by_type: 预测类型 -> 该类型使用的历史记录（按期号倒序）
+            next_qihao: 预测的期号
+
+        Returns:
+            tuple: (预测类型 -> 预测结果, 预测类型 -> 计算耗时秒数)；失败或超时的类型不在结果中
+        """
+        existing = db_manager.get_predictions_by_qihao(next_qihao)
+        cached = db_manager.get_cached_predictions(next_qihao)
+
+        # 马尔可夫算法的历史在提交计算前加载，线程池中的计算不再读取数据库
+        if any(pred_type not in existing and pred_type not in cached for pred_type in records_by_type):
+            try:
+                markov_combo_model.sync(max(records_by_type.values(), key=len))
+            except Exception as e:
+                logger.error(f"加载马尔可夫模型历史失败: {e}")
+
+        predictions = {}
+        new_predictions = []
+        futures = {}
+        for pred_type, records in records_by_type.items():
+            if pred_type in existing:
+                predictions[pred_type] = self._from_existing(next_qihao, pred_type, existing[pred_type])
+            elif pred_type in cached:
+                logger.info(f"使用缓存的预测结果: {pred_type} {next_qihao}")
+                predictions[pred_type] = predictor.prediction_from_cache(next_qihao, pred_type, cached[pred_type])
+                new_predictions.append(predictions[pred_type])
+            else:
+                future = self._submit(next_qihao, records, pred_type)
+                if future is not None:
+                    futures[pred_type] = (time.perf_counter(), future)
+
+        timings = {}
+        for pred_type, (submitted, future) in futures.items():
+            try:
+                prediction, state, timings[pred_type] = future.result(
+                    timeout=max(0.0, submitted + self.timeout - time.perf_counter())
+                )
+            except FutureTimeoutError:
+                # 计算保留在 _inflight 中：结束前不会再次提交，结果未被采用时预测器状态不变
+                logger.error(f"{pred_type}预测计算超时（{self.timeout}秒）")
+                continue
+            except Exception as e:
+                logger.error(f"{pred_type}预测计算失败: {e}")
+                self._release(pred_type, future)
+                continue
+            self._release(pred_type, future)
+            if not prediction:
+                logger.error(f"预测失败: {pred_type}")
+                continue
+            # 结果被采用后才写回切换器和算法状态
+            predictor.commit_prediction(pred_type, state)
+            predictions[pred_type] = prediction
+            new_predictions.append(prediction)
+
+        # 新的预测在一个事务中写入预测表和预测缓存
+        db_manager.save_predictions(new_predictions)
+
+        self.last_timings = timings
+        if timings:
+            logger.info("预测计算耗时: " + ", ".join(f"{pred_type} {elapsed * 1000:.1f}ms" for pred_type, elapsed in timings.items()))
+        return predictions, timings
+
+    def get_stats(self):
+        """获取最近一次的计算耗时"""
+        return {
+            'workers': self.workers,
+            'timeout': self.timeout,
+            'last_timings': dict(self.last_timings)
+        }
+
+# 创建全局预测执行实例
+prediction_runner = PredictionRunner()
@@ -0,0 +1,180 @@
+import asyncio
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+
+from ..data.db_manager import db_manager
+from ..data.cache_manager import cache_manager
+from ..prediction import shadow_evaluator
+from ..prediction.algorithms.speculative_engine import speculative_engine
+from ..services.prediction_runner import prediction_runner
+from ..prediction.utils.draw_features import get_draw_features
+from ..utils.utils_helper import format_prediction_message
+from ..utils.markdown_builder import MarkdownV2Builder, MarkdownV2Text
+from ..config.config_manager import PREDICTION_CONFIG
+
+# 预测类型（计算顺序）
+PREDICTION_TYPES = ['single_double', 'big_small', 'kill_group', 'double_group']
+
+# 各预测类型使用的历史记录数：杀组预测需要更多的历史数据
+_RECORD_LIMITS = {
+    'single_double': 10,
+    'big_small': 10,
+    'kill_group': 100,
+    'double_group': 10
+}
+
+# 预先计算的预测：预测数据与渲染好的消息
+PreparedPrediction = namedtuple('PreparedPrediction', ['qihao', 'prediction', 'message'])
+
+class PredictionStore:
+    """按期号预先计算的下一期预测
+
+    新一期开奖入库后一次性计算全部四种预测（由 prediction_runner 并发计算并在一个事务中保存），
+    渲染消息；交互请求和特定群组直接读取内存中的结果。
+    计算只在后台线程中进行，同一时间只有一次；交互请求等待进行中的计算，不在事件循环中计算。
+    """
+
+    def __init__(self):
+        # 条目保存在统一缓存的 prediction 命名空间中，新一期开奖时失效
+        self._entries = cache_manager.namespace('prediction', max_entries=16, invalidate_on_draw=True)
+        self._next_qihao = None
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prediction-refresh')
+        self._refreshing = None
+        self._refreshing_lock = threading.Lock()
+
+    @property
+    def next_qihao(self):
+        return self._next_qihao
+
+    def refresh(self, records=None):
+        """为下一期计算全部预测类型
+
+        Args:
+            records: 按期号倒序的开奖记录，默认从数据库读取
+
+        Returns:
+            bool: 是否有可用的预测
+        """
+        with self._lock:
+            if records is None:
+                records = db_manager.get_recent_records(max(_RECORD_LIMITS.values()))
+            if not records or len(records) < 10:
+                logger.error(f"获取历史记录失败，当前记录数：{len(records) if records else 0}")
+                return False
+
+            next_qihao = str(int(records[0][1]) + 1)
+            if next_qihao == self._next_qihao and len(self._entries) == len(PREDICTION_TYPES):
+                return True
+
+            # 从完整窗口构建一次开奖特征，各预测类型截取自己需要的期数
+            get_draw_features(records)
+            
+            # 历史预测记录在保存新预测之前读取（新预测尚无结果也不会显示）
+            histories = {pred_type: db_manager.get_prediction_history(pred_type) for pred_type in PREDICTION_TYPES}
+            records_by_type = {pred_type: records[:_RECORD_LIMITS[pred_type]] for pred_type in PREDICTION_TYPES}
+            predictions, _ = prediction_runner.run(records_by_type, next_qihao)
+            
+            entries = {}
+            for pred_type in PREDICTION_TYPES:
+                if pred_type not in predictions:
+                    continue
+                try:
+                    entries[pred_type] = self._render(predictions[pred_type], histories[pred_type], next_qihao)
+                except Exception as e:
+                    logger.error(f"预先计算{pred_type}预测失败: {e}")
+
+            self._entries.clear()
+            for pred_type, entry in entries.items():
+                self._entries.set(pred_type, entry)
+            self._next_qihao = next_qihao
+            logger.info(f"已预先计算{next_qihao}期预测: {', '.join(entries) or '无'}")
+            
+            # 影子评估：用同一份特征计算其余算法的预测，开奖后更新它们的性能统计。
+            # 仍有超时的计算在运行时跳过，避免与其并发读写算法状态
+            if prediction_runner.busy():
+                logger.warning(f"仍有预测计算尚未结束，跳过{next_qihao}期的影子评估")
+            else:
+                shadow_evaluator.prepare(next_qihao, records_by_type, predictions)
+            
+            # 利用两期之间的空闲时间，为下一期全部可能的号码预计算单双、大小预测
+            speculative_engine.prepare(records)
+            return bool(entries)
+
+    def refresh_in_background(self):
+        """在后台线程中执行 refresh，已有进行中的刷新时直接返回它
+
+        Returns:
+            concurrent.futures.Future: 刷新的future，结果同 refresh
+        """
+        with self._refreshing_lock:
+            if self._refreshing is None or self._refreshing.done():
+                self._refreshing = self._refresher.submit(self.refresh)
+            return self._refreshing
+
+    async def wait(self, pred_type, latest_qihao=None, timeout=None):
+        """获取预测，尚未计算时等待后台刷新完成
+
+        Args:
+            pred_type: 预测类型
+            latest_qihao: 已知的最新开奖期号
+            timeout: 最长等待秒数，默认为 PREDICTION_CONFIG["WAIT_TIMEOUT"]
+
+        Returns:
+            PreparedPrediction: 预测结果，超时或无法生成时返回None（尚未准备好）
+        """
+        entry = self.get(pred_type, latest_qihao)
+        if entry is not None:
+            return entry
+
+        # asyncio.wait 超时不会取消刷新，其他等待者和后续请求仍可使用它的结果
+        future = asyncio.wrap_future(self.refresh_in_background())
+        done, _ = await asyncio.wait({future}, timeout=timeout or PREDICTION_CONFIG["WAIT_TIMEOUT"])
+        if not done:
+            logger.warning(f"等待预测计算超时: {pred_type}")
+            return None
+        if future.exception() is not None:
+            logger.error(f"预先计算预测失败: {future.exception()}")
+            return None
+        return self.get(pred_type, latest_qihao)
+
+    def _render(self, prediction, prediction_history, next_qihao):
+        """渲染单个预测类型的消息"""
+        message = format_prediction_message(prediction, prediction_history)
+
+        # 如果有算法切换信息，添加到消息前面（已转义的消息需通过构建器拼接）
+        switch_info = prediction.get('switch_info')
+        if switch_info:
+            switch_message = f"⚠️ 算法已从{switch_info['from_algo']}号切换为{switch_info['to_algo']}号\n"
+            switch_message += f"原因: {switch_info['reason']}\n\n"
+            if isinstance(message, MarkdownV2Text):
+                message = MarkdownV2Builder().text(switch_message).append(message).build()
+            else:
+                message = switch_message + message
+
+        return PreparedPrediction(next_qihao, prediction, message)
+
+    def get(self, pred_type, latest_qihao=None):
+        """获取预先计算的预测
+
+        Args:
+            pred_type: 预测类型
+            latest_qihao: 已知的最新开奖期号；与当前结果不一致时视为没有结果
+
+        Returns:
+            PreparedPrediction: 预测结果，尚未计算时返回None（只读取，不触发计算，见 wait）
+        """
+        if latest_qihao is not None and str(int(latest_qihao) + 1) != self._next_qihao:
+            return None
+        return self._entries.get(pred_type)
+
+    def invalidate(self):
+        """清空预先计算的结果"""
+        with self._lock:
+            self._entries.clear()
+            self._next_qihao = None
+
+# 创建全局预测存储实例
+prediction_store = PredictionStore()
@@ -0,0 +1,318 @@
+"""
+分片播报模块
+
+主进程（负责抓取开奖数据）把渲染好的播报内容写入本地SQLite队列，
+N个发送进程各自负责 chat_id 按哈希分区后的一部分活跃聊天，
+所有进程共享同一个发送速率预算，发送统计写回队列后由主进程汇总。
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from loguru import logger
+
+from ..config.config_manager import BOT_TOKEN, SHARD_CONFIG, SPECIAL_GROUP_ID
+from ..utils.rate_limiter import get_rate_limiter
+
+def shard_of(chat_id, num_shards):
+    """计算聊天所属的分片（Python取模对负数chat_id同样返回非负结果）"""
+    return chat_id % num_shards
+
+class BroadcastQueue:
+    """基于SQLite的进程间播报队列"""
+
+    def __init__(self, path=None):
+        self.path = path or SHARD_CONFIG["QUEUE_PATH"]
+        queue_dir = os.path.dirname(self.path)
+        if queue_dir:
+            os.makedirs(queue_dir, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        # WAL模式允许发送进程读取的同时主进程写入
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                qihao TEXT,
+                payload TEXT NOT NULL,
+                parse_mode TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS broadcast_stats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id INTEGER NOT NULL,
+                shard INTEGER NOT NULL,
+                sent INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                removed TEXT,
+                migrated TEXT,
+                duration REAL,
+                reported INTEGER DEFAULT 0,
+                UNIQUE(job_id, shard)
+            )
+        """)
+        # 旧版本创建的队列文件没有 migrated 列
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(broadcast_stats)")}
+        if 'migrated' not in columns:
+            self.conn.execute("ALTER TABLE broadcast_stats ADD COLUMN migrated TEXT")
+        self.conn.commit()
+
+    def publish(self, qihao, payload, parse_mode='MarkdownV2'):
+        """发布一条播报任务，返回任务ID
+
+        payload 为最终发送的文本（MarkdownV2模式下已转义），发送进程不再处理
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO broadcast_jobs (qihao, payload, parse_mode, created_at) VALUES (?, ?, ?, ?)",
+                (qihao, payload, parse_mode, time.time())
+            )
+            # 只保留最近的任务，避免队列文件无限增长
+            self.conn.execute("DELETE FROM broadcast_jobs WHERE id <= ?", (cursor.lastrowid - 100,))
+            self.conn.execute("DELETE FROM broadcast_stats WHERE job_id <= ?", (cursor.lastrowid - 100,))
+        return cursor.lastrowid
+
+    def latest_job_id(self):
+        """获取最新任务ID"""
+        row = self.conn.execute("SELECT MAX(id) AS max_id FROM broadcast_jobs").fetchone()
+        return row['max_id'] or 0
+
+    def fetch_jobs(self, after_id):
+        """获取指定ID之后的任务"""
+        return self.conn.execute(
+            "SELECT * FROM broadcast_jobs WHERE id > ? ORDER BY id",
+            (after_id,)
+        ).fetchall()
+
+    def record_stats(self, job_id, shard, sent, failed, removed, duration, migrated=None):
+        """写入分片发送统计（migrated 为 旧聊天ID -> 新聊天ID）"""
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO broadcast_stats
+                (job_id, shard, sent, failed, removed, migrated, duration, reported)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                """,
+                (job_id, shard, sent, failed, json.dumps(removed), json.dumps(list((migrated or {}).items())), duration)
+            )
+
+    def collect_stats(self):
+        """取出尚未汇总的统计并标记为已汇总"""
+        with self.conn:
+            rows = self.conn.execute(
+                "SELECT * FROM broadcast_stats WHERE reported = 0 ORDER BY job_id, shard"
+            ).fetchall()
+            if rows:
+                self.conn.executemany(
+                    "UPDATE broadcast_stats SET reported = 1 WHERE id = ?",
+                    [(row['id'],) for row in rows]
+                )
+        return rows
+
+async def _send_shard(bot, chat_ids, text, parse_mode, limiter, concurrency):
+    """在单个分片内并发发送，返回 (成功数, 失败数, 需移除的聊天, 已迁移的聊天)"""
+    from telegram.error import RetryAfter, ChatMigrated
+    from ..utils.delivery_tracker import classify_delivery_error, PERMANENT
+
+    semaphore = asyncio.Semaphore(concurrency)
+    removed = []
+    migrated = {}
+    counters = {'sent': 0, 'failed': 0}
+
+    async def send_one(chat_id):
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                counters['sent'] += 1
+            except RetryAfter as e:
+                # 限流时暂停后重试一次
+                await asyncio.sleep(e.retry_after)
+                try:
+                    await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                    counters['sent'] += 1
+                except Exception:
+                    counters['failed'] += 1
+            except ChatMigrated as e:
+                # 群组已升级为超级群组：记录新ID并向新ID重发一次
+                migrated[chat_id] = e.new_chat_id
+                try:
+                    await bot.send_message(chat_id=e.new_chat_id, text=text, parse_mode=parse_mode)
+                    counters['sent'] += 1
+                except Exception:
+                    counters['failed'] += 1
+            except Exception as e:
+                counters['failed'] += 1
+                if classify_delivery_error(e) == PERMANENT:
+                    removed.append(chat_id)
+
+    await asyncio.gather(*(send_one(chat_id) for chat_id in chat_ids))
+    return counters['sent'], counters['failed'], removed, migrated
+
+def _load_shard_chats(shard, num_shards):
+    """读取本分片负责的活跃聊天（看板聊天和特定群组由主进程处理）"""
+    from ..data.db_manager import db_manager
+
+    records = db_manager.execute_query(
+        "SELECT chat_id FROM active_chats WHERE chat_id NOT IN (SELECT chat_id FROM live_boards)"
+    )
+    return [
+        record[0] for record in records
+        if record[0] != SPECIAL_GROUP_ID and shard_of(record[0], num_shards) == shard
+    ]
+
+async def _shard_worker_loop(shard, num_shards, limiter, queue_path, after_job_id=None):
+    from telegram import Bot
+    from ..data.db_manager import db_manager
+    from ..utils.http_request import build_request
+
+    queue = BroadcastQueue(queue_path)
+    # 只处理启动之后（重新启动时为指定任务之后）发布的任务
+    last_job_id = queue.latest_job_id() if after_job_id is None else after_job_id
+    bot = Bot(BOT_TOKEN, request=build_request(SHARD_CONFIG["CONCURRENCY"]))
+    await bot.initialize()
+    logger.info(f"分片发送进程 {shard}/{num_shards} 已启动")
+
+    while True:
+        try:
+            for job in queue.fetch_jobs(last_job_id):
+                last_job_id = job['id']
+                started = time.time()
+                chat_ids = _load_shard_chats(shard, num_shards)
+                sent, failed, removed, migrated = await _send_shard(
+                    bot, chat_ids, job['payload'], job['parse_mode'], limiter, SHARD_CONFIG["CONCURRENCY"]
+                )
+                if removed:
+                    db_manager.remove_active_chats(removed)
+                if migrated:
+                    db_manager.migrate_chats(migrated)
+                queue.record_stats(job['id'], shard, sent, failed, removed, time.time() - started, migrated)
+        except Exception as e:
+            logger.error(f"分片发送进程 {shard} 处理任务失败: {e}")
+        await asyncio.sleep(SHARD_CONFIG["POLL_INTERVAL"])
+
+def run_shard_worker(shard, num_shards, limiter, queue_path, after_job_id=None):
+    """发送进程入口"""
+    try:
+        asyncio.run(_shard_worker_loop(shard, num_shards, limiter, queue_path, after_job_id))
+    except KeyboardInterrupt:
+        pass
+
+class ShardedBroadcaster:
+    """分片播报协调器（运行在主进程）"""
+
+    def __init__(self, num_shards=None, queue_path=None):
+        self.num_shards = num_shards if num_shards is not None else SHARD_CONFIG["WORKERS"]
+        self.queue_path = queue_path or SHARD_CONFIG["QUEUE_PATH"]
+        self.queue = None
+        self.processes = []
+        self._mp_context = multiprocessing.get_context('spawn')
+
+    @property
+    def enabled(self):
+        return self.num_shards > 0 and bool(self.processes)
+
+    def start(self):
+        """启动发送进程"""
+        if self.num_shards <= 0 or self.processes:
+            return False
+        self.queue = BroadcastQueue(self.queue_path)
+        for shard in range(self.num_shards):
+            self.processes.append(self._spawn(shard))
+        logger.info(f"已启动 {self.num_shards} 个分片发送进程，共享速率上限 {SHARD_CONFIG['RATE_LIMIT']}/秒")
+        return True
+
+    def _spawn(self, shard, after_job_id=None):
+        """启动单个分片的发送进程"""
+        process = self._mp_context.Process(
+            target=run_shard_worker,
+            args=(shard, self.num_shards, get_rate_limiter(), self.queue_path, after_job_id),
+            name=f"broadcast-shard-{shard}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _restart_dead(self, after_job_id):
+        """重新启动已退出的发送进程
+
+        Args:
+            after_job_id: 新进程从该任务之后开始处理
+
+        Returns:
+            list: 已退出的分片号
+        """
+        dead = [shard for shard, process in enumerate(self.processes) if not process.is_alive()]
+        for shard in dead:
+            logger.error(f"分片发送进程 {shard} 已退出（退出码 {self.processes[shard].exitcode}），重新启动")
+            self.processes[shard] = self._spawn(shard, after_job_id)
+        return dead
+
+    def shard_of(self, chat_id):
+        """聊天所属的分片"""
+        return shard_of(chat_id, self.num_shards)
+
+    def publish(self, qihao, payload, parse_mode='MarkdownV2'):
+        """发布渲染并转义好的播报内容
+
+        发布时已退出的发送进程会重新启动，但只处理之后的任务，这一期由主进程发送这些分片的聊天。
+
+        Returns:
+            list: 需要由主进程发送的分片号
+        """
+        job_id = self.queue.publish(qihao, payload, parse_mode)
+        logger.info(f"已发布分片播报任务 {job_id}: 期号 {qihao}")
+        return self._restart_dead(job_id)
+
+    def collect_stats(self):
+        """汇总各分片的发送统计，并同步移除无效聊天、迁移已升级的群组
+
+        同时检查发送进程，已退出的进程在这里重新启动。
+
+        Returns:
+            dict: job_id -> 汇总统计
+        """
+        from ..data.chat_registry import chat_registry
+
+        summary = {}
+        if not self.queue:
+            return summary
+        self._restart_dead(self.queue.latest_job_id())
+        for row in self.queue.collect_stats():
+            job = summary.setdefault(row['job_id'], {'shards': 0, 'sent': 0, 'failed': 0, 'removed': [], 'migrated': {}, 'duration': 0.0})
+            job['shards'] += 1
+            job['sent'] += row['sent']
+            job['failed'] += row['failed']
+            job['removed'].extend(json.loads(row['removed'] or '[]'))
+            job['migrated'].update(json.loads(row['migrated'] or '[]'))
+            job['duration'] = max(job['duration'], row['duration'] or 0.0)
+        for job_id, job in summary.items():
+            if job['removed']:
+                # 发送进程已删除数据库记录，这里同步内存注册表
+                chat_registry.remove_many(job['removed'])
+            if job['migrated']:
+                chat_registry.migrate_many(job['migrated'])
+            logger.info(
+                f"分片播报任务 {job_id}: {job['shards']}个分片, 成功 {job['sent']}, "
+                f"失败 {job['failed']}, 移除 {len(job['removed'])}, 迁移 {len(job['migrated'])}, "
+                f"耗时 {job['duration']:.2f}秒"
+            )
+        return summary
+
+    def stop(self):
+        """停止所有发送进程"""
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+# 创建全局分片播报协调器实例
+sharded_broadcaster = ShardedBroadcaster()
+
+async def collect_shard_stats(context=None):
+    """定时任务：汇总分片发送统计"""
+    sharded_broadcaster.collect_stats()
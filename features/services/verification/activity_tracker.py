@@ -0,0 +1,90 @@
+"""
+群组活跃信息合并写入
+
+目标群组的每条消息都会更新发言用户的 last_seen_at。逐条写库会在活跃群组中
+产生大量SQLite提交，这里先在内存中按用户合并，定时以一次批量upsert写入；
+只有用户的成员状态真正发生变化（如首次发言、离开后重新发言）时才立即写库。
+"""
+from datetime import datetime
+from loguru import logger
+
+from ...config.config_manager import TARGET_GROUP_ID
+from ...data.db_manager import db_manager
+from .membership_state import membership_state
+
+class GroupActivityTracker:
+    """按用户合并的群组活跃信息缓冲区"""
+
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self._pending = {}  # user_id -> (username, first_name, last_name, last_seen_at)
+        self._flushed = 0
+        self._immediate = 0
+
+    def record(self, user):
+        """记录一次发言
+
+        Args:
+            user: 发言的 telegram User
+
+        Returns:
+            bool: 用户的成员状态是否发生变化（已立即写库）
+        """
+        last_seen_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if not membership_state.mark_member(user.id):
+            # 状态未变化：只更新缓冲区，等待批量写入
+            self._pending[user.id] = (user.username, user.first_name, user.last_name, last_seen_at)
+            return False
+
+        # 状态变化：立即写入成员信息和验证状态
+        self._pending.pop(user.id, None)
+        db_manager.add_group_member(
+            user_id=user.id,
+            group_id=self.group_id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            status="active"  # 由于用户发送了消息，所以肯定是活跃的
+        )
+        if not db_manager.is_user_verified(user.id):
+            db_manager.set_user_verified(user.id, True)
+            logger.info(f"用户 {user.id} 在目标群组发送消息，自动更新为已验证状态")
+        self._immediate += 1
+        return True
+
+    def discard(self, user_id):
+        """丢弃用户尚未写入的活跃信息（用户离开群组时调用，避免之后的批量写入把离开记录改回活跃）"""
+        self._pending.pop(user_id, None)
+
+    def flush(self):
+        """批量写入缓冲区中的活跃信息
+
+        Returns:
+            int: 写入的成员数量
+        """
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        rows = [(user_id, *info) for user_id, info in pending.items()]
+        written = db_manager.upsert_group_activity(rows, self.group_id)
+        if written < len(rows):
+            # 写入失败时放回缓冲区，较新的记录优先
+            for user_id, info in pending.items():
+                self._pending.setdefault(user_id, info)
+        self._flushed += written
+        return written
+
+    def get_stats(self):
+        """获取写入统计"""
+        return {
+            'pending': len(self._pending),
+            'flushed': self._flushed,
+            'immediate': self._immediate
+        }
+
+# 创建全局群组活跃信息缓冲实例
+group_activity_tracker = GroupActivityTracker(TARGET_GROUP_ID)
+
+async def flush_group_activity(context=None):
+    """定时任务：批量写入群组活跃信息"""
+    group_activity_tracker.flush()
@@ -0,0 +1,131 @@
+"""
+群组成员身份校准
+
+按user_id键集游标分批遍历整个 user_verification 表，游标保存在数据库中，
+重启后从上次的位置继续。每次处理的用户数按用户总数和遍历周期计算，
+保证无论用户多少都能在配置的周期内完成一轮完整遍历。
+查询在有界并发下进行，并与群发共用同一个限速器；状态变化在单个事务中批量写入。
+"""
+import asyncio
+import math
+import time
+from loguru import logger
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from ...config.config_manager import TARGET_GROUP_ID, ADMIN_ID, VERIFICATION_CONFIG
+from ...data.db_manager import db_manager
+from ...utils.rate_limiter import get_rate_limiter
+from .membership_state import membership_state, MEMBER_STATUSES
+
+# 游标在 job_cursors 表中的名称
+CURSOR_NAME = 'membership_reconcile'
+
+class MembershipReconciler:
+    """基于持久化键集游标的成员身份校准任务"""
+
+    def __init__(self):
+        self._running = False
+        self.last_run = {}
+
+    def batch_size(self):
+        """本次需要处理的用户数：按遍历周期均摊到每次任务"""
+        total = db_manager.count_users()
+        runs_per_sweep = max(1, VERIFICATION_CONFIG["SWEEP_PERIOD"] // max(1, VERIFICATION_CONFIG["CHECK_INTERVAL"]))
+        return max(VERIFICATION_CONFIG["RECONCILE_MIN_BATCH"], math.ceil(total / runs_per_sweep))
+
+    async def _check(self, bot, user_id):
+        """查询用户是否仍在目标群组中
+
+        Returns:
+            bool: 是否为成员；查询失败时返回None（本轮不更新该用户）
+        """
+        await get_rate_limiter().acquire()
+        try:
+            chat_member = await bot.get_chat_member(TARGET_GROUP_ID, user_id)
+            return chat_member.status in MEMBER_STATUSES
+        except RetryAfter as e:
+            logger.warning(f"校准查询触发限流，等待 {e.retry_after} 秒")
+            await asyncio.sleep(e.retry_after)
+            return None
+        except BadRequest as e:
+            # 用户不存在或已停用，视为已离开群组
+            if "user not found" in str(e).lower() or "user is deactivated" in str(e).lower():
+                return False
+            logger.error(f"校准查询用户 {user_id} 失败: {e}")
+            return None
+        except TelegramError as e:
+            logger.error(f"校准查询用户 {user_id} 失败: {e}")
+            return None
+
+    async def run(self, bot):
+        """处理游标之后的一批用户
+
+        Args:
+            bot: Bot实例
+
+        Returns:
+            dict: user_id -> 是否为成员（本次成功查询的用户）
+        """
+        if self._running:
+            logger.warning("上一次成员校准尚未完成，跳过本次")
+            return {}
+
+        self._running = True
+        try:
+            started = time.time()
+            cursor, sweep_started_at = db_manager.get_job_cursor(CURSOR_NAME)
+            if cursor is None:
+                sweep_started_at = started
+
+            limit = self.batch_size()
+            users = db_manager.get_users_after(cursor, limit)
+
+            # 成员状态仍然有效（由群组事件确认过）的用户无需查询
+            pending = [
+                (user_id, is_verified) for user_id, is_verified in users
+                if user_id != ADMIN_ID and not membership_state.is_fresh(user_id)
+            ]
+
+            semaphore = asyncio.Semaphore(VERIFICATION_CONFIG["RECONCILE_CONCURRENCY"])
+
+            async def check_one(user_id):
+                async with semaphore:
+                    return await self._check(bot, user_id)
+
+            outcomes = await asyncio.gather(*(check_one(user_id) for user_id, _ in pending))
+
+            results = {}
+            changes = []
+            for (user_id, is_verified), is_member in zip(pending, outcomes):
+                if is_member is None:
+                    continue
+                results[user_id] = is_member
+                if is_member != is_verified:
+                    changes.append((user_id, is_member))
+            db_manager.apply_membership_changes(changes, TARGET_GROUP_ID)
+
+            # 到达表尾时本轮遍历结束，下次从头开始
+            if len(users) < limit:
+                logger.info(f"成员校准完成一轮遍历，耗时 {int(time.time() - sweep_started_at)} 秒")
+                db_manager.set_job_cursor(CURSOR_NAME, None, None)
+            else:
+                db_manager.set_job_cursor(CURSOR_NAME, users[-1][0], sweep_started_at)
+
+            self.last_run = {
+                'scanned': len(users),
+                'checked': len(pending),
+                'failed': len(pending) - len(results),
+                'changed': len(changes),
+                'duration': time.time() - started
+            }
+            logger.info(
+                f"成员校准: 扫描 {len(users)} 个用户, 查询 {len(pending)} 个, "
+                f"失败 {len(pending) - len(results)} 个, 状态变化 {len(changes)} 个, "
+                f"耗时 {self.last_run['duration']:.2f}秒"
+            )
+            return results
+        finally:
+            self._running = False
+
+# 创建全局成员校准实例
+membership_reconciler = MembershipReconciler()
@@ -0,0 +1,187 @@
+"""
+群组成员状态机
+
+目标群组的 chat_member 更新和群组消息本身就是成员身份信号：
+加入/离开事件和发言直接驱动内存中的成员状态，访问检查只需一次集合查找。
+只有从未见过的用户或长时间未确认的状态才需要调用Bot API重新确认（惰性校准）。
+"""
+import threading
+import time
+from datetime import datetime
+from loguru import logger
+
+from ...config.config_manager import VERIFICATION_CONFIG
+from ...data.db_manager import db_manager
+from ...data.state_snapshot import state_snapshot
+
+# 成员状态
+MEMBER = 'member'
+NON_MEMBER = 'non_member'
+UNKNOWN = 'unknown'
+
+# 视为群组成员的 ChatMember 状态（restricted 也是成员，只是权限受限）
+MEMBER_STATUSES = ('member', 'administrator', 'creator', 'restricted')
+
+class MembershipState:
+    """目标群组的内存成员状态机
+
+    每个用户处于 MEMBER / NON_MEMBER / UNKNOWN 之一，并记录最后一次确认时间。
+    事件（加入、离开、发言、API查询结果）触发状态转换；
+    状态超过各自的有效期未被确认时视为 UNKNOWN，由调用方通过API重新确认。
+    """
+
+    def __init__(self):
+        self._members = set()
+        self._non_members = set()
+        self._confirmed_at = {}  # user_id -> 最后一次确认状态的时间戳
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _ensure_loaded(self):
+        """首次使用时从数据库加载已验证用户（以验证时间作为确认时间）"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            count = 0
+            for user in db_manager.get_all_verified_users():
+                user_id = user["user_id"]
+                if user_id in self._confirmed_at:
+                    continue
+                confirmed_at = 0
+                if user.get("verification_time"):
+                    try:
+                        confirmed_at = datetime.strptime(user["verification_time"], "%Y-%m-%d %H:%M:%S").timestamp()
+                    except (TypeError, ValueError):
+                        pass
+                self._members.add(user_id)
+                self._confirmed_at[user_id] = confirmed_at
+                count += 1
+            self._loaded = True
+            logger.info(f"已从数据库加载 {count} 个群组成员状态")
+
+    def status(self, user_id):
+        """获取用户的成员状态（不考虑是否过期）"""
+        if user_id in self._members:
+            return MEMBER
+        if user_id in self._non_members:
+            return NON_MEMBER
+        return UNKNOWN
+
+    def _current(self, user_id):
+        """状态有效时返回是否为成员，未知或已过期时返回None"""
+        if user_id in self._members:
+            stale_after = VERIFICATION_CONFIG["MEMBER_STALE_AFTER"]
+            result = True
+        elif user_id in self._non_members:
+            stale_after = VERIFICATION_CONFIG["NON_MEMBER_STALE_AFTER"]
+            result = False
+        else:
+            return None
+        if time.time() - self._confirmed_at.get(user_id, 0) > stale_after:
+            return None
+        return result
+
+    def lookup(self, user_id):
+        """O(1)查询用户是否在目标群组中
+
+        Returns:
+            bool: 状态有效时返回是否为成员；未知或已过期时返回None，需要通过API确认
+        """
+        self._ensure_loaded()
+        result = self._current(user_id)
+        if result is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return result
+
+    def is_fresh(self, user_id):
+        """用户状态是否有效（不计入命中统计）"""
+        self._ensure_loaded()
+        return self._current(user_id) is not None
+
+    def mark_member(self, user_id):
+        """事件：用户加入群组、在群组中发言或API确认为成员
+
+        Returns:
+            bool: 成员状态是否发生变化
+        """
+        # 先加载已有状态，否则重启后每个用户的第一次事件都会被当作状态变化
+        self._ensure_loaded()
+        changed = user_id not in self._members
+        self._non_members.discard(user_id)
+        self._members.add(user_id)
+        self._confirmed_at[user_id] = time.time()
+        if changed:
+            logger.debug(f"成员状态: 用户 {user_id} -> {MEMBER}")
+        return changed
+
+    def mark_non_member(self, user_id):
+        """事件：用户离开、被移出群组或API确认为非成员
+
+        Returns:
+            bool: 成员状态是否发生变化
+        """
+        self._ensure_loaded()
+        changed = user_id not in self._non_members
+        self._members.discard(user_id)
+        self._non_members.add(user_id)
+        self._confirmed_at[user_id] = time.time()
+        if changed:
+            logger.debug(f"成员状态: 用户 {user_id} -> {NON_MEMBER}")
+        return changed
+
+    def observe(self, user_id, is_member):
+        """记录一次确认结果"""
+        if is_member:
+            return self.mark_member(user_id)
+        return self.mark_non_member(user_id)
+
+    def forget(self, user_id):
+        """将用户重置为未知状态，下次访问时重新确认"""
+        self._members.discard(user_id)
+        self._non_members.discard(user_id)
+        self._confirmed_at.pop(user_id, None)
+
+    def clear(self):
+        """清空全部状态，下次使用时重新从数据库加载"""
+        with self._lock:
+            self._members.clear()
+            self._non_members.clear()
+            self._confirmed_at.clear()
+            self._loaded = False
+
+    def export_state(self):
+        """导出状态快照"""
+        return {
+            'members': {user_id: self._confirmed_at.get(user_id, 0) for user_id in self._members},
+            'non_members': {user_id: self._confirmed_at.get(user_id, 0) for user_id in self._non_members}
+        }
+
+    def restore_state(self, state):
+        """从快照恢复状态"""
+        with self._lock:
+            self._members = set(state['members'])
+            self._non_members = set(state['non_members'])
+            self._confirmed_at = {**state['members'], **state['non_members']}
+            self._loaded = True
+
+    def get_stats(self):
+        """获取状态统计"""
+        lookups = self._hits + self._misses
+        return {
+            'members': len(self._members),
+            'non_members': len(self._non_members),
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': self._hits / lookups if lookups else 0.0
+        }
+
+# 创建全局成员状态实例
+membership_state = MembershipState()
+
+state_snapshot.register('membership', membership_state.export_state, membership_state.restore_state)
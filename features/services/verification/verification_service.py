@@ -4,15 +4,48 @@ from datetime import datetime, timedelta
 from loguru import logger
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, ChatMemberUpdated
 from telegram.ext import ContextTypes
-from telegram.error import TelegramError, BadRequest
+from telegram.error import TelegramError
 from telegram.constants import ChatMemberStatus
 
-from ...config.config_manager import VERIFICATION_REQUIRED, TARGET_GROUP_ID, ADMIN_ID
+from ...config.config_manager import VERIFICATION_REQUIRED, TARGET_GROUP_ID, ADMIN_ID, VERIFICATION_CONFIG
 from ...data.db_manager import db_manager
+from ...data.cache_manager import cache_manager
+from ...data.state_snapshot import state_snapshot
 from ...utils.message_utils import send_message_with_retry, edit_message_with_retry
+from .membership_state import membership_state
+from .membership_reconciler import membership_reconciler
+from .activity_tracker import group_activity_tracker
 
-# 用于跟踪用户验证状态的缓存
-verification_cache = {}
+# 用于跟踪用户验证状态的缓存：有界LRU，验证通过和失败的结果使用不同的过期时间
+verification_cache = cache_manager.namespace('verification', max_entries=VERIFICATION_CONFIG["CACHE_SIZE"])
+
+# 正在进行的群组成员查询，同一用户的并发请求共用一次API调用
+_pending_lookups = {}
+
+def cache_verification_result(user_id, status, error=None):
+    """写入验证缓存，按结果选择过期时间
+
+    确定的结果（非API错误）同时驱动成员状态机
+    """
+    entry = {"status": status, "time": datetime.now()}
+    if error:
+        entry["error"] = error
+    else:
+        membership_state.observe(user_id, status)
+    ttl = VERIFICATION_CONFIG["POSITIVE_TTL"] if status else VERIFICATION_CONFIG["NEGATIVE_TTL"]
+    verification_cache.set(user_id, entry, ttl=ttl)
+    return entry
+
+def _restore_verification_cache(state):
+    """从快照恢复验证缓存（按原写入时间计算剩余有效期）"""
+    now = datetime.now()
+    for user_id, entry in state:
+        ttl = VERIFICATION_CONFIG["POSITIVE_TTL"] if entry["status"] else VERIFICATION_CONFIG["NEGATIVE_TTL"]
+        remaining = ttl - (now - entry["time"]).total_seconds()
+        if remaining > 0:
+            verification_cache.set(user_id, entry, ttl=remaining)
+
+state_snapshot.register('verification', verification_cache.items, _restore_verification_cache, version=2)
 
 # 用于跟踪用户验证失败次数，防止暴力尝试
 verification_fail_counter = {}
@@ -42,6 +75,11 @@ async def start_verification(update: Update, context: ContextTypes.DEFAULT_TYPE)
         last_name=user.last_name
     )
     
+    # 成员状态机确认仍在群组中时无需再查询API
+    if membership_state.lookup(user_id):
+        logger.info(f"用户 {user_id} 仍在群组中，无需重新验证")
+        return True
+    
     # 检查用户是否已验证
     if db_manager.is_user_verified(user_id):
         logger.info(f"用户 {user_id} 在数据库中已标记为验证通过，检查是否仍在群组")
@@ -150,8 +188,7 @@ async def handle_verification_callback(update: Update, context: ContextTypes.DEF
             logger.error(f"更新验证中消息失败: {e}")
         
         # 每次点击验证按钮时，强制清除该用户的缓存，确保获取最新状态
-        if user_id in verification_cache:
-            verification_cache.pop(user_id, None)
+        if verification_cache.delete(user_id):
             logger.info(f"用户 {user_id} 点击验证按钮，强制清除验证缓存")
         
         # 尝试验证，并根据结果处理，使用force_check=True参数强制重新验证
@@ -190,8 +227,9 @@ async def handle_verification_callback(update: Update, context: ContextTypes.DEF
             
             # 获取缓存中的错误信息（如果有）
             error_info = ""
-            if user_id in verification_cache and "error" in verification_cache[user_id]:
-                error = verification_cache[user_id]["error"]
+            cached_entry = verification_cache.get(user_id)
+            if cached_entry and "error" in cached_entry:
+                error = cached_entry["error"]
                 if "Chat not found" in error:
                     error_info = "（机器人可能尚未加入目标群组或群组ID配置错误）"
                 elif "kicked" in error.lower() or "banned" in error.lower():
@@ -246,15 +284,29 @@ async def verify_group_membership(context, user_id, force_check=False):
             logger.warning(f"管理员 {user_id} 验证，自动通过")
             return True
             
-        # 尝试从缓存中获取验证结果（如果不是强制检查）
-        if not force_check and user_id in verification_cache:
-            cache_time = verification_cache[user_id]["time"]
-            # 如果缓存时间在2分钟内，且缓存状态为True，则直接返回缓存结果
-            # 只有当缓存显示用户已验证时才使用缓存，否则始终重新检查
-            if (datetime.now() - cache_time).total_seconds() < 120 and verification_cache[user_id]["status"] == True:
-                logger.debug(f"从缓存获取用户 {user_id} 的验证状态: {verification_cache[user_id]['status']}")
-                return verification_cache[user_id]["status"]
+        if not force_check:
+            # 尝试从缓存中获取验证结果（通过和失败的结果分别按各自的TTL过期）
+            cached_entry = verification_cache.get(user_id)
+            if cached_entry is not None:
+                logger.debug(f"从缓存获取用户 {user_id} 的验证状态: {cached_entry['status']}")
+                return cached_entry["status"]
+        
+        # 同一用户的并发查询只调用一次API
+        pending = _pending_lookups.get(user_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
         
+        task = asyncio.ensure_future(_fetch_group_membership(context, user_id))
+        _pending_lookups[user_id] = task
+        task.add_done_callback(lambda _: _pending_lookups.pop(user_id, None))
+        return await asyncio.shield(task)
+    except Exception as e:
+        logger.error(f"验证用户群组成员身份时出错: {e}")
+        return False
+
+async def _fetch_group_membership(context, user_id):
+    """通过Bot API查询用户是否在目标群组中，并写入验证缓存"""
+    try:
         # 获取群组成员
         try:
             # 查询用户是否是群组成员
@@ -293,10 +345,7 @@ async def verify_group_membership(context, user_id, force_check=False):
                     logger.error(f"记录群组成员信息失败: {e}")
             
             # 更新缓存
-            verification_cache[user_id] = {
-                "status": is_member,
-                "time": datetime.now()
-            }
+            cache_verification_result(user_id, is_member)
             
             logger.info(f"验证用户 {user_id} 是否在目标群组: {is_member}, 状态: {chat_member.status}")
             return is_member
@@ -316,11 +365,7 @@ async def verify_group_membership(context, user_id, force_check=False):
                 logger.error(f"重试验证也失败: {retry_error}")
                 
                 # 如果是Chat not found错误，标记缓存为无效
-                verification_cache[user_id] = {
-                    "status": False,
-                    "time": datetime.now(),
-                    "error": str(e)
-                }
+                cache_verification_result(user_id, False, error=str(e))
                 
                 # 验证失败，返回False
                 return False
@@ -339,9 +384,18 @@ async def verify_user_access(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if user_id == ADMIN_ID:
         return True
     
-    # 每次操作都重新检查用户是否在群组中，不依赖数据库状态
+    # 成员状态由群组的加入、离开和发言事件驱动，状态有效时直接判断，不调用API
+    is_member = membership_state.lookup(user_id)
+    if is_member:
+        return True
+    if is_member is False:
+        logger.debug(f"成员状态显示用户 {user_id} 不在目标群组")
+        await start_verification(update, context)
+        return False
+    
+    # 未知或已过期的用户才需要重新确认
     try:
-        # 首先尝试从TG API验证
+        # 通过TG API验证
         is_in_group = await verify_group_membership(context, user_id)
         
         if is_in_group:
@@ -414,10 +468,7 @@ async def retry_verification(context, user_id, max_retries=3):
             is_member = chat_member.status in valid_statuses
             
             # 更新缓存
-            verification_cache[user_id] = {
-                "status": is_member,
-                "time": datetime.now()
-            }
+            cache_verification_result(user_id, is_member)
             
             logger.info(f"重试验证用户 {user_id}，尝试 #{attempt+1}，结果: {is_member}")
             return is_member
@@ -428,12 +479,7 @@ async def retry_verification(context, user_id, max_retries=3):
                 await asyncio.sleep(1)
             else:
                 # 最后一次尝试失败，更新缓存为失败状态
-                verification_cache[user_id] = {
-                    "status": False,
-                    "time": datetime.now(),
-                    "error": str(e),
-                    "retries": attempt + 1
-                }
+                cache_verification_result(user_id, False, error=str(e))
                 return False
     
     return False
@@ -445,18 +491,9 @@ async def periodic_verification_check(context: ContextTypes.DEFAULT_TYPE):
     try:
         # 1. 清理过期的验证缓存
         now = datetime.now()
-        expired_users = []
-        for user_id, cache_data in verification_cache.items():
-            cache_time = cache_data["time"]
-            # 缓存超过2小时则过期
-            if (now - cache_time).total_seconds() > 7200:  # 2小时
-                expired_users.append(user_id)
-        
-        # 从缓存中删除过期用户
-        for user_id in expired_users:
-            verification_cache.pop(user_id, None)
+        expired_count = verification_cache.cleanup()
         
-        logger.info(f"清理了 {len(expired_users)} 个过期的验证缓存")
+        logger.info(f"清理了 {expired_count} 个过期的验证缓存")
         
         # 2. 清理验证失败计数器
         expired_counters = []
@@ -471,36 +508,10 @@ async def periodic_verification_check(context: ContextTypes.DEFAULT_TYPE):
         
         logger.info(f"清理了 {len(expired_counters)} 个过期的验证失败计数器")
         
-        # 3. 检查已验证用户是否仍在群组中
-        verified_users = db_manager.get_all_verified_users()
-        check_count = 0
-        
-        for user in verified_users[:50]:  # 每次最多检查50个用户，避免超时
-            user_id = user["user_id"]
-            try:
-                # 检查用户是否已离开群组
-                user_left_group = await check_user_left_group(context, user_id, TARGET_GROUP_ID)
-                check_count += 1
-                
-                # 如果用户已离开群组，更新验证状态
-                if user_left_group:
-                    db_manager.set_user_verified(user_id, False)
-                    logger.info(f"周期检查：用户 {user_id} 已离开群组，取消验证状态")
-                    
-                    # 如果有缓存，也更新缓存
-                    if user_id in verification_cache:
-                        verification_cache[user_id]["status"] = False
-                
-                # 为了避免请求过于频繁，每检查10个用户暂停1秒
-                if check_count % 10 == 0:
-                    await asyncio.sleep(1)
-                    
-            except Exception as e:
-                logger.error(f"周期检查用户 {user_id} 状态时出错: {e}")
-                # 继续检查下一个用户
-                continue
-        
-        logger.info(f"周期检查完成，共检查了 {check_count} 个已验证用户")
+        # 3. 按持久化游标校准下一批用户的群组成员身份（状态变化已批量写入数据库）
+        results = await membership_reconciler.run(context.bot)
+        for user_id, is_member in results.items():
+            cache_verification_result(user_id, is_member)
         
     except Exception as e:
         logger.error(f"执行周期性验证检查时出错: {e}")
@@ -528,28 +539,10 @@ async def process_group_message(update: Update, context: ContextTypes.DEFAULT_TY
             logger.debug(f"跳过非目标群组的消息: chat_id={chat.id}, target={TARGET_GROUP_ID}")
             return
             
-        logger.info(f"处理来自目标群组的消息: user_id={user.id}, username={user.username}")
-        
-        # 更新用户的群组成员状态
-        db_manager.add_group_member(
-            user_id=user.id,
-            group_id=chat.id,
-            username=user.username,
-            first_name=user.first_name,
-            last_name=user.last_name,
-            status="active"  # 由于用户发送了消息，所以肯定是活跃的
-        )
-        
-        # 同时更新用户的验证状态
-        if not db_manager.is_user_verified(user.id):
-            db_manager.set_user_verified(user.id, True)
-            logger.info(f"用户 {user.id} 在目标群组发送消息，自动更新为已验证状态")
-        
-        # 更新缓存
-        verification_cache[user.id] = {
-            "status": True,
-            "time": datetime.now()
-        }
+        # 活跃信息合并后定时批量写入，只有成员状态变化时才立即写库
+        if group_activity_tracker.record(user):
+            cache_verification_result(user.id, True)
+            logger.info(f"用户 {user.id} ({user.username or '无用户名'}) 在目标群组发言，成员状态已更新")
         
         logger.debug(f"更新用户 {user.id} 在群组 {chat.id} 的活跃状态")
     except Exception as e:
@@ -557,34 +550,6 @@ async def process_group_message(update: Update, context: ContextTypes.DEFAULT_TY
         # 记录更详细的错误信息以便调试
         logger.error(f"错误详情: {str(e)}", exc_info=True)
 
-# 检查用户是否已被踢出或离开群组
-async def check_user_left_group(context, user_id, group_id):
-    """检查用户是否已被踢出或离开群组"""
-    try:
-        # 确保context.bot不为None
-        if not context or not context.bot:
-            logger.error(f"检查用户 {user_id} 时context或bot为None")
-            return False
-
-        chat_member = await context.bot.get_chat_member(group_id, user_id)
-        if chat_member.status in [ChatMemberStatus.LEFT, ChatMemberStatus.BANNED]:
-            # 用户已离开群组，更新数据库
-            db_manager.mark_member_left_group(user_id, group_id)
-            logger.info(f"检测到用户 {user_id} 已离开群组 {group_id}")
-            return True
-        return False
-    except BadRequest as e:
-        # 用户不存在或被Telegram系统限制
-        if "user not found" in str(e).lower() or "user is deactivated" in str(e).lower():
-            db_manager.mark_member_left_group(user_id, group_id)
-            logger.info(f"用户 {user_id} 不存在或已停用，标记为已离开群组")
-            return True
-        logger.error(f"检查用户是否离开群组时出错: {e}")
-        return False
-    except Exception as e:
-        logger.error(f"检查用户是否离开群组时出错: {e}")
-        return False
-
 # 处理群组成员状态变化
 async def process_chat_member_updated(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理群组成员状态变化事件"""
@@ -633,10 +598,7 @@ async def process_chat_member_updated(update: Update, context: ContextTypes.DEFA
             db_manager.set_user_verified(user_id, True)
             
             # 更新缓存
-            verification_cache[user_id] = {
-                "status": True,
-                "time": datetime.now()
-            }
+            cache_verification_result(user_id, True)
             
             logger.info(f"用户 {user_id} 加入群组，自动更新为已验证状态")
             
@@ -644,18 +606,15 @@ async def process_chat_member_updated(update: Update, context: ContextTypes.DEFA
             # 用户离开或被踢
             logger.info(f"用户 {user_id} 离开群组: {old_status} -> {new_status}")
             
-            # 标记用户离开
+            # 标记用户离开（先丢弃缓冲中的活跃信息，否则批量写入会重新标记为活跃）
+            group_activity_tracker.discard(user_id)
             db_manager.mark_member_left_group(user_id, TARGET_GROUP_ID)
             
             # 更新验证状态
             db_manager.set_user_verified(user_id, False)
             
             # 更新缓存
-            if user_id in verification_cache:
-                verification_cache[user_id] = {
-                    "status": False,
-                    "time": datetime.now()
-                }
+            cache_verification_result(user_id, False)
             
             logger.info(f"用户 {user_id} 离开群组，更新为未验证状态")
     
@@ -668,4 +627,5 @@ def clear_verification_cache():
     """清空验证缓存，通常在重启机器人时调用"""
     verification_cache.clear()
     verification_fail_counter.clear()
+    membership_state.clear()
     logger.info("已清空验证缓存和失败计数器") 
\ No newline at end of file
@@ -6,6 +6,7 @@ from loguru import logger
 
 from ..config.config_manager import ADMIN_ID, VERIFICATION_CONFIG
 from ..data.db_manager import db_manager
+from ..data.chat_registry import chat_registry
 from ..utils.message_utils import send_message_with_retry, edit_message_with_retry
 from ..services.prediction import start_prediction
 from ..prediction import predictor
@@ -91,7 +92,8 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # 如果验证失败，不继续执行
         return
         
-    from ..utils.message_handler import is_broadcasting
+    # 广播状态直接读取活跃聊天注册表
+    is_broadcasting = chat_registry.is_broadcasting
     
     # 获取当前时间
     from datetime import datetime
@@ -172,7 +174,7 @@ async def handle_help_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         
     elif query.data == 'view_status':
         # 获取状态信息
-        from ..utils.message_handler import is_broadcasting
+        is_broadcasting = chat_registry.is_broadcasting
         
         # 获取当前时间
         from datetime import datetime
@@ -403,20 +405,13 @@ async def handle_broadcast_callback(update: Update, context: ContextTypes.DEFAUL
         logger.info(f"忽略来自目标群组 {update.effective_chat.id} 的广播回调")
         return
     
-    from ..utils.message_handler import start_broadcasting, stop_broadcasting, check_broadcasting_status
+    from ..utils.message_handler import start_broadcasting, stop_broadcasting
     from ..services.broadcast import send_broadcast
     
     if query.data == 'start_broadcast':
         # 启动播报
         success = start_broadcasting(update.effective_chat.id)
         if success:
-            # 检查广播状态
-            broadcasting_active = check_broadcasting_status()
-            if not broadcasting_active:
-                logger.warning("广播状态未正确更新，强制更新状态")
-                # 再次尝试启动广播
-                start_broadcasting(update.effective_chat.id)
-            
             # 发送初始播报
             await send_broadcast(context, update.effective_chat.id)
             
@@ -442,16 +437,6 @@ async def handle_broadcast_callback(update: Update, context: ContextTypes.DEFAUL
         # 停止播报
         success = stop_broadcasting(update.effective_chat.id)
         if success:
-            # 检查广播状态
-            broadcasting_active = check_broadcasting_status()
-            if broadcasting_active and not db_manager.get_active_chats():
-                logger.warning("广播状态未正确更新，强制更新状态")
-                # 再次尝试停止广播
-                stop_broadcasting(update.effective_chat.id)
-                # 再次检查广播状态，确保状态正确
-                broadcasting_active = check_broadcasting_status()
-                logger.info(f"再次检查后，广播状态={broadcasting_active}")
-            
             message = (
                 "🛑 *开奖播报已停止* 🛑\n"
                 "━━━━━━━━━━━━━━━━━━━━\n\n"
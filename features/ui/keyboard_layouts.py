@@ -4,7 +4,7 @@ from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMa
 
 # 主键盘布局
 MAIN_KEYBOARD = ReplyKeyboardMarkup([
-    ['开奖播报', '停止播报'],
+    ['开奖播报', '看板播报', '停止播报'],
     ['单双预测', '大小预测'],
     ['杀组预测', '双组预测'],
     ['系统状态']
@@ -0,0 +1,161 @@
+import threading
+from loguru import logger
+from telegram.error import (
+    Forbidden, BadRequest, ChatMigrated, RetryAfter,
+    NetworkError, TimedOut
+)
+
+from ..data.chat_registry import chat_registry
+
+# 投递失败分类
+PERMANENT = 'permanent'        # 永久失败：被拉黑、聊天不存在等，应移除活跃聊天
+TRANSIENT = 'transient'        # 临时失败：网络错误、超时等，可在下一期重试
+RATE_LIMITED = 'rate_limited'  # 触发限流：需要降低发送速度
+MIGRATED = 'migrated'          # 群组已升级为超级群组：聊天ID已变更，应迁移到新ID
+
+# 判定为永久失败的BadRequest错误信息
+_PERMANENT_BAD_REQUEST_MARKERS = (
+    "chat not found",
+    "user is deactivated",
+    "bot was kicked",
+    "bot was blocked",
+    "group chat was deactivated",
+)
+
+# 判定为临时失败的BadRequest错误信息：机器人被禁言或限制发送，群组解除限制后可恢复，不移除聊天
+_TRANSIENT_BAD_REQUEST_MARKERS = (
+    "have no rights to send",
+    "not enough rights to send",
+)
+
+def classify_delivery_error(error):
+    """对投递异常进行分类
+
+    Args:
+        error: 发送或编辑消息时捕获的异常
+
+    Returns:
+        str: PERMANENT / TRANSIENT / RATE_LIMITED / MIGRATED 之一；无法归类的请求错误返回None
+    """
+    if isinstance(error, RetryAfter):
+        return RATE_LIMITED
+    if isinstance(error, ChatMigrated):
+        return MIGRATED
+    if isinstance(error, Forbidden):
+        return PERMANENT
+    if isinstance(error, BadRequest):
+        error_str = str(error).lower()
+        if any(marker in error_str for marker in _PERMANENT_BAD_REQUEST_MARKERS):
+            return PERMANENT
+        if any(marker in error_str for marker in _TRANSIENT_BAD_REQUEST_MARKERS):
+            return TRANSIENT
+        # 其他BadRequest（如消息格式错误）与聊天本身无关
+        return None
+    if isinstance(error, (NetworkError, TimedOut)):
+        return TRANSIENT
+    return TRANSIENT
+
+class DeliveryTracker:
+    """投递结果跟踪器
+
+    发送路径只记录失败分类，不直接操作数据库：
+    - 永久失败的聊天进入待移除集合，每次群发结束后由 flush_removals 在单个事务中统一移除；
+    - 升级为超级群组的聊天记录新旧ID，同样由 flush_removals 把活跃聊天和看板迁移到新ID；
+    - 临时失败和限流按聊天累计连续失败次数，群发时据此把不稳定的聊天排到队尾。
+    """
+
+    def __init__(self, deprioritize_threshold=3):
+        self.deprioritize_threshold = deprioritize_threshold
+        self._pending_removals = set()
+        self._pending_migrations = {}
+        self._failure_counts = {}
+        self._stats = {PERMANENT: 0, TRANSIENT: 0, RATE_LIMITED: 0, MIGRATED: 0}
+        self._lock = threading.Lock()
+
+    def record_failure(self, chat_id, category):
+        """记录一次投递失败"""
+        if category is None:
+            return
+        with self._lock:
+            self._stats[category] = self._stats.get(category, 0) + 1
+            if category == PERMANENT:
+                self._pending_removals.add(chat_id)
+            else:
+                self._failure_counts[chat_id] = self._failure_counts.get(chat_id, 0) + 1
+        logger.debug(f"记录投递失败: chat_id={chat_id}, 分类={category}")
+
+    def record_migration(self, chat_id, new_chat_id):
+        """记录群组升级为超级群组后的新聊天ID"""
+        with self._lock:
+            self._stats[MIGRATED] += 1
+            self._pending_migrations[chat_id] = new_chat_id
+            self._pending_removals.discard(chat_id)
+        logger.info(f"聊天已迁移: {chat_id} -> {new_chat_id}")
+
+    def record_success(self, chat_id):
+        """记录一次投递成功，清零该聊天的连续失败次数"""
+        if chat_id in self._failure_counts:
+            with self._lock:
+                self._failure_counts.pop(chat_id, None)
+
+    def is_pending_removal(self, chat_id):
+        """聊天是否已判定为永久失败、等待移除"""
+        return chat_id in self._pending_removals
+
+    def failure_count(self, chat_id):
+        """获取聊天的连续失败次数"""
+        return self._failure_counts.get(chat_id, 0)
+
+    def order_chats(self, chat_ids):
+        """按投递健康度排序：连续失败达到阈值的聊天排在最后（保持原有相对顺序）"""
+        if not self._failure_counts:
+            return list(chat_ids)
+        healthy = []
+        deprioritized = []
+        for chat_id in chat_ids:
+            if self._failure_counts.get(chat_id, 0) >= self.deprioritize_threshold:
+                deprioritized.append(chat_id)
+            else:
+                healthy.append(chat_id)
+        if deprioritized:
+            logger.debug(f"{len(deprioritized)} 个聊天连续投递失败，已降低优先级")
+        return healthy + deprioritized
+
+    def flush_removals(self):
+        """批量迁移已升级的聊天，并移除永久失败的聊天
+
+        Returns:
+            list: 本次移除的聊天ID
+        """
+        with self._lock:
+            migrations = self._pending_migrations
+            self._pending_migrations = {}
+            chat_ids = list(self._pending_removals)
+            self._pending_removals.clear()
+            for chat_id in chat_ids + list(migrations):
+                self._failure_counts.pop(chat_id, None)
+        if migrations:
+            chat_registry.migrate_many(migrations)
+        if not chat_ids:
+            return []
+        removed = chat_registry.remove_many(chat_ids)
+        if removed:
+            logger.info(f"已批量移除 {len(removed)} 个无法投递的聊天")
+        return removed
+
+    def get_stats(self):
+        """获取投递失败统计"""
+        with self._lock:
+            return {
+                **self._stats,
+                'pending_removals': len(self._pending_removals),
+                'pending_migrations': len(self._pending_migrations),
+                'failing_chats': len(self._failure_counts)
+            }
+
+# 创建全局投递跟踪器实例
+delivery_tracker = DeliveryTracker()
+
+async def flush_dead_chats(context=None):
+    """定时任务：移除群发以外的发送路径中积累的无效聊天"""
+    delivery_tracker.flush_removals()
@@ -0,0 +1,78 @@
+import threading
+from collections import deque
+from loguru import logger
+
+# 开奖播报历史行使用的类型名，预测历史行直接使用预测类型
+BROADCAST_KIND = 'broadcast'
+
+class HistoryLineCache:
+    """按类型缓存预渲染、已转义的历史记录行
+
+    两期开奖之间历史窗口只移动一行：新开奖入库或预测验证完成时渲染并追加一行，
+    格式化消息时只需拼接表头和缓存中的行，不再逐行重新渲染。
+    每个类型用一个定长 deque 保存插入顺序，超出容量时淘汰最早的行。
+    """
+
+    def __init__(self, maxlen=32):
+        self.maxlen = maxlen
+        self._order = {}   # kind -> deque[key]
+        self._lines = {}   # kind -> {key: line}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, kind, key):
+        """获取缓存的行，不存在时返回None"""
+        lines = self._lines.get(kind)
+        if lines is None:
+            return None
+        return lines.get(key)
+
+    def put(self, kind, key, line):
+        """追加一行"""
+        with self._lock:
+            order = self._order.setdefault(kind, deque())
+            lines = self._lines.setdefault(kind, {})
+            if key not in lines:
+                if len(order) >= self.maxlen:
+                    lines.pop(order.popleft(), None)
+                order.append(key)
+            lines[key] = line
+        return line
+
+    def get_or_render(self, kind, key, render, *args):
+        """获取缓存的行，未命中时调用 render(*args) 渲染并追加
+
+        render 返回None（如结果未知）时不缓存
+        """
+        line = self.get(kind, key)
+        if line is not None:
+            self._hits += 1
+            return line
+        self._misses += 1
+        line = render(*args)
+        if line is not None:
+            self.put(kind, key, line)
+        return line
+
+    def clear(self, kind=None):
+        """清空指定类型或全部缓存"""
+        with self._lock:
+            if kind is None:
+                self._order.clear()
+                self._lines.clear()
+            else:
+                self._order.pop(kind, None)
+                self._lines.pop(kind, None)
+        logger.debug(f"已清空历史行缓存: {kind or '全部'}")
+
+    def get_stats(self):
+        """获取缓存统计"""
+        return {
+            'kinds': {kind: len(lines) for kind, lines in self._lines.items()},
+            'hits': self._hits,
+            'misses': self._misses
+        }
+
+# 创建全局历史行缓存实例
+history_lines = HistoryLineCache()
@@ -0,0 +1,72 @@
+import httpx
+from loguru import logger
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from ..config.config_manager import BOT_TOKEN, HTTP_CONFIG
+
+def _resolve_http_version(http_version):
+    """HTTP/2 依赖 h2 包，未安装时回退到 HTTP/1.1"""
+    if http_version == "2":
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("未安装 httpx[http2]，HTTP/2 不可用，回退到 HTTP/1.1")
+            return "1.1"
+    return http_version
+
+class PooledHTTPXRequest(HTTPXRequest):
+    """支持配置空闲连接保活时间的 HTTPXRequest"""
+
+    def __init__(self, connection_pool_size, keepalive_expiry=None, **kwargs):
+        super().__init__(connection_pool_size=connection_pool_size, **kwargs)
+        if keepalive_expiry is not None:
+            self._client_kwargs["limits"] = httpx.Limits(
+                max_connections=connection_pool_size,
+                max_keepalive_connections=connection_pool_size,
+                keepalive_expiry=keepalive_expiry
+            )
+            self._client = self._build_client()
+
+def build_request(connection_pool_size, read_timeout=None):
+    """按配置创建请求对象
+
+    Args:
+        connection_pool_size: 连接池大小
+        read_timeout: 读取超时，默认使用 HTTP_CONFIG["TIMEOUT"]
+    """
+    timeout = HTTP_CONFIG["TIMEOUT"]
+    return PooledHTTPXRequest(
+        connection_pool_size=connection_pool_size,
+        keepalive_expiry=HTTP_CONFIG["KEEPALIVE_EXPIRY"],
+        connect_timeout=timeout,
+        read_timeout=read_timeout if read_timeout is not None else timeout,
+        write_timeout=timeout,
+        pool_timeout=timeout,
+        http_version=_resolve_http_version(HTTP_CONFIG["HTTP_VERSION"])
+    )
+
+# 群发专用Bot实例，与长轮询和交互回复使用不同的连接池
+_broadcast_bot = None
+
+async def init_broadcast_bot():
+    """创建并初始化群发专用Bot"""
+    global _broadcast_bot
+    if not HTTP_CONFIG["SEPARATE_BROADCAST_BOT"] or _broadcast_bot is not None:
+        return _broadcast_bot
+    bot = Bot(BOT_TOKEN, request=build_request(HTTP_CONFIG["BROADCAST_POOL_SIZE"]))
+    await bot.initialize()
+    _broadcast_bot = bot
+    logger.info(f"群发专用Bot已初始化，连接池大小: {HTTP_CONFIG['BROADCAST_POOL_SIZE']}")
+    return _broadcast_bot
+
+async def shutdown_broadcast_bot():
+    """关闭群发专用Bot的连接池"""
+    global _broadcast_bot
+    if _broadcast_bot is not None:
+        await _broadcast_bot.shutdown()
+        _broadcast_bot = None
+
+def get_broadcast_bot(context):
+    """获取群发使用的Bot，未启用独立实例时返回应用的Bot"""
+    return _broadcast_bot or context.bot
@@ -0,0 +1,83 @@
+"""
+MarkdownV2 消息构建工具
+
+普通文本在追加时通过单次 str.translate 完成转义，代码和粗体作为结构化片段输出，
+构建结果本身就是合法的 MarkdownV2 文本，发送时无需再次转义。
+"""
+
+# 普通文本中需要转义的字符（Telegram MarkdownV2 规范）
+_TEXT_ESCAPE_TABLE = str.maketrans({char: '\\' + char for char in '\\_*[]()~`>#+-=|{}.!'})
+
+# 代码片段中只需转义反引号和反斜杠
+_CODE_ESCAPE_TABLE = str.maketrans({'`': '\\`', '\\': '\\\\'})
+
+def escape_text(text):
+    """转义普通文本"""
+    return str(text).translate(_TEXT_ESCAPE_TABLE)
+
+def escape_code(text):
+    """转义代码片段内容"""
+    return str(text).translate(_CODE_ESCAPE_TABLE)
+
+class MarkdownV2Text(str):
+    """已完成转义的 MarkdownV2 文本
+
+    字符串值即最终发送内容，plain 属性保存去掉格式后的纯文本，用于降级发送。
+    注意：与普通字符串拼接会得到普通 str，应通过 MarkdownV2Builder.append 组合。
+    """
+
+    def __new__(cls, wire, plain):
+        obj = super().__new__(cls, wire)
+        obj.plain = plain
+        return obj
+
+    def __getnewargs__(self):
+        # 支持pickle（状态快照）
+        return (str(self), self.plain)
+
+class MarkdownV2Builder:
+    """按片段构建 MarkdownV2 消息"""
+
+    def __init__(self):
+        self._wire = []
+        self._plain = []
+
+    def text(self, text):
+        """追加普通文本"""
+        text = str(text)
+        self._wire.append(text.translate(_TEXT_ESCAPE_TABLE))
+        self._plain.append(text)
+        return self
+
+    def code(self, text):
+        """追加行内代码"""
+        text = str(text)
+        self._wire.append('`' + text.translate(_CODE_ESCAPE_TABLE) + '`')
+        self._plain.append(text)
+        return self
+
+    def bold(self, text):
+        """追加粗体文本"""
+        text = str(text)
+        self._wire.append('*' + text.translate(_TEXT_ESCAPE_TABLE) + '*')
+        self._plain.append(text)
+        return self
+
+    def append(self, fragment):
+        """追加已构建好的片段（MarkdownV2Text）"""
+        self._wire.append(str(fragment))
+        self._plain.append(fragment.plain)
+        return self
+
+    def build(self):
+        """生成最终消息"""
+        return MarkdownV2Text(''.join(self._wire), ''.join(self._plain))
+
+def join_fragments(fragments, separator=''):
+    """拼接多个已构建的片段"""
+    fragments = list(fragments)
+    wire_separator = escape_text(separator)
+    return MarkdownV2Text(
+        wire_separator.join(str(fragment) for fragment in fragments),
+        separator.join(fragment.plain for fragment in fragments)
+    )
@@ -15,7 +15,9 @@ from telegram.error import (
 
 from ..config.config_manager import ADMIN_ID, BROADCAST_CONFIG, SPECIAL_GROUP_ID, TARGET_GROUP_ID
 from ..data.db_manager import db_manager
+from ..data.chat_registry import chat_registry
 from ..services.broadcast import start_broadcast, stop_broadcast
+from ..services.live_board import start_live_board
 from ..services.prediction import start_prediction
 from ..prediction import predictor
 from ..utils.message_utils import send_message_with_retry
@@ -29,17 +31,21 @@ _user_command_locks = {}
 _user_last_command_time = {}
 _command_cooldown = 2  # 命令冷却时间（秒）
 
+def _on_active_chats_changed(event, chat_id, count):
+    """活跃聊天变更时同步广播状态"""
+    global is_broadcasting
+    is_broadcasting = count > 0
+
+# 订阅活跃聊天注册表，广播状态始终与注册表一致
+chat_registry.subscribe(_on_active_chats_changed)
+
 # 添加播报功能处理函数
 def start_broadcasting(chat_id):
     """启动开奖播报"""
-    global is_broadcasting
     try:
-        # 记录活跃聊天
-        db_manager.add_active_chat(chat_id)
-        # 检查是否有活跃聊天，并更新全局状态
-        active_chats = db_manager.get_active_chats()
-        is_broadcasting = len(active_chats) > 0
-        logger.info(f"用户 {chat_id} 启动了开奖播报，当前活跃聊天数: {len(active_chats)}")
+        # 记录活跃聊天（内存注册表同步更新，数据库异步写入）
+        chat_registry.add(chat_id)
+        logger.info(f"用户 {chat_id} 启动了开奖播报，当前活跃聊天数: {chat_registry.count()}")
         return True
     except Exception as e:
         logger.error(f"启动开奖播报失败: {e}")
@@ -47,23 +53,12 @@ def start_broadcasting(chat_id):
 
 def stop_broadcasting(chat_id):
     """停止开奖播报"""
-    global is_broadcasting
     try:
-        # 移除活跃聊天
-        db_manager.remove_active_chat(chat_id)
+        # 移除活跃聊天，同时关闭看板模式
+        chat_registry.remove(chat_id)
+        db_manager.remove_live_board(chat_id)
         
-        # 检查是否还有其他活跃聊天
-        active_chats = db_manager.get_active_chats()
-        # 更新全局状态
-        is_broadcasting = len(active_chats) > 0
-        
-        logger.info(f"用户 {chat_id} 停止了开奖播报，当前活跃聊天数: {len(active_chats)}")
-        
-        # 确保全局状态正确更新
-        if not active_chats and is_broadcasting:
-            is_broadcasting = False
-            logger.warning("强制更新广播状态为非活跃")
-            
+        logger.info(f"用户 {chat_id} 停止了开奖播报，当前活跃聊天数: {chat_registry.count()}")
         return True
     except Exception as e:
         logger.error(f"停止开奖播报失败: {e}")
@@ -73,10 +68,9 @@ def stop_broadcasting(chat_id):
 def check_broadcasting_status():
     """检查是否有活跃的广播聊天"""
     global is_broadcasting
-    active_chats = db_manager.get_active_chats()
-    # 确保全局状态与活跃聊天列表一致
-    is_broadcasting = len(active_chats) > 0
-    logger.debug(f"检查广播状态: 活跃聊天数={len(active_chats)}, 广播状态={is_broadcasting}")
+    # 确保全局状态与活跃聊天注册表一致
+    is_broadcasting = chat_registry.is_broadcasting
+    logger.debug(f"检查广播状态: 活跃聊天数={chat_registry.count()}, 广播状态={is_broadcasting}")
     return is_broadcasting
 
 # 命令冷却检查
@@ -199,6 +193,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         start_broadcasting(chat_id)
         # 使用非阻塞方式启动广播
         asyncio.create_task(start_broadcast(update, context))
+    elif text == "看板播报":
+        # 看板模式：每期编辑同一条置顶消息，而不是发送新消息
+        start_broadcasting(chat_id)
+        asyncio.create_task(start_live_board(update, context))
     elif text == "停止播报":
         # 先停止广播，再更新状态
         stop_broadcasting(chat_id)
@@ -2,49 +2,58 @@ import asyncio
 import random
 from loguru import logger
 from telegram.error import (
-    TelegramError, Forbidden, BadRequest,
-    NetworkError, TimedOut
+    TelegramError, Forbidden, BadRequest, ChatMigrated,
+    NetworkError, TimedOut, RetryAfter
 )
 
-from ..data.db_manager import db_manager
+from .http_request import get_broadcast_bot
+from .markdown_builder import MarkdownV2Text
+from .delivery_tracker import (
+    delivery_tracker, classify_delivery_error,
+    PERMANENT, TRANSIENT, RATE_LIMITED
+)
+
+# 编辑的内容与原消息相同时 edit_message_with_retry 的返回值（消息已是最新内容，不是失败）
+MESSAGE_NOT_MODIFIED = 'not_modified'
+
+# 旧格式文本的转义表：反引号作为代码格式保留，其余特殊字符一次性转义
+_LEGACY_ESCAPE_TABLE = str.maketrans({char: '\\' + char for char in '_*[]()~>#+-=|{}.!'})
 
 def escape_markdown(text):
-    """转义Markdown特殊字符，以便在MarkdownV2模式下正确显示"""
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    """转义Markdown特殊字符，以便在MarkdownV2模式下正确显示
+    
+    用于手写的旧格式文本；通过 MarkdownV2Builder 构建的消息已是最终格式，无需调用。
+    """
+    if isinstance(text, MarkdownV2Text):
+        return str(text)
     
     # 不转义反引号，因为我们使用它作为代码格式
     # 但确保反引号是成对出现的
-    
-    # 先检查并修复不成对的反引号
-    backquote_count = text.count('`')
-    if backquote_count % 2 != 0:
+    if text.count('`') % 2 != 0:
         # 如果反引号数量不是偶数，添加一个额外的反引号到末尾
         text += '`'
         logger.warning("检测到不成对的反引号，已自动修复")
     
-    # 转义其他特殊字符
-    escaped_text = text
-    for char in special_chars:
-        escaped_text = escaped_text.replace(char, f'\\{char}')
-    
-    # 检查是否有未转义的圆括号，这是常见问题源
-    if '(' in escaped_text and '\\(' not in escaped_text:
-        logger.warning(f"转义后仍存在未转义的左括号，可能导致解析失败")
-    if ')' in escaped_text and '\\)' not in escaped_text:
-        logger.warning(f"转义后仍存在未转义的右括号，可能导致解析失败")
-    
-    return escaped_text
+    return text.translate(_LEGACY_ESCAPE_TABLE)
 
-async def send_message_with_retry(context, chat_id, text, parse_mode=None, reply_markup=None, max_retries=5, retry_delay=2, broadcast_mode=False):
+async def send_message_with_retry(context, chat_id, text, parse_mode=None, reply_markup=None, max_retries=5, retry_delay=2, broadcast_mode=False, escaped_text=None):
     """发送消息，带重试机制
     
     broadcast_mode: 是否为广播模式，如果是广播模式则发送失败后不进行重试
+    escaped_text: 预先转义好的MarkdownV2文本（见render_cache），提供时不再重复转义
     """
     retries = 0
     
+    # 通过MarkdownV2Builder构建的消息已是最终格式
+    if parse_mode == 'MarkdownV2' and isinstance(text, MarkdownV2Text):
+        escaped_text = str(text)
+        text = text.plain
+    
     # 如果使用MarkdownV2，对文本进行转义
     # 注意：对于HTML和Markdown模式，我们尝试确保反引号是成对的
-    if parse_mode in ['MarkdownV2', 'Markdown', 'HTML']:
+    if escaped_text is not None and parse_mode == 'MarkdownV2':
+        pass
+    elif parse_mode in ['MarkdownV2', 'Markdown', 'HTML']:
         # 检查反引号是否成对
         backquote_count = text.count('`')
         if backquote_count % 2 != 0:
@@ -53,7 +62,9 @@ async def send_message_with_retry(context, chat_id, text, parse_mode=None, reply
             logger.warning("检测到不成对的反引号，已自动修复")
     
     original_text = text
-    if parse_mode == 'MarkdownV2':
+    if escaped_text is not None and parse_mode == 'MarkdownV2':
+        text = escaped_text
+    elif parse_mode == 'MarkdownV2':
         text = escape_markdown(text)
         # 如果转义前后文本不同，记录日志以便调试
         if original_text != text:
@@ -61,13 +72,17 @@ async def send_message_with_retry(context, chat_id, text, parse_mode=None, reply
     
     # 广播模式下最多只尝试一次
     actual_max_retries = 0 if broadcast_mode else max_retries
+    # 最近一次失败的分类，用于重试耗尽后记录
+    last_category = TRANSIENT
+    # 群发使用独立的Bot实例，不与长轮询和交互回复争用连接
+    bot = get_broadcast_bot(context) if broadcast_mode else context.bot
     
     while retries <= actual_max_retries:
         try:
             # 添加随机小延迟，避免多个请求同时发送
             await asyncio.sleep(random.uniform(0.1, 0.5))
             
-            return await context.bot.send_message(
+            sent = await bot.send_message(
                 chat_id=chat_id,
                 text=text,
                 parse_mode=parse_mode,
@@ -76,6 +91,8 @@ async def send_message_with_retry(context, chat_id, text, parse_mode=None, reply
                 connect_timeout=15,
                 read_timeout=15
             )
+            delivery_tracker.record_success(chat_id)
+            return sent
         except BadRequest as e:
             if "can't parse entities" in str(e).lower():
                 error_msg = f"解析实体失败 {chat_id}: {e}"
@@ -87,7 +104,7 @@ async def send_message_with_retry(context, chat_id, text, parse_mode=None, reply
                     try:
                         # 使用预格式化文本块（代码块）包装内容
                         formatted_text = f"```\n{original_text}\n```"
-                        return await context.bot.send_message(
+                        return await bot.send_message(
                             chat_id=chat_id,
                             text=formatted_text,
                             parse_mode=parse_mode,
@@ -99,7 +116,7 @@ async def send_message_with_retry(context, chat_id, text, parse_mode=None, reply
                 # 尝试降级处理 - 移除解析模式重试
                 logger.warning("尝试不使用解析模式重新发送")
                 try:
-                    return await context.bot.send_message(
+                    return await bot.send_message(
                         chat_id=chat_id,
                         text=original_text,  # 使用原始未转义文本
                         parse_mode=None,  # 不使用解析模式
@@ -108,31 +125,38 @@ async def send_message_with_retry(context, chat_id, text, parse_mode=None, reply
                 except Exception as inner_e:
                     logger.error(f"降级处理也失败: {inner_e}")
                 return None
-        except Forbidden as e:
-            logger.error(f"权限错误，无法发送消息到 {chat_id}: {e}")
-            # 用户可能已阻止机器人，移除活跃聊天
-            db_manager.remove_active_chat(chat_id)
-            return None
-        except BadRequest as e:
-            if "chat not found" in str(e).lower():
-                logger.error(f"聊天不存在 {chat_id}: {e}")
-                db_manager.remove_active_chat(chat_id)
-                return None
             elif "message is too long" in str(e).lower():
                 # 消息太长，尝试分段发送
                 logger.warning(f"消息太长，尝试分段发送: {e}")
                 chunks = split_message(text)
                 for chunk in chunks:
                     await asyncio.sleep(0.5)  # 避免发送过快
-                    await context.bot.send_message(
+                    await bot.send_message(
                         chat_id=chat_id,
                         text=chunk,
                         parse_mode=parse_mode
                     )
                 return None
+            elif classify_delivery_error(e) == PERMANENT:
+                # 聊天不存在等永久错误，交给投递跟踪器在群发结束后批量移除
+                logger.error(f"聊天不可用 {chat_id}: {e}")
+                delivery_tracker.record_failure(chat_id, PERMANENT)
+                return None
             else:
                 logger.error(f"发送消息失败 {chat_id}: {e}")
+                last_category = None
                 retries += 1
+        except Forbidden as e:
+            logger.error(f"权限错误，无法发送消息到 {chat_id}: {e}")
+            # 用户可能已阻止机器人，交给投递跟踪器在群发结束后批量移除
+            delivery_tracker.record_failure(chat_id, PERMANENT)
+            return None
+        except RetryAfter as e:
+            logger.warning(f"触发限流 {chat_id}: 需等待 {e.retry_after} 秒")
+            last_category = RATE_LIMITED
+            if not broadcast_mode:
+                await asyncio.sleep(e.retry_after)
+            retries += 1
         except NetworkError as e:
             error_str = str(e)
             logger.error(f"网络错误 {chat_id}: {e}")
@@ -141,12 +165,26 @@ async def send_message_with_retry(context, chat_id, text, parse_mode=None, reply
                 logger.warning(f"检测到服务器断开连接错误，延长等待时间后重试")
                 if not broadcast_mode:
                     await asyncio.sleep(retry_delay * 2 * retries)  # 对于这种错误，增加更长的等待时间
+            last_category = TRANSIENT
             retries += 1
         except TimedOut as e:
             logger.error(f"发送消息超时 {chat_id}: {e}")
+            last_category = TRANSIENT
             retries += 1
+        except ChatMigrated as e:
+            # 群组已升级为超级群组：记录新ID（活跃聊天和看板随后迁移），并改为向新ID发送
+            logger.warning(f"聊天已升级为超级群组 {chat_id} -> {e.new_chat_id}")
+            delivery_tracker.record_migration(chat_id, e.new_chat_id)
+            if e.new_chat_id == chat_id:
+                return None
+            chat_id = e.new_chat_id
+            continue
         except TelegramError as e:
             logger.error(f"Telegram错误 {chat_id}: {e}")
+            last_category = classify_delivery_error(e)
+            if last_category == PERMANENT:
+                delivery_tracker.record_failure(chat_id, PERMANENT)
+                return None
             retries += 1
         except Exception as e:
             error_str = str(e)
@@ -156,6 +194,7 @@ async def send_message_with_retry(context, chat_id, text, parse_mode=None, reply
                 logger.warning(f"检测到服务器断开连接错误，延长等待时间后重试")
                 if not broadcast_mode:
                     await asyncio.sleep(retry_delay * 2 * retries)  # 对于这种错误，增加更长的等待时间
+            last_category = TRANSIENT
             retries += 1
             
         if retries <= actual_max_retries:
@@ -169,6 +208,8 @@ async def send_message_with_retry(context, chat_id, text, parse_mode=None, reply
             
             await asyncio.sleep(wait_time)
     
+    # 所有尝试均失败，记录临时失败或限流
+    delivery_tracker.record_failure(chat_id, last_category)
     return None
 
 def split_message(text, max_length=4096):
@@ -192,13 +233,23 @@ def split_message(text, max_length=4096):
         
     return parts 
 
-async def edit_message_with_retry(context, chat_id, message_id, text, parse_mode=None, reply_markup=None, max_retries=5, retry_delay=2):
-    """编辑消息，带重试机制"""
+async def edit_message_with_retry(context, chat_id, message_id, text, parse_mode=None, reply_markup=None, max_retries=5, retry_delay=2, escaped_text=None):
+    """编辑消息，带重试机制
+    
+    escaped_text: 预先转义好的MarkdownV2文本，提供时不再重复转义
+    """
     retries = 0
     
+    # 通过MarkdownV2Builder构建的消息已是最终格式
+    if parse_mode == 'MarkdownV2' and isinstance(text, MarkdownV2Text):
+        escaped_text = str(text)
+        text = text.plain
+    
     # 如果使用MarkdownV2，对文本进行转义
     # 对于HTML和Markdown模式，我们尝试确保反引号是成对的
-    if parse_mode in ['MarkdownV2', 'Markdown', 'HTML']:
+    if escaped_text is not None and parse_mode == 'MarkdownV2':
+        pass
+    elif parse_mode in ['MarkdownV2', 'Markdown', 'HTML']:
         # 检查反引号是否成对
         backquote_count = text.count('`')
         if backquote_count % 2 != 0:
@@ -207,7 +258,9 @@ async def edit_message_with_retry(context, chat_id, message_id, text, parse_mode
             logger.warning("编辑消息: 检测到不成对的反引号，已自动修复")
     
     original_text = text
-    if parse_mode == 'MarkdownV2':
+    if escaped_text is not None and parse_mode == 'MarkdownV2':
+        text = escaped_text
+    elif parse_mode == 'MarkdownV2':
         text = escape_markdown(text)
         # 如果转义前后文本不同，记录日志以便调试
         if original_text != text:
@@ -232,10 +285,10 @@ async def edit_message_with_retry(context, chat_id, message_id, text, parse_mode
             # 处理消息未修改的错误
             if "message is not modified" in str(e).lower():
                 logger.info(f"消息未修改，内容相同: {chat_id}, {message_id}")
-                return None  # 不需要重试，这不是真正的错误
-            elif "chat not found" in str(e).lower():
-                logger.error(f"聊天不存在 {chat_id}: {e}")
-                db_manager.remove_active_chat(chat_id)
+                return MESSAGE_NOT_MODIFIED  # 不需要重试，这不是真正的错误
+            elif classify_delivery_error(e) == PERMANENT:
+                logger.error(f"聊天不可用 {chat_id}: {e}")
+                delivery_tracker.record_failure(chat_id, PERMANENT)
                 return None
             elif "can't parse entities" in str(e).lower():
                 error_msg = f"编辑消息时解析实体失败 {chat_id}: {e}"
@@ -275,7 +328,7 @@ async def edit_message_with_retry(context, chat_id, message_id, text, parse_mode
                 retries += 1
         except Forbidden as e:
             logger.error(f"权限错误，无法编辑消息 {chat_id}: {e}")
-            db_manager.remove_active_chat(chat_id)
+            delivery_tracker.record_failure(chat_id, PERMANENT)
             return None
         except NetworkError as e:
             error_str = str(e)
@@ -288,6 +341,11 @@ async def edit_message_with_retry(context, chat_id, message_id, text, parse_mode
         except TimedOut as e:
             logger.error(f"编辑消息超时 {chat_id}: {e}")
             retries += 1
+        except ChatMigrated as e:
+            # 旧群组中的消息无法再编辑，记录新ID后由调用方决定是否重新发送
+            logger.warning(f"聊天已升级为超级群组 {chat_id} -> {e.new_chat_id}")
+            delivery_tracker.record_migration(chat_id, e.new_chat_id)
+            return None
         except TelegramError as e:
             logger.error(f"Telegram错误 {chat_id}: {e}")
             retries += 1
@@ -0,0 +1,96 @@
+"""
+Bot API 请求限速模块
+
+分片播报的发送进程与主进程中的其他批量任务（如成员身份校准）共用同一个每秒请求预算。
+启用分片播报时使用跨进程共享的令牌桶；未启用时只在主进程内限速，不创建任何多进程同步原语。
+限速器在第一次使用时才创建。
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+
+from ..config.config_manager import SHARD_CONFIG
+
+class RateLimiter:
+    """进程内令牌桶限速器"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.time()
+
+    def try_acquire(self):
+        """尝试获取一个令牌
+
+        Returns:
+            float: 0表示获取成功，否则为需要等待的秒数
+        """
+        now = time.time()
+        self._tokens = min(self.capacity, self._tokens + max(0.0, now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        """异步等待直到获取令牌"""
+        while True:
+            delay = self.try_acquire()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+class SharedRateLimiter(RateLimiter):
+    """跨进程共享的令牌桶限速器"""
+
+    # 锁被其他进程持有时的重试间隔（秒）
+    LOCK_RETRY_DELAY = 0.001
+
+    def __init__(self, rate, capacity=None, mp_context=None):
+        mp_context = mp_context or multiprocessing.get_context('spawn')
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._lock = mp_context.Lock()
+        self._shared_tokens = mp_context.Value('d', self.capacity, lock=False)
+        self._shared_updated = mp_context.Value('d', time.time(), lock=False)
+
+    def try_acquire(self):
+        """尝试获取一个令牌（不阻塞等待锁，事件循环中调用也不会卡住）
+
+        Returns:
+            float: 0表示获取成功，否则为需要等待的秒数
+        """
+        if not self._lock.acquire(block=False):
+            return self.LOCK_RETRY_DELAY
+        try:
+            now = time.time()
+            elapsed = max(0.0, now - self._shared_updated.value)
+            self._shared_tokens.value = min(self.capacity, self._shared_tokens.value + elapsed * self.rate)
+            self._shared_updated.value = now
+            if self._shared_tokens.value >= 1:
+                self._shared_tokens.value -= 1
+                return 0.0
+            return (1 - self._shared_tokens.value) / self.rate
+        finally:
+            self._lock.release()
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """获取主进程共用的限速器（首次调用时创建）
+
+    启用分片播报时返回跨进程共享的限速器，由 ShardedBroadcaster 传给发送进程；
+    否则返回进程内限速器。
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            if SHARD_CONFIG["WORKERS"] > 0:
+                _rate_limiter = SharedRateLimiter(SHARD_CONFIG["RATE_LIMIT"])
+            else:
+                _rate_limiter = RateLimiter(SHARD_CONFIG["RATE_LIMIT"])
+        return _rate_limiter
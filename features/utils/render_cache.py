@@ -0,0 +1,109 @@
+import threading
+from collections import namedtuple
+from loguru import logger
+
+from ..config.config_manager import BROADCAST_CONFIG
+from ..data.cache_manager import cache_manager
+from ..data.state_snapshot import state_snapshot
+from .utils_helper import format_broadcast_message
+from .message_utils import escape_markdown
+from .markdown_builder import MarkdownV2Text
+
+# 渲染结果：原始文本（用于降级发送和看板比对）与预先转义的MarkdownV2文本
+RenderedPayload = namedtuple('RenderedPayload', ['qihao', 'text', 'escaped'])
+
+# 模板名称
+TEMPLATE_LATEST = 'latest'     # 仅最新一期（群发给普通聊天）
+TEMPLATE_HISTORY = 'history'   # 最新一期 + 历史记录（开奖播报、看板、特定群组）
+
+class BroadcastRenderCache:
+    """按期号版本化的播报渲染缓存
+
+    缓存键为 (期号, 模板, 历史条数)。新一期开奖入库后渲染一次，
+    直到下一期到来之前，所有发送方共用同一份不可变的文本和转义结果。
+    """
+
+    def __init__(self):
+        # 条目保存在统一缓存的 broadcast 命名空间中，新一期开奖时失效
+        self._entries = cache_manager.namespace('broadcast', max_entries=16, invalidate_on_draw=True)
+        self._latest_qihao = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _render(template, records):
+        if template == TEMPLATE_LATEST:
+            text = format_broadcast_message(records[:1])
+        else:
+            text = format_broadcast_message(records)
+        if isinstance(text, MarkdownV2Text):
+            # 格式化结果已是最终的MarkdownV2文本
+            return text.plain, str(text)
+        return text, escape_markdown(text)
+
+    def get(self, records, template=TEMPLATE_HISTORY, history=None):
+        """获取渲染结果，未命中时渲染并缓存
+
+        Args:
+            records: 按期号倒序的开奖记录（get_recent_records 的返回值）
+            template: 模板名称
+            history: 历史条数，默认使用 BROADCAST_CONFIG["HISTORY_COUNT"]
+
+        Returns:
+            RenderedPayload: 渲染结果；records为空时返回None
+        """
+        if not records:
+            return None
+        if template == TEMPLATE_LATEST:
+            history = 1
+        elif history is None:
+            history = BROADCAST_CONFIG["HISTORY_COUNT"]
+        records = records[:history]
+        qihao = records[0][1]
+        key = (qihao, template, history)
+
+        payload = self._entries.get(key)
+        if payload is not None:
+            return payload
+
+        text, escaped = self._render(template, records)
+        payload = RenderedPayload(qihao, text, escaped)
+        with self._lock:
+            # 出现更新的期号时丢弃旧版本
+            if self._latest_qihao is None or qihao > self._latest_qihao:
+                self._entries.clear()
+                self._latest_qihao = qihao
+            if qihao == self._latest_qihao:
+                self._entries.set(key, payload)
+        return payload
+
+    def prime(self, records):
+        """新一期开奖入库后预先渲染常用模板"""
+        if not records:
+            return
+        self.get(records, TEMPLATE_LATEST)
+        self.get(records, TEMPLATE_HISTORY)
+        logger.debug(f"已预渲染期号 {records[0][1]} 的播报内容")
+
+    @property
+    def latest_qihao(self):
+        return self._latest_qihao
+
+    def export_state(self):
+        """导出状态（用于快照）"""
+        return {'latest_qihao': self._latest_qihao, 'entries': self._entries.items()}
+
+    def restore_state(self, state):
+        """从快照恢复状态"""
+        with self._lock:
+            self._entries.clear()
+            for key, payload in state['entries']:
+                self._entries.set(key, payload)
+            self._latest_qihao = state['latest_qihao']
+
+    def get_stats(self):
+        """获取命中统计"""
+        return {**self._entries.get_stats(), 'latest_qihao': self._latest_qihao}
+
+# 创建全局播报渲染缓存实例
+render_cache = BroadcastRenderCache()
+state_snapshot.register('render_cache', render_cache.export_state, render_cache.restore_state)
@@ -11,9 +11,14 @@ import urllib3  # 添加导入
 # 禁用不安全请求的警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-from ..config.config_manager import GAME_CONFIG, LOTTERY_API, API_CONFIG
-from ..data.cache_manager import cache
+from ..config.config_manager import GAME_CONFIG, LOTTERY_API, API_CONFIG, CACHE_CONFIG
+from ..data.cache_manager import cache_manager
 from ..config.proxy_config import get_proxy_settings, get_ssl_verify
+from .markdown_builder import MarkdownV2Builder
+from .history_lines import history_lines, BROADCAST_KIND
+
+# API请求日志节流缓存：过期后视为从未记录
+api_log_cache = cache_manager.namespace('api', ttl=CACHE_CONFIG["API_LOG_TTL"], max_entries=16)
 
 # 预测类型名称映射
 PREDICTION_TYPE_NAMES = {
@@ -129,7 +134,7 @@ def fetch_lottery_data(page=1, min_records=10, max_retries=None):
         retry_count = 0
         
         # 记录上次API请求日志的时间
-        last_api_log_time = cache.get('last_api_log_time', 0)
+        last_api_log_time = api_log_cache.get('last_api_log_time', 0)
         current_time = time.time()
         should_log = current_time - last_api_log_time > 60  # 每分钟最多记录一次
         
@@ -163,7 +168,7 @@ def fetch_lottery_data(page=1, min_records=10, max_retries=None):
                 # 减少日志输出
                 if should_log:
                     logger.info(f"获取开奖数据，页码: {current_page}")
-                    cache['last_api_log_time'] = current_time
+                    api_log_cache.set('last_api_log_time', current_time)
                 
                 url = f"{LOTTERY_API}?page={current_page}&type=1"
                 
@@ -303,8 +308,12 @@ def analyze_lottery_data(opennum, total_sum):
         'combination_type': combination_type
     }
 
-def process_double_group_numbers(numbers_text, prediction_content=""):
-    """处理双组预测特码"""
+def parse_double_group_numbers(numbers_text, prediction_content=""):
+    """解析双组预测特码
+    
+    Returns:
+        list: 两个两位数字符串，按数值排序
+    """
     try:
         # 从文本中提取数字
         if "[" in numbers_text and "]" in numbers_text:
@@ -400,17 +409,26 @@ def process_double_group_numbers(numbers_text, prediction_content=""):
         formatted_numbers.sort(key=lambda x: int(x))
         
         # 最多保留两个数字
-        formatted_numbers = formatted_numbers[:2]
-        
-        # 构建标记格式
-        formatted_nums = [f"`{num}`" for num in formatted_numbers]
-        return f"[{','.join(formatted_nums)}]"
+        return formatted_numbers[:2]
     except Exception as e:
         logger.warning(f"处理双组预测特码失败: {e}")
         # 生成两个均衡分布的随机数字作为后备
-        small_num = f"{random.randint(0, 13):02d}"
-        large_num = f"{random.randint(14, 27):02d}"
-        return f"[`{small_num}`,`{large_num}`]"
+        return [f"{random.randint(0, 13):02d}", f"{random.randint(14, 27):02d}"]
+
+def _append_double_group_numbers(builder, numbers):
+    """向消息追加特码片段，格式为 [`07`,`18`]"""
+    builder.text("[")
+    for index, num in enumerate(numbers):
+        if index:
+            builder.text(",")
+        builder.code(num)
+    builder.text("]")
+    return builder
+
+def process_double_group_numbers(numbers_text, prediction_content=""):
+    """处理双组预测特码，返回旧格式文本（反引号标记，未转义）"""
+    numbers = parse_double_group_numbers(numbers_text, prediction_content)
+    return "[" + ",".join(f"`{num}`" for num in numbers) + "]"
 
 def generate_number_for_prediction_type(pred_type):
     """为特定预测类型生成一个符合条件的特码数字"""
@@ -506,16 +524,31 @@ def generate_numbers_by_prediction_types(prediction_types):
     
     return numbers
 
+def _render_broadcast_history_line(record):
+    """渲染一条播报历史记录：• `期号`期: `号码`=`和值` `大单` `组合`"""
+    builder = MarkdownV2Builder()
+    builder.text("• ").code(record[1]).text("期: ")
+    builder.code(record[3]).text("=").code(f"{int(record[4]):02d}").text(" ")
+    builder.code(f"{record[5] and '大' or '小'}{record[6] and '单' or '双'}").text(" ")
+    builder.code(record[7]).text("\n")
+    return builder.build()
+
+def render_broadcast_history_line(record):
+    """获取播报历史记录行，按期号缓存（开奖入库时预先渲染）"""
+    return history_lines.get_or_render(BROADCAST_KIND, record[1], _render_broadcast_history_line, record)
+
 def format_broadcast_message(records):
-    """格式化播报消息"""
+    """格式化播报消息
+    
+    Returns:
+        MarkdownV2Text: 已转义的MarkdownV2文本（plain 属性为纯文本）；出错时返回普通提示字符串
+    """
     try:
         # 确保只取最近10期数据
         records = records[:10]
         # 按期号从小到大排序
         sorted_records = sorted(records, key=lambda x: x[1])
         
-        message = "📊 开奖播报\n\n"
-        
         if not records:
             return "暂无开奖记录"
         
@@ -526,6 +559,9 @@ def format_broadcast_message(records):
         if len(latest_record) < 8:
             logger.error(f"记录格式错误: {latest_record}")
             return "数据格式错误"
+        
+        builder = MarkdownV2Builder()
+        builder.text("📊 开奖播报\n\n")
             
         # 1. 最新开奖单独提炼 - 分行显示
         qihao = latest_record[1]
@@ -535,13 +571,13 @@ def format_broadcast_message(records):
         is_odd = latest_record[6]
         combination = latest_record[7]
         
-        message += f"🔥 最新开奖 {qihao}期\n"
-        message += f"号码: `{opennum}`\n"
-        message += f"和值: `{int(total_sum):02d}`\n"
-        message += f"组合: `{is_big and '大' or '小'}{is_odd and '单' or '双'}` `{combination}`\n\n"
+        builder.text(f"🔥 最新开奖 {qihao}期\n")
+        builder.text("号码: ").code(opennum).text("\n")
+        builder.text("和值: ").code(f"{int(total_sum):02d}").text("\n")
+        builder.text("组合: ").code(f"{is_big and '大' or '小'}{is_odd and '单' or '双'}").text(" ").code(combination).text("\n\n")
         
         # 2. 历史记录 - 去掉最新的一期，只展示之前的记录
-        message += "📈 历史记录:\n"
+        builder.text("📈 历史记录:\n")
         
         # 检查是否有足够的历史记录可显示
         history_records = sorted_records[:-1]  # 排除最新一期
@@ -561,49 +597,62 @@ def format_broadcast_message(records):
                     # 倒序展示历史记录(最新的先显示)
                     for record in reversed(history_records[:9]):  # 最多显示9条历史记录
                         if len(record) >= 8:  # 确保记录格式正确
-                            record_qihao = record[1]
-                            record_opennum = record[3]
-                            record_sum = record[4]
-                            record_is_big = record[5]
-                            record_is_odd = record[6]
-                            record_combination = record[7]
-                            
-                            # 使用与图片一致的格式，确保sum值为两位数
-                            message += f"• `{record_qihao}`期: `{record_opennum}`=`{int(record_sum):02d}` `{record_is_big and '大' or '小'}{record_is_odd and '单' or '双'}` `{record_combination}`\n"
+                            builder.append(render_broadcast_history_line(record))
                 else:
-                    message += "暂无历史记录\n"
+                    builder.text("暂无历史记录\n")
             except Exception as e:
                 logger.error(f"尝试获取更多历史记录失败: {e}")
-                message += "暂无历史记录\n"
+                builder.text("暂无历史记录\n")
         else:
             # 正常情况：倒序展示历史记录(最新的先显示)
             for record in reversed(history_records):  # 排除最新一期
                 if len(record) >= 8:  # 确保记录格式正确
-                    record_qihao = record[1]
-                    record_opennum = record[3]
-                    record_sum = record[4]
-                    record_is_big = record[5]
-                    record_is_odd = record[6]
-                    record_combination = record[7]
-                    
-                    # 使用与图片一致的格式，确保sum值为两位数
-                    message += f"• `{record_qihao}`期: `{record_opennum}`=`{int(record_sum):02d}` `{record_is_big and '大' or '小'}{record_is_odd and '单' or '双'}` `{record_combination}`\n"
+                    builder.append(render_broadcast_history_line(record))
         
-        return message
+        return builder.build()
             
     except Exception as e:
         logger.error(f"格式化播报消息失败: {e}")
         return "格式化消息失败"
 
+def _append_prediction_result(builder, result, total_sum, is_big, is_odd, combination_type):
+    """追加开奖结果描述: `0+9+5`=`14` `大双` `杂六`"""
+    builder.code(result).text("=").code(f"{int(total_sum):02d}").text(" ")
+    builder.code(f"{is_big and '大' or '小'}{is_odd and '单' or '双'}").text(" ")
+    builder.code(combination_type)
+    return builder
+
+def _append_prediction_line(builder, pred_type, qihao, pred_content):
+    """追加一条预测内容: `期号`期：`预测` [特码]"""
+    builder.code(qihao).text("期：")
+    if pred_type != 'double_group':
+        builder.code(pred_content)
+        return builder
+    # 双组预测特殊格式
+    if ':' in pred_content:
+        pred_parts = pred_content.split(':')
+        combos = pred_parts[0]
+        numbers_text = pred_parts[1].strip() if len(pred_parts) > 1 else ""
+    else:
+        # 不包含冒号的情况
+        combos = pred_content
+        numbers_text = ""
+    # 使用辅助函数处理特码数字，传入预测内容
+    numbers = parse_double_group_numbers(numbers_text, combos)
+    builder.code(combos).text(" ")
+    return _append_double_group_numbers(builder, numbers)
+
 def format_prediction_message(prediction, history=None):
-    """格式化预测消息"""
+    """格式化预测消息
+    
+    Returns:
+        MarkdownV2Text: 已转义的MarkdownV2文本（plain 属性为纯文本）；出错时返回普通提示字符串
+    """
     try:
         # 解析预测数据
         pred_type = prediction.get('prediction_type', '')
         pred_content = prediction.get('prediction', '')
         qihao = prediction.get('qihao', '')
-        algorithm_used = prediction.get('algorithm_used', None)
-        switch_info = prediction.get('switch_info', None)
         
         # 获取预测类型名称
         pred_type_name = PREDICTION_TYPE_NAMES.get(pred_type, pred_type)
@@ -615,7 +664,8 @@ def format_prediction_message(prediction, history=None):
             win_rate, win_count = calculate_win_rate(history, pred_type)
         
         # 构建消息 - 修改为显示整数百分比
-        message = f"📊 {pred_type_name}丨 胜率：{int(win_rate)}% ({win_count}期)\n"
+        builder = MarkdownV2Builder()
+        builder.text(f"📊 {pred_type_name}丨 胜率：{int(win_rate)}% ({win_count}期)\n")
         
         # 添加历史记录
         if history:
@@ -637,128 +687,107 @@ def format_prediction_message(prediction, history=None):
                     display_history = valid_history[-display_limit:]
                     
                     # 非智能推荐的历史记录处理
-                    message += "历史开奖结果：\n"
+                    builder.text("历史开奖结果：\n")
                     
                     for record in display_history:
                         try:
-                            # 获取历史记录信息
-                            record_qihao = record.get('qihao', '未知')
-                            record_pred = record.get('prediction', '')
-                            
-                            # 获取开奖结果
-                            result = record.get('result', '未知')
-                            if result == '未知':
-                                continue
-                            
-                            # 修改结果描述格式
-                            total_sum = record.get('sum', 0)
-                            is_big = record.get('is_big', False)
-                            is_odd = record.get('is_odd', False)
-                            combination_type = record.get('combination_type', '未知')
-                            # 构建符合模板的结果描述: "0+9+5=14 大双 杂六"
-                            result_desc = f"`{result}`=`{int(total_sum):02d}` `{is_big and '大' or '小'}{is_odd and '单' or '双'}` `{combination_type}`"
-                            
-                            # 判断预测是否正确
-                            try:
-                                prediction_correct = False
-                                
-                                if pred_type == 'single_double':
-                                    # 单双预测
-                                    actual_result = '单' if is_odd else '双'
-                                    prediction_correct = ('单' in record_pred and actual_result == '单') or ('双' in record_pred and actual_result == '双')
-                                elif pred_type == 'big_small':
-                                    # 大小预测
-                                    actual_result = '大' if is_big else '小'
-                                    prediction_correct = ('大' in record_pred and actual_result == '大') or ('小' in record_pred and actual_result == '小')
-                                elif pred_type == 'kill_group':
-                                    # 杀组预测
-                                    actual_result = f"{'大' if is_big else '小'}{'单' if is_odd else '双'}"
-                                    kill_combo = ""
-                                    if "杀" in record_pred:
-                                        kill_combo = record_pred.replace("杀", "")
-                                    prediction_correct = kill_combo != actual_result
-                                elif pred_type == 'double_group':
-                                    # 双组预测
-                                    actual_result = f"{'大' if is_big else '小'}{'单' if is_odd else '双'}"
-                                    if ':' in record_pred:
-                                        pred_parts = record_pred.split(':')[0].split('/')
-                                    else:
-                                        pred_parts = record_pred.split('/')
-                                    prediction_correct = any(combo == actual_result for combo in pred_parts)
-                            except Exception as e:
-                                logger.warning(f"判断预测正确性失败: {e}")
-                                continue
-                            
-                            # 添加结果标记
-                            result_mark = "✅" if prediction_correct else "❌"
-                            
-                            # 格式化记录行 - 确保使用一致的反引号包裹，不再显示算法号
-                            if pred_type == 'double_group':
-                                # 双组预测特殊格式
-                                try:
-                                    if ':' in record_pred:
-                                        pred_text = record_pred.split(':')[0]
-                                        numbers_text = record_pred.split(':')[1].strip() if len(record_pred.split(':')) > 1 else ""
-                                        
-                                        # 使用辅助函数处理特码数字，传入预测内容
-                                        numbers_formatted = process_double_group_numbers(numbers_text, pred_text)
-                                        
-                                        # 构建输出行
-                                        message += f"`{record_qihao}`期：`{pred_text}`"
-                                        message += f" {numbers_formatted}➡️{result_desc} {result_mark}\n"
-                                    else:
-                                        # 不包含冒号的情况，传入预测内容
-                                        numbers_formatted = process_double_group_numbers("", record_pred)
-                                        message += f"`{record_qihao}`期：`{record_pred}` {numbers_formatted}➡️{result_desc} {result_mark}\n"
-                                except Exception as e:
-                                    logger.warning(f"格式化双组预测记录失败: {e}")
-                                    continue
-                            else:
-                                # 所有预测类型都不显示算法号
-                                message += f"`{record_qihao}`期：`{record_pred}`➡️{result_desc} {result_mark}\n"
+                            line = render_prediction_history_line(pred_type, record)
+                            if line is not None:
+                                builder.append(line)
                         except Exception as e:
                             logger.warning(f"处理单条历史记录失败: {e}")
                             continue
             except Exception as e:
                 logger.error(f"处理历史记录部分失败: {e}")
-                message += "历史记录处理失败\n"
+                builder.text("历史记录处理失败\n")
         
         # 添加一条横线分割历史记录和最新预测
-        message += "\n"
-        
-        # 不再需要获取算法号，因为不再显示
+        builder.text("\n")
         
         # 添加最新预测
-        if pred_type == 'double_group':
-            # 双组预测特殊格式
-            try:
-                if ':' in pred_content:
-                    # 解析带特码的双组预测
-                    pred_parts = pred_content.split(':')
-                    combos = pred_parts[0]
-                    numbers = pred_parts[1].strip() if len(pred_parts) > 1 else ""
-                    
-                    # 使用辅助函数处理特码数字
-                    numbers_formatted = process_double_group_numbers(numbers, combos)
-                    
-                    # 构建输出行
-                    message += f"`{qihao}`期：`{combos}` {numbers_formatted}"
-                else:
-                    # 不包含冒号的情况
-                    numbers_formatted = process_double_group_numbers("", pred_content)
-                    message += f"`{qihao}`期：`{pred_content}` {numbers_formatted}"
-            except Exception as e:
-                logger.warning(f"格式化双组预测失败: {e}")
-                message += f"`{qihao}`期：`{pred_content}`"
-        else:
-            # 其他预测类型
-            message += f"`{qihao}`期：`{pred_content}`"
+        try:
+            latest_line = _append_prediction_line(MarkdownV2Builder(), pred_type, qihao, pred_content).build()
+        except Exception as e:
+            logger.warning(f"格式化双组预测失败: {e}")
+            latest_line = MarkdownV2Builder().code(qihao).text("期：").code(pred_content).build()
+        builder.append(latest_line)
         
-        return message
+        return builder.build()
     except Exception as e:
         logger.error(f"格式化预测消息失败: {e}")
         return f"格式化消息失败: {str(e)}"
 
+def render_prediction_history_line(pred_type, record):
+    """获取预测历史记录行，按 (期号, 预测内容, 开奖结果) 缓存（预测验证完成时预先渲染）"""
+    key = (record.get('qihao'), record.get('prediction', ''), record.get('result', '未知'))
+    return history_lines.get_or_render(pred_type, key, _render_prediction_history_line, pred_type, record)
+
+def _render_prediction_history_line(pred_type, record):
+    """渲染一条预测历史记录行
+    
+    Returns:
+        MarkdownV2Text: 历史记录行；结果未知或无法判断正确性时返回None
+    """
+    # 获取历史记录信息
+    record_qihao = record.get('qihao', '未知')
+    record_pred = record.get('prediction', '')
+    
+    # 获取开奖结果
+    result = record.get('result', '未知')
+    if result == '未知':
+        return None
+    
+    total_sum = record.get('sum', 0)
+    is_big = record.get('is_big', False)
+    is_odd = record.get('is_odd', False)
+    combination_type = record.get('combination_type', '未知')
+    
+    # 判断预测是否正确
+    try:
+        prediction_correct = False
+        
+        if pred_type == 'single_double':
+            # 单双预测
+            actual_result = '单' if is_odd else '双'
+            prediction_correct = ('单' in record_pred and actual_result == '单') or ('双' in record_pred and actual_result == '双')
+        elif pred_type == 'big_small':
+            # 大小预测
+            actual_result = '大' if is_big else '小'
+            prediction_correct = ('大' in record_pred and actual_result == '大') or ('小' in record_pred and actual_result == '小')
+        elif pred_type == 'kill_group':
+            # 杀组预测
+            actual_result = f"{'大' if is_big else '小'}{'单' if is_odd else '双'}"
+            kill_combo = ""
+            if "杀" in record_pred:
+                kill_combo = record_pred.replace("杀", "")
+            prediction_correct = kill_combo != actual_result
+        elif pred_type == 'double_group':
+            # 双组预测
+            actual_result = f"{'大' if is_big else '小'}{'单' if is_odd else '双'}"
+            if ':' in record_pred:
+                pred_parts = record_pred.split(':')[0].split('/')
+            else:
+                pred_parts = record_pred.split('/')
+            prediction_correct = any(combo == actual_result for combo in pred_parts)
+    except Exception as e:
+        logger.warning(f"判断预测正确性失败: {e}")
+        return None
+    
+    # 添加结果标记
+    result_mark = "✅" if prediction_correct else "❌"
+    
+    # 格式化记录行 - 不显示算法号，双组预测附带特码
+    builder = MarkdownV2Builder()
+    try:
+        _append_prediction_line(builder, pred_type, record_qihao, record_pred)
+    except Exception as e:
+        logger.warning(f"格式化双组预测记录失败: {e}")
+        return None
+    builder.text("➡️")
+    _append_prediction_result(builder, result, total_sum, is_big, is_odd, combination_type)
+    builder.text(f" {result_mark}\n")
+    return builder.build()
+
 def parse_datetime(date_str):
     """解析日期时间字符串"""
     try: